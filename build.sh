@@ -10,4 +10,7 @@ python manage.py collectstatic --noinput
 echo "Running migrations..."
 python manage.py migrate
 
+echo "Creating cache table..."
+python manage.py createcachetable
+
 echo "Build complete!"
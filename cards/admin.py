@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db import transaction
+from .collection import remove_from_collection
 from .models import AnimeUniverse, Season, CardTemplate, CardInstance, Deck, DeckCard
 
 
@@ -132,6 +134,23 @@ class CardInstanceAdmin(admin.ModelAdmin):
         )
     regenerate_stats.short_description = "Перегенерировать характеристики"
 
+    def delete_model(self, request, obj):
+        """Удаленная карта убирается из индекса коллекции владельца"""
+        with transaction.atomic():
+            deleted, by_model = obj.delete()
+            if by_model.get(CardInstance._meta.label):
+                remove_from_collection(obj.owner_id, [obj.template_id])
+
+    def delete_queryset(self, request, queryset):
+        """Удаленные карты убираются из индексов коллекций владельцев"""
+        with transaction.atomic():
+            removed = {}
+            for owner_id, template_id in queryset.select_for_update().values_list('owner_id', 'template_id'):
+                removed.setdefault(owner_id, []).append(template_id)
+            queryset.delete()
+            for owner_id, template_ids in removed.items():
+                remove_from_collection(owner_id, template_ids)
+
 
 class DeckCardInline(admin.TabularInline):
     """
@@ -152,9 +171,10 @@ class DeckAdmin(admin.ModelAdmin):
     """
     list_display = [
         'name', 'owner', 'cards_count',
-        'total_health', 'total_attack', 'total_defense', 'created_at'
+        'total_health', 'total_attack', 'total_defense',
+        'is_playable', 'created_at'
     ]
-    list_filter = ['created_at']
+    list_filter = ['is_playable', 'created_at']
     search_fields = [
         'name', 'owner__username_telegram',
         'owner__first_name_telegram'
@@ -166,29 +186,23 @@ class DeckAdmin(admin.ModelAdmin):
         (None, {
             'fields': ('owner', 'name', 'description')
         }),
+        ('Характеристики', {
+            'fields': (
+                'cards_count', 'is_playable',
+                ('total_health', 'total_attack', 'total_defense')
+            )
+        }),
         ('Информация', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
-    readonly_fields = ['created_at', 'updated_at']
-
-    def cards_count(self, obj):
-        return obj.deck_cards.count()
-    cards_count.short_description = "Карт в колоде"
-
-    def total_health(self, obj):
-        return obj.get_total_stats()['health']
-    total_health.short_description = "Здоровье"
-
-    def total_attack(self, obj):
-        return obj.get_total_stats()['attack']
-    total_attack.short_description = "Атака"
-
-    def total_defense(self, obj):
-        return obj.get_total_stats()['defense']
-    total_defense.short_description = "Защита"
+    readonly_fields = [
+        'cards_count', 'total_health', 'total_attack', 'total_defense',
+        'is_playable', 'created_at', 'updated_at'
+    ]
+    list_select_related = ['owner']
 
 
 @admin.register(DeckCard)
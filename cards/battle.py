@@ -0,0 +1,219 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CardTemplate, CardInstance, DeckCard
+
+# Стихии, карты которых лечат союзников вместо атаки
+HEALER_ELEMENTS = frozenset(['light'])
+# Союзник лечится, если у него осталось меньше этой доли здоровья
+HEAL_THRESHOLD = 0.5
+MAX_TURNS = 200
+
+
+def get_battle_settings():
+    game_settings = settings.GAME_SETTINGS
+    return {
+        'xp_win': game_settings.get('BATTLE_XP_WIN', 20),
+        'xp_loss': game_settings.get('BATTLE_XP_LOSS', 5),
+        'xp_knockout': game_settings.get('BATTLE_XP_KNOCKOUT', 5),
+    }
+
+
+class BattleError(Exception):
+    """Бой нельзя провести"""
+
+
+class Combatant:
+    """Карта в бою: только нужные для расчета поля, без ORM"""
+    __slots__ = (
+        'card_id', 'side', 'position', 'template_id', 'element',
+        'max_health', 'health', 'attack', 'defense', 'knockouts',
+    )
+
+    def __init__(self, card_id, side, position, template_id, element,
+                 max_health, health, attack, defense):
+        self.card_id = card_id
+        self.side = side
+        self.position = position
+        self.template_id = template_id
+        self.element = element
+        self.max_health = max_health
+        self.health = health
+        self.attack = attack
+        self.defense = defense
+        self.knockouts = 0
+
+    @classmethod
+    def from_card(cls, card, side, position, full_health=False):
+        return cls(
+            card_id=card.id,
+            side=side,
+            position=position,
+            template_id=card.template_id,
+            element=card.template.element,
+            max_health=card.health,
+            health=card.health if full_health else card.current_health,
+            attack=card.attack,
+            defense=card.defense,
+        )
+
+    @property
+    def is_alive(self):
+        return self.health > 0
+
+    def as_dict(self):
+        return {
+            'card_id': self.card_id,
+            'side': self.side,
+            'position': self.position,
+            'health': self.health,
+            'max_health': self.max_health,
+            'knockouts': self.knockouts,
+        }
+
+
+class BattleResult:
+    __slots__ = ('winner', 'turns', 'events', 'combatants')
+
+    def __init__(self, winner, turns, events, combatants):
+        self.winner = winner
+        self.turns = turns
+        self.events = events
+        self.combatants = combatants
+
+    def as_dict(self):
+        return {
+            'winner': self.winner,
+            'turns': self.turns,
+            'events': self.events,
+            'cards': [combatant.as_dict() for combatant in self.combatants],
+        }
+
+
+def load_side(deck_cards, side, full_health=False):
+    """Бойцы стороны из карт колоды в порядке позиций"""
+    return [
+        Combatant.from_card(deck_card.card, side, deck_card.position, full_health)
+        for deck_card in sorted(deck_cards, key=lambda deck_card: deck_card.position)
+    ]
+
+
+def choose_action(attacker, allies, enemies):
+    """Цель и тип действия: лечение раненого союзника или атака первого живого врага"""
+    if attacker.element in HEALER_ELEMENTS:
+        wounded = [
+            ally for ally in allies
+            if ally.is_alive and ally.health < ally.max_health * HEAL_THRESHOLD
+        ]
+        if wounded:
+            return 'heal', min(wounded, key=lambda ally: ally.health)
+    return 'attack', next(enemy for enemy in enemies if enemy.is_alive)
+
+
+def resolve_battle(side_a, side_b, max_turns=MAX_TURNS):
+    """
+    Провести бой целиком в памяти.
+
+    Стороны ходят по очереди (первой ходит сторона 'a'), внутри стороны
+    карты действуют по кругу в порядке позиций. Урон считается так же,
+    как в CardInstance.take_damage, с множителем стихий CardTemplate.
+    """
+    sides = {'a': side_a, 'b': side_b}
+    next_index = {'a': 0, 'b': 0}
+    events = []
+    winner = None
+    turn = 0
+
+    while turn < max_turns:
+        side = 'a' if turn % 2 == 0 else 'b'
+        other = 'b' if side == 'a' else 'a'
+        allies, enemies = sides[side], sides[other]
+        if not any(card.is_alive for card in allies):
+            winner = other
+            break
+        if not any(card.is_alive for card in enemies):
+            winner = side
+            break
+
+        # Следующая живая карта стороны по кругу
+        index = next_index[side]
+        while not allies[index % len(allies)].is_alive:
+            index += 1
+        attacker = allies[index % len(allies)]
+        next_index[side] = index + 1
+        turn += 1
+
+        action, target = choose_action(attacker, allies, enemies)
+        if action == 'heal':
+            amount = min(attacker.attack, target.max_health - target.health)
+            target.health += amount
+        else:
+            damage = int(attacker.attack * CardTemplate.element_multiplier(attacker.element, target.element))
+            amount = min(target.health, CardInstance.calculate_damage(damage, target.defense))
+            target.health -= amount
+
+        events.append({
+            'turn': turn,
+            'type': action,
+            'source': attacker.card_id,
+            'target': target.card_id,
+            'amount': amount,
+            'health': target.health,
+        })
+        if action == 'attack' and not target.is_alive:
+            attacker.knockouts += 1
+            events.append({'turn': turn, 'type': 'knockout', 'source': attacker.card_id, 'target': target.card_id})
+
+    return BattleResult(winner, turn, events, side_a + side_b)
+
+
+def persist_result(result, cards):
+    """
+    Сохранить здоровье, время использования и опыт карт стороны 'a'
+    одним bulk_update (cards - ее карты, заблокированные в текущей транзакции).
+    Бой без единого хода опыта не дает.
+    """
+    options = get_battle_settings()
+    now = timezone.now()
+    combatants = {combatant.card_id: combatant for combatant in result.combatants if combatant.side == 'a'}
+
+    for card in cards:
+        combatant = combatants[card.pk]
+        card.current_health = combatant.health
+        card.last_used = now
+        if result.turns:
+            won = result.winner == combatant.side
+            card.experience += (
+                (options['xp_win'] if won else options['xp_loss'])
+                + combatant.knockouts * options['xp_knockout']
+            )
+    CardInstance.objects.bulk_update(cards, ['current_health', 'last_used', 'experience'])
+    return cards
+
+
+def run_battle(deck, opponent_deck):
+    """
+    Провести бой колоды игрока (сторона 'a') с колодой соперника и сохранить итог.
+
+    Карты игрока блокируются и перечитываются внутри транзакции, поэтому
+    параллельные бои не перезаписывают здоровье друг друга. Соперник
+    участвует копией колоды с полным здоровьем: его карты не меняются.
+    """
+    opponent_side = load_side(opponent_deck.get_deck_cards(), 'b', full_health=True)
+
+    with transaction.atomic():
+        deck_cards = list(
+            DeckCard.objects.filter(deck=deck)
+            .select_related('card__template')
+            .select_for_update(of=('card',))
+        )
+        side = load_side(deck_cards, 'a')
+        if not side or not opponent_side:
+            raise BattleError('Колода пуста')
+        if not all(combatant.is_alive for combatant in side):
+            raise BattleError('В колоде есть карты без здоровья - восстановите их (reset_health)')
+
+        result = resolve_battle(side, opponent_side)
+        persist_result(result, [deck_card.card for deck_card in deck_cards])
+    return result
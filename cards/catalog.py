@@ -0,0 +1,87 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+
+from .models import AnimeUniverse, Season, CardTemplate
+from .serializers import AnimeUniverseSerializer, SeasonSerializer, CardTemplateSerializer
+
+CATALOG_CACHE_KEY = 'cards:catalog'
+
+
+def build_catalog():
+    """
+    Весь каталог (вселенные, сезоны, шаблоны) тремя запросами.
+
+    Формат элементов совпадает с ответами /universes/, /seasons/ и /templates/.
+    """
+    universes = AnimeUniverse.objects.filter(is_active=True).annotate(
+        active_seasons_count=Count('seasons', filter=Q(seasons__is_active=True))
+    ).order_by('name')
+    seasons = Season.objects.filter(is_active=True).select_related('anime_universe')
+    templates = CardTemplate.objects.filter(is_active=True).select_related('anime_universe', 'season')
+
+    return {
+        'universes': AnimeUniverseSerializer(universes, many=True).data,
+        'seasons': SeasonSerializer(seasons, many=True).data,
+        'templates': CardTemplateSerializer(templates, many=True).data,
+    }
+
+
+def build_snapshot():
+    """Каталог в готовом JSON и его версия (хэш содержимого)"""
+    catalog = build_catalog()
+    content = json.dumps(catalog, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+    body = json.dumps(
+        {'version': version, **catalog},
+        cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False
+    ).encode('utf-8')
+    return {'version': version, 'body': body}
+
+
+def get_catalog_snapshot():
+    """Снимок каталога из кэша; собирается заново после изменений каталога или истечения CATALOG_CACHE_TIMEOUT"""
+    snapshot = cache.get(CATALOG_CACHE_KEY)
+    if snapshot is None:
+        snapshot = build_snapshot()
+        cache.set(CATALOG_CACHE_KEY, snapshot, settings.CATALOG_CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_catalog():
+    cache.delete(CATALOG_CACHE_KEY)
+
+
+TEMPLATE_INDEX_CACHE_KEY = 'cards:catalog:template_index'
+
+
+def build_template_index():
+    """
+    Активные шаблоны с их вселенной, сезоном и стихией, плюс названия
+    вселенных и сезонов - для статистики коллекций (cards.collection).
+    """
+    return {
+        'templates': list(
+            CardTemplate.objects.filter(is_active=True)
+            .values_list('id', 'anime_universe_id', 'season_id', 'element')
+        ),
+        'universes': dict(AnimeUniverse.objects.filter(is_active=True).values_list('id', 'name')),
+        'seasons': dict(Season.objects.filter(is_active=True).values_list('id', 'name')),
+    }
+
+
+def get_template_index():
+    """
+    Индекс шаблонов из кэша. Хранится вместе с версией каталога
+    и пересобирается, когда версия меняется.
+    """
+    version = get_catalog_snapshot()['version']
+    index = cache.get(TEMPLATE_INDEX_CACHE_KEY)
+    if index is None or index['version'] != version:
+        index = {'version': version, **build_template_index()}
+        cache.set(TEMPLATE_INDEX_CACHE_KEY, index, settings.CATALOG_CACHE_TIMEOUT)
+    return index
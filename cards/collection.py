@@ -0,0 +1,119 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .catalog import get_template_index
+from .models import CardTemplate, CollectionEntry
+
+
+def add_to_collection(owner_id, template_ids):
+    """
+    Учесть полученные карты (template_ids могут повторяться).
+
+    Недостающие записи создаются одним INSERT (ON CONFLICT DO NOTHING),
+    счетчики прибавляются UPDATE с F() - по одному на группу шаблонов
+    с одинаковым числом новых копий.
+    """
+    counts = Counter(template_ids)
+    if not counts:
+        return
+    with transaction.atomic():
+        CollectionEntry.objects.bulk_create(
+            [CollectionEntry(owner_id=owner_id, template_id=template_id) for template_id in counts],
+            ignore_conflicts=True,
+        )
+        for copies, group in _group_by_copies(counts).items():
+            CollectionEntry.objects.filter(owner_id=owner_id, template_id__in=group).update(
+                copies=F('copies') + copies
+            )
+
+
+def remove_from_collection(owner_id, template_ids):
+    """Учесть проданные (удаленные) карты; записи без копий удаляются"""
+    counts = Counter(template_ids)
+    if not counts:
+        return
+    with transaction.atomic():
+        for copies, group in _group_by_copies(counts).items():
+            CollectionEntry.objects.filter(
+                owner_id=owner_id,
+                template_id__in=group,
+                copies__gte=copies,
+            ).update(copies=F('copies') - copies)
+        CollectionEntry.objects.filter(owner_id=owner_id, template_id__in=counts, copies=0).delete()
+
+
+def _group_by_copies(counts):
+    groups = defaultdict(list)
+    for template_id, copies in counts.items():
+        groups[copies].append(template_id)
+    return groups
+
+
+def get_owned_copies(owner_id):
+    """{id шаблона: число экземпляров} из индекса коллекции (один запрос)"""
+    return dict(
+        CollectionEntry.objects.filter(owner_id=owner_id, copies__gt=0)
+        .values_list('template_id', 'copies')
+    )
+
+
+def _progress(owned, total):
+    return {
+        'owned': owned,
+        'total': total,
+        'percent': round(owned / total * 100, 1) if total else 0,
+    }
+
+
+def get_collection_stats(owner_id, universe_id=None, season_id=None, element=None):
+    """
+    Прогресс коллекции по вселенным, сезонам и стихиям.
+
+    Каталог берется из кэшированного индекса шаблонов, коллекция -
+    из индекса коллекции, CardInstance не читается. Недостающие шаблоны
+    (разность множеств) можно ограничить вселенной, сезоном и стихией.
+    """
+    index = get_template_index()
+    copies = get_owned_copies(owner_id)
+    owned_ids = set(copies)
+
+    universes = defaultdict(lambda: [0, 0])
+    seasons = defaultdict(lambda: [0, 0])
+    elements = defaultdict(lambda: [0, 0])
+    scope = set()
+    catalog_owned = 0
+    for template_id, template_universe, template_season, template_element in index['templates']:
+        is_owned = template_id in owned_ids
+        catalog_owned += is_owned
+        for groups, key in ((universes, template_universe), (seasons, template_season), (elements, template_element)):
+            groups[key][0] += is_owned
+            groups[key][1] += 1
+        if (
+            (universe_id is None or template_universe == universe_id)
+            and (season_id is None or template_season == season_id)
+            and (element is None or template_element == element)
+        ):
+            scope.add(template_id)
+
+    element_labels = dict(CardTemplate.ELEMENT_CHOICES)
+    return {
+        'total_cards': sum(copies.values()),
+        'unique_templates': len(owned_ids),
+        'duplicates': sum(count - 1 for count in copies.values()),
+        'completion': _progress(catalog_owned, len(index['templates'])),
+        'by_universe': [
+            {'id': key, 'name': index['universes'].get(key), **_progress(*counts)}
+            for key, counts in sorted(universes.items())
+        ],
+        'by_season': [
+            {'id': key, 'name': index['seasons'].get(key), **_progress(*counts)}
+            for key, counts in sorted(seasons.items())
+        ],
+        'by_element': [
+            {'element': key, 'name': str(element_labels.get(key, key)), **_progress(*counts)}
+            for key, counts in sorted(elements.items())
+        ],
+        'missing_template_ids': sorted(scope - owned_ids),
+    }
@@ -0,0 +1,151 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.models import CardTemplate
+from cards.simulation import DEFAULT_CHUNK_SIZE, load_templates, run_simulation, win_rates
+
+
+class Command(BaseCommand):
+    help = 'Симуляция боев случайных колод для проверки баланса шаблонов карт'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--battles',
+            type=int,
+            default=100_000,
+            help='Количество боев (по умолчанию 100000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число рабочих процессов (по умолчанию 1)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Боев в одной пачке (по умолчанию {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Seed генератора для воспроизводимых результатов',
+        )
+        parser.add_argument(
+            '--include-inactive',
+            action='store_true',
+            help='Учитывать неактивные шаблоны',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Сколько самых сильных и слабых шаблонов показать',
+        )
+        parser.add_argument(
+            '--json',
+            dest='json_path',
+            help='Сохранить полные матрицы побед в JSON-файл',
+        )
+
+    def handle(self, *args, **options):
+        if options['battles'] <= 0 or options['chunk_size'] <= 0 or options['workers'] <= 0:
+            raise CommandError('--battles, --chunk-size и --workers должны быть положительными')
+
+        queryset = CardTemplate.objects.all()
+        if not options['include_inactive']:
+            queryset = queryset.filter(is_active=True)
+        table = load_templates(queryset)
+
+        invalid = table.invalid_templates()
+        if invalid:
+            raise CommandError(f"Минимум больше максимума у шаблонов: {', '.join(invalid)}")
+
+        started = time.perf_counter()
+        try:
+            result = run_simulation(
+                table,
+                options['battles'],
+                seed=options['seed'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        template_rates = win_rates(
+            result['template_wins'].sum(axis=1),
+            result['template_draws'].sum(axis=1),
+            result['template_games'].sum(axis=1),
+        )
+        element_matrix = win_rates(result['element_wins'], result['element_draws'], result['element_games'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"⚔️ Проведено боев: {result['battles']} за {elapsed:.2f} с "
+            f"({result['battles'] / elapsed:,.0f} боев/с)"
+        ))
+        self.stdout.write(
+            f"Шаблонов: {len(table)}, ничьих: {result['draws']}, "
+            f"средняя длина боя: {result['turns'] / result['battles']:.1f} ходов"
+        )
+
+        self.write_templates(table, template_rates, options['top'])
+        self.write_elements(table, element_matrix)
+
+        if options['json_path']:
+            self.write_json(options['json_path'], table, result, template_rates, element_matrix)
+            self.stdout.write(f"Матрицы сохранены в {options['json_path']}")
+
+    def write_templates(self, table, rates, top):
+        order = [i for i in np.argsort(-np.nan_to_num(rates, nan=-1)) if not np.isnan(rates[i])]
+        sections = [('Самые сильные шаблоны:', order[:top])]
+        if len(order) > top:
+            sections.append(('Самые слабые шаблоны:', order[-top:][::-1]))
+
+        for title, indexes in sections:
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for i in indexes:
+                element = table.element_codes[table.elements[i]]
+                self.stdout.write(f"  {rates[i]:6.1%}  {table.names[i]} ({element})")
+
+    def write_elements(self, table, matrix):
+        codes = table.element_codes
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING('Доля побед стихии (строка) против стихии (столбец):'))
+        self.stdout.write(' ' * 9 + ''.join(f'{code:>9}' for code in codes))
+        for i, code in enumerate(codes):
+            cells = ''.join(
+                f'{"-":>9}' if np.isnan(value) else f'{value:>9.1%}'
+                for value in matrix[i]
+            )
+            self.stdout.write(f'{code:>9}{cells}')
+
+    def write_json(self, path, table, result, template_rates, element_matrix):
+        def matrix_to_list(matrix):
+            return [[None if np.isnan(value) else round(float(value), 4) for value in row] for row in matrix]
+
+        template_matrix = win_rates(result['template_wins'], result['template_draws'], result['template_games'])
+        data = {
+            'battles': result['battles'],
+            'draws': result['draws'],
+            'templates': [
+                {
+                    'id': int(table.ids[i]),
+                    'name': table.names[i],
+                    'element': table.element_codes[table.elements[i]],
+                    'win_rate': None if np.isnan(template_rates[i]) else round(float(template_rates[i]), 4),
+                }
+                for i in range(len(table))
+            ],
+            'template_matrix': matrix_to_list(template_matrix),
+            'elements': table.element_codes,
+            'element_matrix': matrix_to_list(element_matrix),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_deck_totals(apps, schema_editor):
+    """Заполняет агрегаты для уже существующих колод"""
+    Deck = apps.get_model('cards', 'Deck')
+    DeckCard = apps.get_model('cards', 'DeckCard')
+
+    rows_by_deck = {}
+    for deck_id, template_id, health, attack, defense in DeckCard.objects.values_list(
+        'deck_id', 'card__template_id', 'card__health', 'card__attack', 'card__defense'
+    ):
+        rows_by_deck.setdefault(deck_id, []).append((template_id, health, attack, defense))
+
+    decks = list(Deck.objects.filter(pk__in=rows_by_deck))
+    for deck in decks:
+        rows = rows_by_deck[deck.pk]
+        templates = [row[0] for row in rows]
+        deck.cards_count = len(rows)
+        deck.total_health = sum(row[1] for row in rows)
+        deck.total_attack = sum(row[2] for row in rows)
+        deck.total_defense = sum(row[3] for row in rows)
+        deck.is_playable = len(rows) == 3 and len(set(templates)) == len(templates)
+
+    Deck.objects.bulk_update(decks, [
+        'cards_count', 'total_health', 'total_attack', 'total_defense', 'is_playable'
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_alter_deck_unique_together_alter_deck_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='cards_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Карт в колоде'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='is_playable',
+            field=models.BooleanField(default=False, verbose_name='Колода валидна'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='total_attack',
+            field=models.PositiveIntegerField(default=0, verbose_name='Суммарная атака'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='total_defense',
+            field=models.PositiveIntegerField(default=0, verbose_name='Суммарная защита'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='total_health',
+            field=models.PositiveIntegerField(default=0, verbose_name='Суммарное здоровье'),
+        ),
+        migrations.AddIndex(
+            model_name='deck',
+            index=models.Index(fields=['is_playable', 'total_attack'], name='deck_playable_attack_idx'),
+        ),
+        migrations.RunPython(fill_deck_totals, migrations.RunPython.noop),
+    ]
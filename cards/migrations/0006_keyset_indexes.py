@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0005_deck_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cardinstance',
+            index=models.Index(fields=['owner', '-acquired_at', '-id'], name='card_owner_acquired_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0006_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cardinstance',
+            index=models.Index(fields=['owner', 'template', '-acquired_at'], name='card_owner_template_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardinstance',
+            index=models.Index(condition=models.Q(('is_in_deck', True)), fields=['owner', '-acquired_at'], name='card_owner_in_deck_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardtemplate',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='template_active_idx'),
+        ),
+    ]
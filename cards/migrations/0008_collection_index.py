@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_collection_index(apps, schema_editor):
+    """Строит индекс коллекции по уже полученным картам"""
+    CardInstance = apps.get_model('cards', 'CardInstance')
+    CollectionEntry = apps.get_model('cards', 'CollectionEntry')
+
+    rows = CardInstance.objects.order_by().values_list('owner_id', 'template_id').annotate(copies=Count('id'))
+    CollectionEntry.objects.bulk_create(
+        [CollectionEntry(owner_id=owner_id, template_id=template_id, copies=copies) for owner_id, template_id, copies in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('copies', models.PositiveIntegerField(default=0, verbose_name='Экземпляров')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_entries', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_entries', to='cards.cardtemplate', verbose_name='Шаблон')),
+            ],
+            options={
+                'verbose_name': 'Запись коллекции',
+                'verbose_name_plural': 'Коллекция игроков',
+                'unique_together': {('owner', 'template')},
+            },
+        ),
+        migrations.RunPython(fill_collection_index, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from users.models import TelegramUser
 import random
@@ -86,6 +86,18 @@ class CardTemplate(models.Model):
         ('neutral', _('Нейтральная')),
     ]
 
+    # Стихия -> стихии, против которых она сильнее
+    ELEMENT_ADVANTAGES = {
+        'fire': {'air'},
+        'air': {'earth'},
+        'earth': {'water'},
+        'water': {'fire'},
+        'light': {'dark'},
+        'dark': {'light'},
+    }
+    STRONG_MULTIPLIER = 1.25
+    WEAK_MULTIPLIER = 0.8
+
     # Основная информация
     name = models.CharField(
         max_length=100,
@@ -183,10 +195,35 @@ class CardTemplate(models.Model):
         verbose_name_plural = _("Шаблоны карт")
         ordering = ['-created_at']
         unique_together = ['name', 'anime_universe', 'season']
+        indexes = [
+            # Каталог и выбор шаблонов: только активные (частичный индекс)
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_active=True),
+                name='template_active_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.anime_universe} ({self.season})"
 
+    @classmethod
+    def element_multiplier(cls, attacker_element, defender_element):
+        """Множитель атаки с учетом стихий атакующего и защищающегося"""
+        if defender_element in cls.ELEMENT_ADVANTAGES.get(attacker_element, ()):
+            return cls.STRONG_MULTIPLIER
+        if attacker_element in cls.ELEMENT_ADVANTAGES.get(defender_element, ()):
+            return cls.WEAK_MULTIPLIER
+        return 1.0
+
+    def roll_stats(self, rng=random):
+        """Случайные характеристики экземпляра в диапазонах шаблона"""
+        return {
+            'health': rng.randint(self.health_min, self.health_max),
+            'attack': rng.randint(self.attack_min, self.attack_max),
+            'defense': rng.randint(self.defense_min, self.defense_max),
+        }
+
     def get_average_stats(self):
         """Возвращает средние значения характеристик"""
         return {
@@ -196,6 +233,29 @@ class CardTemplate(models.Model):
         }
 
 
+class DeckQuerySet(models.QuerySet):
+    def with_cards(self):
+        """Подгружает карты колоды вместе с шаблонами, вселенными и сезонами"""
+        return self.prefetch_related(
+            models.Prefetch(
+                'deck_cards',
+                queryset=DeckCard.objects.select_related(
+                    'card__template__anime_universe',
+                    'card__template__season',
+                )
+            )
+        )
+
+    def refresh_totals(self):
+        """Пересчитать сохраненные агрегаты выбранных колод"""
+        with transaction.atomic():
+            # Блокировка строки колоды упорядочивает параллельные изменения
+            decks = list(self.select_for_update())
+            for deck in decks:
+                deck.refresh_totals()
+        return decks
+
+
 class Deck(models.Model):
     """
     Боевая колода игрока (одна на игрока)
@@ -216,6 +276,28 @@ class Deck(models.Model):
         verbose_name=_("Описание")
     )
 
+    # Агрегаты по картам колоды (обновляются при изменении DeckCard/CardInstance)
+    cards_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Карт в колоде")
+    )
+    total_health = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Суммарное здоровье")
+    )
+    total_attack = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Суммарная атака")
+    )
+    total_defense = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Суммарная защита")
+    )
+    is_playable = models.BooleanField(
+        default=False,
+        verbose_name=_("Колода валидна")
+    )
+
     # Мета
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -226,35 +308,47 @@ class Deck(models.Model):
         verbose_name=_("Обновлена")
     )
 
+    objects = DeckQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Колоды")
         verbose_name_plural = _("Колоды")
+        indexes = [
+            models.Index(fields=['is_playable', 'total_attack'], name='deck_playable_attack_idx'),
+        ]
 
     def __str__(self):
         return f"{self.owner.username_telegram or self.owner.telegram_id}: {self.name}"
 
+    def get_deck_cards(self):
+        """Карты колоды с картами и шаблонами (из prefetch, если он был)"""
+        if 'deck_cards' in getattr(self, '_prefetched_objects_cache', {}):
+            return list(self.deck_cards.all())
+        return list(self.deck_cards.select_related('card__template'))
+
     def clean(self):
         """Валидация колоды"""
         from django.core.exceptions import ValidationError
         super().clean()
-        cards_count = self.deck_cards.count()
+        deck_cards = self.get_deck_cards()
 
-        if cards_count > 3:
+        if len(deck_cards) > 3:
             raise ValidationError(_("В колоде не может быть больше 3 карт"))
 
         # Проверка уникальности шаблонов
-        templates = [deck_card.card.template for deck_card in self.deck_cards.all()]
+        templates = [deck_card.card.template_id for deck_card in deck_cards]
         if len(templates) != len(set(templates)):
             raise ValidationError(_("В колоде не может быть карт с одинаковыми шаблонами"))
 
     def is_valid(self):
         """Проверка валидности колоды"""
-        cards_count = self.deck_cards.count()
+        deck_cards = self.get_deck_cards()
+        cards_count = len(deck_cards)
         if cards_count != 3:
             return False, f"В колоде должно быть ровно 3 карты (сейчас {cards_count})"
 
         # Проверка уникальности шаблонов
-        templates = [deck_card.card.template for deck_card in self.deck_cards.all()]
+        templates = [deck_card.card.template_id for deck_card in deck_cards]
         if len(templates) != len(set(templates)):
             return False, "В колоде не может быть карт с одинаковыми шаблонами"
 
@@ -262,19 +356,29 @@ class Deck(models.Model):
 
     def get_total_stats(self):
         """Получить суммарные характеристики всех карт в колоде"""
-        if not self.deck_cards.exists():
-            return {'health': 0, 'attack': 0, 'defense': 0}
-
-        total_health = sum(deck_card.card.health for deck_card in self.deck_cards.all())
-        total_attack = sum(deck_card.card.attack for deck_card in self.deck_cards.all())
-        total_defense = sum(deck_card.card.defense for deck_card in self.deck_cards.all())
-
         return {
-            'health': total_health,
-            'attack': total_attack,
-            'defense': total_defense
+            'health': self.total_health,
+            'attack': self.total_attack,
+            'defense': self.total_defense
         }
 
+    def refresh_totals(self):
+        """Пересчитать и сохранить агрегаты колоды одним запросом к картам"""
+        rows = list(self.deck_cards.values_list(
+            'card__template_id', 'card__health', 'card__attack', 'card__defense'
+        ))
+        templates = [row[0] for row in rows]
+        totals = {
+            'cards_count': len(rows),
+            'total_health': sum(row[1] for row in rows),
+            'total_attack': sum(row[2] for row in rows),
+            'total_defense': sum(row[3] for row in rows),
+            'is_playable': len(rows) == 3 and len(set(templates)) == len(templates),
+        }
+        for field, value in totals.items():
+            setattr(self, field, value)
+        Deck.objects.filter(pk=self.pk).update(**totals)
+
 
 class DeckCard(models.Model):
     """
@@ -370,6 +474,19 @@ class CardInstance(models.Model):
         verbose_name = _("Карта игрока")
         verbose_name_plural = _("Карты игроков")
         ordering = ['-acquired_at']
+        indexes = [
+            # Коллекция игрока по курсору (ggame.pagination.AcquiredAtPagination)
+            models.Index(fields=['owner', '-acquired_at', '-id'], name='card_owner_acquired_idx'),
+            # Экземпляры шаблона у игрока (CardTemplateViewSet.instances)
+            models.Index(fields=['owner', 'template', '-acquired_at'], name='card_owner_template_idx'),
+            # Карты игрока в колоде (частичный индекс: условие на булево поле
+            # не используется как равенство в составном индексе)
+            models.Index(
+                fields=['owner', '-acquired_at'],
+                condition=models.Q(is_in_deck=True),
+                name='card_owner_in_deck_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.template.name} ({self.owner.username_telegram or self.owner.telegram_id})"
@@ -383,10 +500,8 @@ class CardInstance(models.Model):
 
     def generate_random_stats(self):
         """Генерирует случайные характеристики в заданном диапазоне"""
-        template = self.template
-        self.health = random.randint(template.health_min, template.health_max)
-        self.attack = random.randint(template.attack_min, template.attack_max)
-        self.defense = random.randint(template.defense_min, template.defense_max)
+        for field, value in self.template.roll_stats().items():
+            setattr(self, field, value)
 
     def regenerate_stats(self):
         """Перегенерирует характеристики (для специальных случаев)"""
@@ -394,11 +509,16 @@ class CardInstance(models.Model):
         self.current_health = self.health
         self.save()
 
+    @staticmethod
+    def calculate_damage(damage, defense):
+        """Урон после защиты (общая формула для карт и боевого движка)"""
+        return max(0, damage - defense)
+
     def take_damage(self, damage):
         """Получить урон"""
-        actual_damage = max(0, damage - self.defense)
+        actual_damage = self.calculate_damage(damage, self.defense)
         self.current_health = max(0, self.current_health - actual_damage)
-        self.save()
+        self.save(update_fields=['current_health'])
         return actual_damage
 
     def heal(self, amount):
@@ -406,7 +526,7 @@ class CardInstance(models.Model):
         old_health = self.current_health
         self.current_health = min(self.health, self.current_health + amount)
         healed = self.current_health - old_health
-        self.save()
+        self.save(update_fields=['current_health'])
         return healed
 
     def is_alive(self):
@@ -416,4 +536,37 @@ class CardInstance(models.Model):
     def reset_health(self):
         """Восстановить полное здоровье"""
         self.current_health = self.health
-        self.save()
+        self.save(update_fields=['current_health'])
+
+
+class CollectionEntry(models.Model):
+    """
+    Индекс коллекции: сколько экземпляров шаблона есть у игрока.
+
+    Поддерживается при получении и продаже карт (cards.collection),
+    чтобы статистика коллекции не читала CardInstance.
+    """
+    owner = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name='collection_entries',
+        verbose_name=_("Владелец")
+    )
+    template = models.ForeignKey(
+        CardTemplate,
+        on_delete=models.CASCADE,
+        related_name='collection_entries',
+        verbose_name=_("Шаблон")
+    )
+    copies = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Экземпляров")
+    )
+
+    class Meta:
+        verbose_name = _("Запись коллекции")
+        verbose_name_plural = _("Коллекция игроков")
+        unique_together = ['owner', 'template']
+
+    def __str__(self):
+        return f"{self.owner_id}: {self.template_id} x{self.copies}"
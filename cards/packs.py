@@ -0,0 +1,128 @@
+import random
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from users.currency import debit
+from .collection import add_to_collection
+from .models import CardTemplate, CardInstance
+from .profile import invalidate_user_profile_on_commit
+
+
+# Характеристики экземпляра; у шаблона для каждой есть поля <stat>_min и <stat>_max
+STAT_FIELDS = ('health', 'attack', 'defense')
+
+
+class PackError(Exception):
+    """Некорректный запрос на получение карт"""
+
+
+def get_pack_settings():
+    game_settings = settings.GAME_SETTINGS
+    return {
+        'size': game_settings.get('CARD_PACK_SIZE', 5),
+        'coin_cost': game_settings.get('CARD_PACK_COIN_COST', 40),
+        'max_cards': game_settings.get('MAX_CARDS_PER_ACQUIRE', 50),
+    }
+
+
+def roll_card_stats(templates, rng=random):
+    """
+    Характеристики карт для списка шаблонов одним вызовом NumPy на характеристику.
+
+    Генератор NumPy получает seed от rng, поэтому результат воспроизводим
+    при заданном seed random. Возвращает {характеристика: список значений}.
+    """
+    generator = np.random.default_rng(rng.getrandbits(64))
+    stats = {}
+    for stat in STAT_FIELDS:
+        low = np.fromiter((getattr(template, f'{stat}_min') for template in templates), dtype=np.int64)
+        high = np.fromiter((getattr(template, f'{stat}_max') for template in templates), dtype=np.int64)
+        stats[stat] = generator.integers(low, high, endpoint=True).tolist()
+    return stats
+
+
+def build_card_instances(owner, templates, rng=random):
+    """
+    Несохраненные экземпляры карт для списка шаблонов.
+
+    Характеристики генерируются сразу для всех шаблонов, без отдельного
+    запроса к шаблону на каждую карту, как в CardInstance.save().
+    """
+    stats = roll_card_stats(templates, rng)
+    return [
+        CardInstance(
+            template=template,
+            owner=owner,
+            current_health=stats['health'][index],
+            **{stat: values[index] for stat, values in stats.items()}
+        )
+        for index, template in enumerate(templates)
+    ]
+
+
+def grant_cards(owner, templates, rng=random):
+    """Создать карты одним bulk_create (без списания валюты)"""
+    with transaction.atomic():
+        cards = CardInstance.objects.bulk_create(build_card_instances(owner, templates, rng))
+        # bulk_create не отправляет post_save
+        add_to_collection(owner.pk, [template.pk for template in templates])
+        invalidate_user_profile_on_commit(owner.pk)
+    return cards
+
+
+def acquire_cards(user, template_ids, rng=random):
+    """Купить карты по списку шаблонов (повторы допускаются) с одним списанием"""
+    max_cards = get_pack_settings()['max_cards']
+    if not template_ids:
+        raise PackError('Не указаны template_ids')
+    if len(template_ids) > max_cards:
+        raise PackError(f'Можно получить не больше {max_cards} карт за раз')
+
+    templates_by_id = CardTemplate.objects.filter(
+        id__in=set(template_ids),
+        is_active=True
+    ).select_related('anime_universe', 'season').in_bulk()
+    missing = set(template_ids) - set(templates_by_id)
+    if missing:
+        raise PackError(f'Шаблоны не найдены: {sorted(missing)}')
+
+    templates = [templates_by_id[template_id] for template_id in template_ids]
+    with transaction.atomic():
+        debit(
+            user,
+            coins=sum(template.coin_cost for template in templates),
+            gold=sum(template.gold_cost for template in templates),
+            reason='card_purchase',
+            reference=f'templates:{len(templates)}'
+        )
+        return grant_cards(user, templates, rng)
+
+
+def draw_templates(count, universe_id=None, season_id=None, rng=random):
+    """Случайные активные шаблоны (с повторами) для набора карт"""
+    queryset = CardTemplate.objects.filter(is_active=True).select_related('anime_universe', 'season')
+    if universe_id:
+        queryset = queryset.filter(anime_universe_id=universe_id)
+    if season_id:
+        queryset = queryset.filter(season_id=season_id)
+
+    pool = list(queryset)
+    if not pool:
+        raise PackError('Нет доступных карт для набора')
+    return rng.choices(pool, k=count)
+
+
+def open_pack(user, universe_id=None, season_id=None, rng=random):
+    """Открыть набор карт: одно списание и один bulk_create"""
+    pack = get_pack_settings()
+    templates = draw_templates(pack['size'], universe_id, season_id, rng)
+    with transaction.atomic():
+        debit(
+            user,
+            coins=pack['coin_cost'],
+            reason='pack_purchase',
+            reference=f'pack:{universe_id or "*"}:{season_id or "*"}'
+        )
+        return grant_cards(user, templates, rng)
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import CardInstance, Deck, DeckCard
+
+PROFILE_CACHE_KEY = 'cards:profile:{user_id}'
+
+# Поля TelegramUser, попадающие в профиль
+PROFILE_USER_FIELDS = frozenset([
+    'username', 'first_name', 'last_name',
+    'total_games', 'games_won', 'total_points',
+    'current_streak', 'best_streak', 'coins', 'gold',
+])
+
+
+def get_profile_cache_key(user_id):
+    return PROFILE_CACHE_KEY.format(user_id=user_id)
+
+
+def _serialize_card(card):
+    return {
+        'id': card.id,
+        'template': {
+            'id': card.template.id,
+            'name': card.template.name,
+            'element': card.template.element,
+        },
+        'health': card.health,
+        'attack': card.attack,
+        'defense': card.defense,
+    }
+
+
+def build_user_profile(user):
+    """
+    Собирает профиль пользователя с картами и колодой.
+
+    Фиксированное число запросов: карты с шаблонами, колода,
+    позиции карт колоды.
+    """
+    cards = list(
+        CardInstance.objects.filter(owner=user).select_related('template')
+    )
+    deck, _ = Deck.objects.get_or_create(owner=user)
+
+    cards_by_id = {card.id: card for card in cards}
+    deck_cards_data = []
+    for deck_card in DeckCard.objects.filter(deck=deck).select_related('card__template'):
+        # Карта колоды почти всегда уже загружена вместе с коллекцией
+        card = cards_by_id.get(deck_card.card_id, deck_card.card)
+        deck_cards_data.append({
+            **_serialize_card(card),
+            'position': deck_card.position,
+        })
+
+    return {
+        'user': {
+            'id': user.id,
+            'telegram_id': user.telegram_id,
+            'username': user.username,
+            'first_name': user.first_name or '',
+            'last_name': user.last_name or '',
+            'total_games': user.total_games,
+            'games_won': user.games_won,
+            'total_points': user.total_points,
+            'current_streak': user.current_streak,
+            'best_streak': user.best_streak,
+            'coins': user.coins,
+            'gems': user.gold,
+            'win_rate': user.win_rate,
+        },
+        'cards': [{
+            **_serialize_card(card),
+            'acquired_at': card.acquired_at.isoformat(),
+        } for card in cards],
+        'deck': {
+            'id': deck.id,
+            'name': deck.name,
+            'cards': deck_cards_data,
+        },
+    }
+
+
+def get_cached_user_profile(user):
+    """Возвращает профиль из кэша, собирая его при промахе"""
+    key = get_profile_cache_key(user.id)
+    profile = cache.get(key)
+    if profile is None:
+        profile = build_user_profile(user)
+        cache.set(key, profile, settings.USER_PROFILE_CACHE_TIMEOUT)
+    return profile
+
+
+def invalidate_user_profile(user_id):
+    """Сбрасывает закэшированный профиль пользователя"""
+    cache.delete(get_profile_cache_key(user_id))
+
+
+def invalidate_user_profile_on_commit(user_id):
+    """
+    Сбрасывает профиль после коммита текущей транзакции: сброс внутри
+    транзакции дал бы параллельному запросу закэшировать старые данные
+    """
+    transaction.on_commit(lambda: invalidate_user_profile(user_id))
+
+
+def invalidate_user_profiles(user_ids):
+    """Сбрасывает закэшированные профили нескольких пользователей"""
+    cache.delete_many([get_profile_cache_key(user_id) for user_id in user_ids])
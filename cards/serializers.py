@@ -11,6 +11,9 @@ class AnimeUniverseSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'logo_url', 'is_active', 'seasons_count']
 
     def get_seasons_count(self, obj):
+        # Аннотация из запроса (без отдельного COUNT на каждую вселенную)
+        if hasattr(obj, 'active_seasons_count'):
+            return obj.active_seasons_count
         return obj.seasons.filter(is_active=True).count()
 
 
@@ -93,8 +96,9 @@ class DeckSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at']
 
+    # Все поля считаются по одной выборке карт колоды (Deck.objects.with_cards())
     def get_cards_count(self, obj):
-        return obj.deck_cards.count()
+        return len(obj.get_deck_cards())
 
     def get_total_stats(self, obj):
         return obj.get_total_stats()
@@ -104,8 +108,7 @@ class DeckSerializer(serializers.ModelSerializer):
         return {'valid': valid, 'message': message}
 
     def get_cards(self, obj):
-        deck_cards = obj.deck_cards.select_related('card__template').all()
-        return DeckCardSerializer(deck_cards, many=True).data
+        return DeckCardSerializer(obj.get_deck_cards(), many=True).data
 
 
 class DeckCardSerializer(serializers.ModelSerializer):
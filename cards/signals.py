@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.models import TelegramUser, CurrencyTransaction
+from .catalog import invalidate_catalog
+from .collection import add_to_collection
+from .models import AnimeUniverse, Season, CardTemplate, CardInstance, Deck, DeckCard
+from .profile import PROFILE_USER_FIELDS, invalidate_user_profile_on_commit
+
+# Поля карты, от которых зависят агрегаты колоды
+DECK_STAT_FIELDS = frozenset(['template', 'health', 'attack', 'defense', 'level'])
+
+
+@receiver([post_save, post_delete], sender=CardInstance)
+def card_instance_changed(sender, instance, **kwargs):
+    """Сбрасывает профиль владельца при изменении его карт"""
+    invalidate_user_profile_on_commit(instance.owner_id)
+
+
+@receiver(post_save, sender=CardInstance)
+def card_instance_created(sender, instance, created=False, **kwargs):
+    """Добавляет новую карту в индекс коллекции владельца"""
+    if created:
+        add_to_collection(instance.owner_id, [instance.template_id])
+
+
+@receiver(post_save, sender=CardInstance)
+def card_instance_stats_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    """Пересчитывает колоды, в которых стоит карта с изменившимися характеристиками"""
+    if created:
+        return
+    if update_fields is None or DECK_STAT_FIELDS.intersection(update_fields):
+        Deck.objects.filter(deck_cards__card=instance).refresh_totals()
+
+
+@receiver([post_save, post_delete], sender=DeckCard)
+def deck_card_changed(sender, instance, **kwargs):
+    """Пересчитывает агрегаты колоды и сбрасывает профиль ее владельца"""
+    for deck in Deck.objects.filter(pk=instance.deck_id).refresh_totals():
+        invalidate_user_profile_on_commit(deck.owner_id)
+
+
+@receiver(post_save, sender=TelegramUser)
+def telegram_user_changed(sender, instance, update_fields=None, **kwargs):
+    """Сбрасывает профиль, если изменились валюта или статистика"""
+    if update_fields is None or PROFILE_USER_FIELDS.intersection(update_fields):
+        invalidate_user_profile_on_commit(instance.id)
+
+
+@receiver(post_save, sender=CurrencyTransaction)
+def currency_changed(sender, instance, created=False, **kwargs):
+    """Баланс меняется через UPDATE без post_save пользователя - сбрасываем профиль по журналу"""
+    if created:
+        invalidate_user_profile_on_commit(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=AnimeUniverse)
+@receiver([post_save, post_delete], sender=Season)
+@receiver([post_save, post_delete], sender=CardTemplate)
+def catalog_changed(sender, **kwargs):
+    """
+    Сбрасывает снимок каталога после коммита: снимок, собранный
+    параллельным запросом до коммита, тоже не переживет сброс
+    """
+    transaction.on_commit(invalidate_catalog)
@@ -0,0 +1,349 @@
+"""
+Пакетная симуляция боев для проверки баланса шаблонов карт.
+
+Бои считаются векторно: состояние всех боев хранится в массивах NumPy
+формы [бои, стороны, карты], и каждый ход выполняется сразу для всех
+еще не закончившихся боев. Правила совпадают с cards.battle.resolve_battle.
+
+Модуль не импортирует Django на верхнем уровне: функции симуляции
+выполняются в рабочих процессах пула, где настройки Django не загружены.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DECK_SIZE = 3
+DEFAULT_CHUNK_SIZE = 50_000
+
+SIDE_A = 0
+SIDE_B = 1
+DRAW = -1
+
+
+class TemplateTable:
+    """Шаблоны карт и правила боя в виде массивов (передается в рабочие процессы)"""
+
+    def __init__(self, ids, names, elements, element_codes, stat_ranges,
+                 multipliers, healers, heal_threshold, max_turns):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = list(names)
+        self.elements = np.asarray(elements, dtype=np.int64)
+        self.element_codes = list(element_codes)
+        # stat -> (min, max), массивы по шаблонам
+        self.stat_ranges = {
+            stat: (np.asarray(low, dtype=np.int64), np.asarray(high, dtype=np.int64))
+            for stat, (low, high) in stat_ranges.items()
+        }
+        self.multipliers = np.asarray(multipliers, dtype=np.float64)
+        self.healers = np.asarray(healers, dtype=bool)
+        self.heal_threshold = heal_threshold
+        self.max_turns = max_turns
+
+    def __len__(self):
+        return len(self.ids)
+
+    def invalid_templates(self):
+        """Названия шаблонов, у которых минимум диапазона больше максимума"""
+        invalid = np.zeros(len(self), dtype=bool)
+        for low, high in self.stat_ranges.values():
+            invalid |= low > high
+        return [self.names[i] for i in np.flatnonzero(invalid)]
+
+
+def load_templates(queryset=None):
+    """Собрать TemplateTable из шаблонов карт и правил cards.battle"""
+    from .battle import HEALER_ELEMENTS, HEAL_THRESHOLD, MAX_TURNS
+    from .models import CardTemplate
+
+    if queryset is None:
+        queryset = CardTemplate.objects.filter(is_active=True)
+
+    element_codes = [code for code, _ in CardTemplate.ELEMENT_CHOICES]
+    element_index = {code: i for i, code in enumerate(element_codes)}
+    rows = list(queryset.order_by('id').values_list(
+        'id', 'name', 'element',
+        'health_min', 'health_max',
+        'attack_min', 'attack_max',
+        'defense_min', 'defense_max',
+    ))
+
+    return TemplateTable(
+        ids=[row[0] for row in rows],
+        names=[row[1] for row in rows],
+        elements=[element_index[row[2]] for row in rows],
+        element_codes=element_codes,
+        stat_ranges={
+            'health': ([row[3] for row in rows], [row[4] for row in rows]),
+            'attack': ([row[5] for row in rows], [row[6] for row in rows]),
+            'defense': ([row[7] for row in rows], [row[8] for row in rows]),
+        },
+        multipliers=[
+            [CardTemplate.element_multiplier(attacker, defender) for defender in element_codes]
+            for attacker in element_codes
+        ],
+        healers=[code in HEALER_ELEMENTS for code in element_codes],
+        heal_threshold=HEAL_THRESHOLD,
+        max_turns=MAX_TURNS,
+    )
+
+
+def sample_decks(rng, templates_count, battles, deck_size=DECK_SIZE):
+    """
+    Индексы шаблонов колод формы [бои, 2, deck_size].
+
+    Внутри колоды шаблоны не повторяются (как требует Deck.clean):
+    k-й шаблон выбирается из оставшихся, сдвигая номер через уже выбранные.
+    """
+    if templates_count < deck_size:
+        raise ValueError(f"Нужно хотя бы {deck_size} шаблона, найдено {templates_count}")
+
+    decks = battles * 2
+    chosen = np.empty((decks, deck_size), dtype=np.int64)
+    for k in range(deck_size):
+        picks = rng.integers(0, templates_count - k, size=decks)
+        for taken in np.sort(chosen[:, :k], axis=1).T:
+            picks += picks >= taken
+        chosen[:, k] = picks
+    return chosen.reshape(battles, 2, deck_size)
+
+
+def roll_stats(rng, table, decks):
+    """Случайные характеристики карт в диапазонах шаблонов (как CardTemplate.roll_stats)"""
+    return {
+        stat: rng.integers(low[decks], high[decks], endpoint=True)
+        for stat, (low, high) in table.stat_ranges.items()
+    }
+
+
+def _alive_codes(alive, base, cards):
+    """Битовые маски живых карт стороны: бит i - карта на позиции i жива"""
+    codes = alive[:, base].astype(np.int64)
+    for i in range(1, cards):
+        codes |= alive[:, base + i].astype(np.int64) << i
+    return codes
+
+
+def _next_alive_table(cards):
+    """[начальная позиция, маска живых] -> первая живая позиция по кругу"""
+    table = np.zeros((cards, 1 << cards), dtype=np.int64)
+    for start in range(cards):
+        table[start] = start
+        for code in range(1, 1 << cards):
+            table[start, code] = next(
+                (start + offset) % cards for offset in range(cards)
+                if code >> ((start + offset) % cards) & 1
+            )
+    return table
+
+
+def simulate(table, decks, stats):
+    """
+    Провести бои векторно.
+
+    Возвращает (победители, число ходов): победитель SIDE_A, SIDE_B или DRAW.
+    """
+    battles, _, cards = decks.shape
+    slots = 2 * cards
+    elements = table.elements[decks]
+    next_alive = _next_alive_table(cards)
+    first_alive = next_alive[0]
+
+    # Урон после защиты для каждой пары (атакующий, цель) на стороне противника,
+    # как в CardInstance.calculate_damage: [бои, сторона атакующего, атакующий, цель]
+    multiplier = table.multipliers[elements[:, :, :, None], elements[:, ::-1, None, :]]
+    damage = np.maximum(
+        0,
+        (stats['attack'][:, :, :, None] * multiplier).astype(np.int64) - stats['defense'][:, ::-1, None, :],
+    )
+
+    # Состояние хранится плоско: слот карты = сторона * cards + позиция.
+    # Массивы содержат только идущие бои, original - их номера в выборке
+    health = stats['health'].reshape(battles, slots).copy()
+    max_health = stats['health'].reshape(battles, slots)
+    attack = stats['attack'].reshape(battles, slots)
+    healers = table.healers[elements].reshape(battles, slots)
+    damage = damage.reshape(battles, slots * cards)
+    next_index = np.zeros((battles, 2), dtype=np.int64)
+    original = np.arange(battles)
+    done = np.zeros(battles, dtype=bool)
+
+    winners = np.full(battles, DRAW, dtype=np.int8)
+    turns = np.full(battles, table.max_turns, dtype=np.int64)
+
+    for turn in range(table.max_turns):
+        side = turn % 2
+        other = 1 - side
+        ally_base = side * cards
+        enemy_base = other * cards
+        alive = health > 0
+        ally_codes = _alive_codes(alive, ally_base, cards)
+        enemy_codes = _alive_codes(alive, enemy_base, cards)
+
+        allies_left = ally_codes > 0
+        finished = ~done & ~(allies_left & (enemy_codes > 0))
+        winners[original[finished & ~allies_left]] = other
+        winners[original[finished & allies_left]] = side
+        turns[original[finished]] = turn
+        done |= finished
+
+        if turn % slots == 0:
+            # Атакуют всегда первого живого врага. Если ни одна живая карта
+            # не пробивает его защиту ни с одной стороны, бой закончится ничьей
+            # по лимиту ходов - досчитывать его не нужно
+            hurt = np.zeros(original.size, dtype=bool)
+            row_damage = np.arange(original.size) * (slots * cards)
+            for base, first_enemy in (
+                (ally_base, first_alive[enemy_codes]),
+                (enemy_base, first_alive[ally_codes]),
+            ):
+                for i in range(cards):
+                    hurt |= alive[:, base + i] & (damage.ravel()[row_damage + (base + i) * cards + first_enemy] > 0)
+            done |= ~hurt
+
+        # Закончившиеся бои вычеркиваются пачками, до этого они доигрываются вхолостую
+        finished_count = np.count_nonzero(done)
+        if finished_count == original.size:
+            break
+        if finished_count * 4 > original.size:
+            keep = ~done
+            original, health, max_health, attack = original[keep], health[keep], max_health[keep], attack[keep]
+            healers, damage, next_index = healers[keep], damage[keep], next_index[keep]
+            ally_codes, enemy_codes = ally_codes[keep], enemy_codes[keep]
+            done = done[keep]
+
+        rows = np.arange(original.size)
+        row_slots = rows * slots
+        flat_health = health.ravel()
+
+        # Следующая живая карта стороны по кругу
+        attacker = next_alive[next_index[:, side], ally_codes]
+        next_index[:, side] = (attacker + 1) % cards
+        attacker_slot = ally_base + attacker
+        target = first_alive[enemy_codes]
+
+        # Целитель лечит самого раненого союзника, если такой есть
+        heal_rows = rows[healers.ravel()[row_slots + attacker_slot]]
+        if heal_rows.size:
+            ally_health = health[heal_rows, ally_base:ally_base + cards]
+            wounded = (ally_health > 0) & (
+                ally_health < max_health[heal_rows, ally_base:ally_base + cards] * table.heal_threshold
+            )
+            has_wounded = wounded.any(axis=1)
+            heal_rows, wounded, ally_health = heal_rows[has_wounded], wounded[has_wounded], ally_health[has_wounded]
+
+        if heal_rows.size:
+            heal_target = np.where(wounded, ally_health, np.iinfo(np.int64).max).argmin(axis=1)
+            heal_index = heal_rows * slots + ally_base + heal_target
+            flat_health[heal_index] += np.minimum(
+                attack.ravel()[heal_rows * slots + attacker_slot[heal_rows]],
+                max_health.ravel()[heal_index] - flat_health[heal_index],
+            )
+
+            attacks = np.ones(rows.size, dtype=bool)
+            attacks[heal_rows] = False
+            rows, attacker_slot, target = rows[attacks], attacker_slot[attacks], target[attacks]
+
+        # Остальные атакуют первого живого врага
+        target_index = rows * slots + enemy_base + target
+        flat_health[target_index] -= np.minimum(
+            flat_health[target_index],
+            damage.ravel()[rows * (slots * cards) + attacker_slot * cards + target],
+        )
+
+    return winners, turns
+
+
+def empty_tally(table):
+    templates_count = len(table)
+    elements_count = len(table.element_codes)
+    return {
+        'battles': 0,
+        'draws': 0,
+        'turns': 0,
+        'template_games': np.zeros((templates_count, templates_count), dtype=np.int64),
+        'template_wins': np.zeros((templates_count, templates_count), dtype=np.int64),
+        'template_draws': np.zeros((templates_count, templates_count), dtype=np.int64),
+        'element_games': np.zeros((elements_count, elements_count), dtype=np.int64),
+        'element_wins': np.zeros((elements_count, elements_count), dtype=np.int64),
+        'element_draws': np.zeros((elements_count, elements_count), dtype=np.int64),
+    }
+
+
+def _count_pairs(own, enemy, won, draw, size):
+    """Игры, победы и ничьи для всех пар (своя карта, карта соперника)"""
+    cards = own.shape[1]
+    pairs = (np.repeat(own, cards, axis=1) * size + np.tile(enemy, (1, cards))).ravel()
+    repeat = cards * cards
+    minlength = size * size
+    return (
+        np.bincount(pairs, minlength=minlength).reshape(size, size),
+        np.bincount(pairs, weights=np.repeat(won, repeat), minlength=minlength).astype(np.int64).reshape(size, size),
+        np.bincount(pairs, weights=np.repeat(draw, repeat), minlength=minlength).astype(np.int64).reshape(size, size),
+    )
+
+
+def tally(table, decks, winners, turns):
+    """Свести результаты боев в матрицы побед по шаблонам и стихиям"""
+    result = empty_tally(table)
+    result['battles'] = len(winners)
+    result['draws'] = int((winners == DRAW).sum())
+    result['turns'] = int(turns.sum())
+
+    draw = winners == DRAW
+    elements = table.elements[decks]
+    for side, other in ((SIDE_A, SIDE_B), (SIDE_B, SIDE_A)):
+        won = winners == side
+        for prefix, values, size in (
+            ('template', decks, len(table)),
+            ('element', elements, len(table.element_codes)),
+        ):
+            games, wins, draws = _count_pairs(values[:, side], values[:, other], won, draw, size)
+            result[f'{prefix}_games'] += games
+            result[f'{prefix}_wins'] += wins
+            result[f'{prefix}_draws'] += draws
+    return result
+
+
+def merge_tallies(tallies):
+    merged = None
+    for part in tallies:
+        if merged is None:
+            merged = part
+            continue
+        for key, value in part.items():
+            merged[key] += value
+    return merged
+
+
+def simulate_chunk(table, battles, seed):
+    """Сэмплировать и провести battles боев (выполняется в рабочем процессе)"""
+    rng = np.random.default_rng(seed)
+    decks = sample_decks(rng, len(table), battles)
+    stats = roll_stats(rng, table, decks)
+    winners, turns = simulate(table, decks, stats)
+    return tally(table, decks, winners, turns)
+
+
+def run_simulation(table, battles, seed=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Провести battles боев пачками по chunk_size.
+
+    У каждой пачки свой независимый seed, поэтому результат при заданном
+    seed не зависит от числа рабочих процессов.
+    """
+    sizes = [chunk_size] * (battles // chunk_size)
+    if battles % chunk_size:
+        sizes.append(battles % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tables = [table] * len(sizes)
+
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return merge_tallies(executor.map(simulate_chunk, tables, sizes, seeds))
+    return merge_tallies(map(simulate_chunk, tables, sizes, seeds))
+
+
+def win_rates(wins, draws, games):
+    """Доля побед (ничья - половина победы); NaN там, где игр не было"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (wins + draws / 2) / games
@@ -1,3 +1,436 @@
-from django.test import TestCase
+import random
+from importlib import import_module
+from io import StringIO
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ggame.testing import QueryPlanAssertions
+from users.currency import credit
+from users.models import TelegramUser, CurrencyTransaction
+from .catalog import CATALOG_CACHE_KEY, get_catalog_snapshot
+from .battle import Combatant, persist_result, resolve_battle
+from .models import AnimeUniverse, Season, CardTemplate, CardInstance, CollectionEntry, Deck, DeckCard
+from .packs import build_card_instances
+from .profile import get_cached_user_profile, get_profile_cache_key
+from .simulation import DECK_SIZE, DRAW, SIDE_A, SIDE_B, load_templates, roll_stats, sample_decks, simulate
+
+
+def create_template(**fields):
+    universe = AnimeUniverse.objects.create(name=fields.pop('universe_name', 'Universe'))
+    season = Season.objects.create(anime_universe=universe, name='Season 1', season_number=1)
+    return CardTemplate.objects.create(
+        name=fields.pop('name', 'Card'),
+        anime_universe=universe,
+        season=season,
+        **fields
+    )
+
+
+class HotQueryPlanTests(QueryPlanAssertions, TestCase):
+    """Горячие запросы к картам идут по индексам"""
+
+    def test_collection_by_owner(self):
+        queryset = CardInstance.objects.filter(owner_id=1).order_by('-acquired_at', '-id')
+        self.assertUsesIndex(queryset, 'card_owner_acquired_idx', ordered=True)
+
+    def test_template_instances_of_owner(self):
+        queryset = CardInstance.objects.filter(owner_id=1, template_id=1)
+        self.assertUsesIndex(queryset, 'card_owner_template_idx', ordered=True)
+
+    def test_owner_cards_in_deck(self):
+        queryset = CardInstance.objects.filter(owner_id=1, is_in_deck=True)
+        self.assertUsesIndex(queryset, 'card_owner_in_deck_idx', ordered=True)
+
+    def test_active_templates(self):
+        queryset = CardTemplate.objects.filter(is_active=True)
+        self.assertUsesIndex(queryset, 'template_active_idx', ordered=True)
+
+
+class ProfileCacheTests(TestCase):
+    """Кэш профиля сбрасывается только после коммита"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = TelegramUser.objects.create(username='player', telegram_id=1)
+
+    def test_invalidated_on_commit(self):
+        get_cached_user_profile(self.user)
+        key = get_profile_cache_key(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            credit(self.user, coins=10)
+            # До коммита параллельный запрос не должен закэшировать старый баланс
+            self.assertIsNotNone(cache.get(key))
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(get_cached_user_profile(self.user)['user']['coins'], self.user.coins)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = TelegramUser.objects.create(username='reader', telegram_id=2)
+        create_template(name='Hero')
+
+    def test_requires_authentication(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(reverse('catalog'))['ETag']
+        self.client.logout()
+
+        # Версия каталога не раскрывается без аутентификации, даже при совпадении ETag
+        for headers in ({}, {'HTTP_IF_NONE_MATCH': etag}):
+            response = self.client.get(reverse('catalog'), **headers)
+            self.assertIn(response.status_code, (401, 403))
+            self.assertNotIn('ETag', response)
+
+    def test_not_modified_by_etag(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('catalog'))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('catalog'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0)
+    def test_cache_expires(self):
+        get_catalog_snapshot()
+        self.assertIsNone(cache.get(CATALOG_CACHE_KEY))
+
+
+class CardPurchaseTests(TestCase):
+    """Покупка и продажа карт через журнал валюты"""
+
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='buyer', telegram_id=2, coins=15)
+        self.client.force_login(self.user)
+        self.template = create_template(coin_cost=10, sell_price=5)
+
+    def test_acquire_with_insufficient_balance(self):
+        self.client.post('/api/cards/instances/acquire_card/', {'template_id': self.template.pk})
+        response = self.client.post('/api/cards/instances/acquire_card/', {'template_id': self.template.pk})
+
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 5)
+        # Карта не создается без списания
+        self.assertEqual(CardInstance.objects.filter(owner=self.user).count(), 1)
+        self.assertEqual(CurrencyTransaction.objects.filter(user=self.user).count(), 1)
+
+    def test_card_is_sold_once(self):
+        card = CardInstance.objects.create(template=self.template, owner=self.user)
+        url = f'/api/cards/instances/{card.pk}/sell_card/'
+
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 20)
+        self.assertEqual(CurrencyTransaction.objects.filter(user=self.user, reason='card_sale').count(), 1)
+
+    def test_delete_through_viewset_updates_collection(self):
+        card = CardInstance.objects.create(template=self.template, owner=self.user)
+
+        response = self.client.delete(f'/api/cards/instances/{card.pk}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(CollectionEntry.objects.filter(owner=self.user).exists())
+
+    def test_repeated_delete_keeps_collection(self):
+        card, _ = [CardInstance.objects.create(template=self.template, owner=self.user) for _ in range(2)]
+        stale = CardInstance.objects.get(pk=card.pk)
+
+        self.assertEqual(self.client.post(f'/api/cards/instances/{card.pk}/sell_card/').status_code, 200)
+        # Параллельный запрос удаляет ту же карту: 0 строк, но post_delete все равно приходит
+        self.assertEqual(stale.delete()[0], 0)
+
+        entry = CollectionEntry.objects.get(owner=self.user, template=self.template)
+        self.assertEqual(entry.copies, 1)
+
+
+class PackTests(TestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='opener', telegram_id=3)
+        self.templates = [
+            create_template(name='Weak', universe_name='Universe 1', health_min=10, health_max=12,
+                            attack_min=1, attack_max=3, defense_min=0, defense_max=1),
+            create_template(name='Strong', universe_name='Universe 2', health_min=90, health_max=99,
+                            attack_min=40, attack_max=45, defense_min=10, defense_max=20),
+        ]
+
+    def test_stats_within_template_ranges(self):
+        cards = build_card_instances(self.user, self.templates * 20, random.Random(5))
+
+        for card in cards:
+            template = card.template
+            self.assertTrue(template.health_min <= card.health <= template.health_max)
+            self.assertTrue(template.attack_min <= card.attack <= template.attack_max)
+            self.assertTrue(template.defense_min <= card.defense <= template.defense_max)
+            self.assertEqual(card.current_health, card.health)
+
+    def test_stats_reproducible_with_seed(self):
+        first, second = (
+            [(card.health, card.attack, card.defense)
+             for card in build_card_instances(self.user, self.templates, random.Random(5))]
+            for _ in range(2)
+        )
+        self.assertEqual(first, second)
+
+
+class DeckTotalsTests(TestCase):
+    """Агрегаты колоды совпадают с ее картами после любых изменений"""
+
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='builder', telegram_id=4)
+        self.deck = Deck.objects.create(owner=self.user)
+        self.cards = [
+            CardInstance.objects.create(
+                template=create_template(name=f'Card {number}', universe_name=f'Universe {number}'),
+                owner=self.user,
+            )
+            for number in range(3)
+        ]
+
+    def assertTotals(self, cards, is_playable):
+        self.deck.refresh_from_db()
+        self.assertEqual(
+            (self.deck.cards_count, self.deck.total_health, self.deck.total_attack, self.deck.total_defense),
+            (
+                len(cards),
+                sum(card.health for card in cards),
+                sum(card.attack for card in cards),
+                sum(card.defense for card in cards),
+            ),
+        )
+        self.assertEqual(self.deck.is_playable, is_playable)
+
+    def test_add_and_remove_cards(self):
+        deck_cards = [
+            DeckCard.objects.create(deck=self.deck, card=card, position=position)
+            for position, card in enumerate(self.cards, start=1)
+        ]
+        self.assertTotals(self.cards, is_playable=True)
+
+        deck_cards[0].delete()
+        self.assertTotals(self.cards[1:], is_playable=False)
+
+    def test_duplicate_template_is_not_playable(self):
+        duplicate = CardInstance.objects.create(template=self.cards[0].template, owner=self.user)
+        for position, card in enumerate([self.cards[0], duplicate, self.cards[1]], start=1):
+            DeckCard.objects.create(deck=self.deck, card=card, position=position)
+
+        self.assertTotals([self.cards[0], duplicate, self.cards[1]], is_playable=False)
+
+    def test_card_stat_changes(self):
+        for position, card in enumerate(self.cards, start=1):
+            DeckCard.objects.create(deck=self.deck, card=card, position=position)
+
+        card = self.cards[0]
+        card.attack += 7
+        card.save(update_fields=['attack'])
+        self.assertTotals(self.cards, is_playable=True)
+
+        # Урон в бою меняет только current_health и агрегаты не пересчитывает
+        card.current_health = 1
+        card.save(update_fields=['current_health'])
+        self.assertTotals(self.cards, is_playable=True)
+
+    def test_migration_backfill(self):
+        fill_deck_totals = import_module('cards.migrations.0005_deck_totals').fill_deck_totals
+        for position, card in enumerate(self.cards, start=1):
+            DeckCard.objects.create(deck=self.deck, card=card, position=position)
+        Deck.objects.update(cards_count=0, total_health=0, total_attack=0, total_defense=0, is_playable=False)
+
+        fill_deck_totals(django_apps, None)
+
+        self.assertTotals(self.cards, is_playable=True)
+
+
+class DeckQueryCountTests(TestCase):
+    """Число запросов колоды и профиля не растет с числом карт"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = TelegramUser.objects.create(username='counter', telegram_id=5)
+        self.deck = Deck.objects.create(owner=self.user)
+        self.client.force_login(self.user)
+
+    def add_cards(self, numbers):
+        for number in numbers:
+            card = CardInstance.objects.create(
+                template=create_template(name=f'Card {number}', universe_name=f'Universe {number}'),
+                owner=self.user,
+            )
+            DeckCard.objects.create(deck=self.deck, card=card, position=number)
+
+    def count_queries(self, url, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, **params):
+        self.add_cards([1])
+        expected = self.count_queries(url, **params)
+        self.add_cards([2, 3])
+        cache.clear()
+        with self.assertNumQueries(expected):
+            self.client.get(url, params)
+
+    def test_deck_detail(self):
+        self.assertConstantQueries('/api/cards/decks/')
+
+    def test_user_profile(self):
+        self.assertConstantQueries('/api/cards/instances/get_user_profile/', telegram_id=self.user.telegram_id)
+
+
+class CardPaginationTests(TestCase):
+    """Курсорная выдача карт: next ведет по всем картам без повторов и пропусков"""
+
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='collector', telegram_id=6)
+        self.client.force_login(self.user)
+        template = create_template()
+        cards = [CardInstance.objects.create(template=template, owner=self.user) for _ in range(5)]
+        # Одинаковое время получения: порядок держится на id
+        same_time = cards[0].acquired_at
+        CardInstance.objects.filter(pk__in=[card.pk for card in cards[1:4]]).update(acquired_at=same_time)
+        self.expected = list(
+            CardInstance.objects.filter(owner=self.user).order_by('-acquired_at', '-id').values_list('id', flat=True)
+        )
+
+    def test_traverse_pages_by_cursor(self):
+        seen = []
+        url = '/api/cards/instances/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(set(data), {'next', 'previous', 'results'})
+            seen.extend(card['id'] for card in data['results'])
+            url = data['next']
+            if url:
+                self.assertIn('cursor=', url)
+
+        self.assertEqual(seen, self.expected)
+
+
+class BattleTests(TestCase):
+    """Бой сохраняет итог только для карт игрока"""
+
+    def setUp(self):
+        self.player = TelegramUser.objects.create(username='player', telegram_id=3)
+        self.opponent = TelegramUser.objects.create(username='opponent', telegram_id=4)
+        templates = [create_template(name=f'Card {i}', universe_name=f'Universe {i}') for i in range(3)]
+        self.player_cards = self.build_deck(self.player, templates)
+        self.opponent_cards = self.build_deck(self.opponent, templates)
+        self.client.force_login(self.player)
+
+    def build_deck(self, owner, templates):
+        deck, _ = Deck.objects.get_or_create(owner=owner)
+        cards = []
+        for position, template in enumerate(templates, start=1):
+            card = CardInstance.objects.create(template=template, owner=owner)
+            DeckCard.objects.create(deck=deck, card=card, position=position)
+            cards.append(card)
+        return cards
+
+    def battle(self):
+        return self.client.post('/api/cards/decks/battle/', {'opponent_id': self.opponent.pk})
+
+    def state(self, cards):
+        return list(
+            CardInstance.objects.filter(pk__in=[card.pk for card in cards])
+            .order_by('pk').values_list('current_health', 'experience')
+        )
+
+    def test_opponent_cards_are_not_changed(self):
+        opponent_state = self.state(self.opponent_cards)
+
+        response = self.battle()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.data['turns'], 0)
+        self.assertEqual(self.state(self.opponent_cards), opponent_state)
+        self.assertTrue(all(experience > 0 for _, experience in self.state(self.player_cards)))
+
+    def test_knocked_out_card_blocks_battle(self):
+        CardInstance.objects.filter(pk=self.player_cards[0].pk).update(current_health=0)
+        player_state = self.state(self.player_cards)
+
+        response = self.battle()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.state(self.player_cards), player_state)
+
+    def test_battle_without_turns_gives_no_experience(self):
+        card = self.player_cards[0]
+        dead = Combatant.from_card(card, 'a', 1)
+        dead.health = 0
+        result = resolve_battle([dead], [Combatant.from_card(self.opponent_cards[0], 'b', 1)])
+        self.assertEqual(result.turns, 0)
+
+        persist_result(result, [card])
+
+        card.refresh_from_db()
+        self.assertEqual(card.experience, 0)
+
+
+class SimulationTests(TestCase):
+    """Векторная симуляция следует правилам resolve_battle"""
+
+    def setUp(self):
+        elements = ['fire', 'water', 'earth', 'air', 'light', 'dark', 'neutral']
+        for number, element in enumerate(elements):
+            create_template(
+                name=f'Card {number}',
+                universe_name=f'Universe {number}',
+                element=element,
+                health_min=20, health_max=60,
+                attack_min=5, attack_max=25,
+                defense_min=0, defense_max=8,
+            )
+        self.table = load_templates()
+
+    def test_same_outcome_as_resolve_battle(self):
+        rng = np.random.default_rng(7)
+        decks = sample_decks(rng, len(self.table), 300)
+        stats = roll_stats(rng, self.table, decks)
+
+        winners, turns = simulate(self.table, decks, stats)
+
+        side_codes = {'a': SIDE_A, 'b': SIDE_B, None: DRAW}
+        for battle in range(len(decks)):
+            sides = [
+                [
+                    Combatant(
+                        card_id=side * DECK_SIZE + position,
+                        side='ab'[side],
+                        position=position,
+                        template_id=int(self.table.ids[decks[battle, side, position]]),
+                        element=self.table.element_codes[self.table.elements[decks[battle, side, position]]],
+                        max_health=int(stats['health'][battle, side, position]),
+                        health=int(stats['health'][battle, side, position]),
+                        attack=int(stats['attack'][battle, side, position]),
+                        defense=int(stats['defense'][battle, side, position]),
+                    )
+                    for position in range(DECK_SIZE)
+                ]
+                for side in (SIDE_A, SIDE_B)
+            ]
+            result = resolve_battle(*sides)
+            self.assertEqual(
+                (side_codes[result.winner], result.turns),
+                (int(winners[battle]), int(turns[battle])),
+                f'бой {battle}',
+            )
+
+    def test_command_smoke(self):
+        out = StringIO()
+        call_command('simulate_balance', battles=200, chunk_size=50, seed=1, stdout=out)
+        self.assertIn('200', out.getvalue())
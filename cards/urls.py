@@ -11,5 +11,6 @@ router.register(r'instances', views.CardInstanceViewSet, basename='cardinstance'
 router.register(r'decks', views.DeckViewSet, basename='deck')
 
 urlpatterns = [
+    path('catalog/', views.get_catalog, name='catalog'),
     path('', include(router.urls)),
 ]
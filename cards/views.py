@@ -1,6 +1,12 @@
+import logging
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from .models import AnimeUniverse, Season, CardTemplate, CardInstance, Deck, DeckCard
@@ -9,13 +15,36 @@ from .serializers import (
     CardTemplateSerializer, CardInstanceSerializer,
     DeckSerializer, DeckCardSerializer
 )
+from .battle import BattleError, run_battle
+from .catalog import get_catalog_snapshot
+from .collection import get_collection_stats, remove_from_collection
+from .packs import PackError, acquire_cards, open_pack
+from .profile import get_cached_user_profile
+from users.models import TelegramUser
+from users.currency import InsufficientFunds, credit, debit
+from ggame.pagination import AcquiredAtPagination
+
+logger = logging.getLogger(__name__)
+
+
+def _get_optional_int(request, name):
+    """Целое из query-параметра или None"""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(name)
 
 
 class AnimeUniverseViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для просмотра аниме-вселенных
     """
-    queryset = AnimeUniverse.objects.filter(is_active=True)
+    queryset = AnimeUniverse.objects.filter(is_active=True).annotate(
+        active_seasons_count=Count('seasons', filter=Q(seasons__is_active=True))
+    ).order_by('name')
     serializer_class = AnimeUniverseSerializer
     permission_classes = [IsAuthenticated]
 
@@ -24,13 +53,13 @@ class SeasonViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для просмотра сезонов
     """
-    queryset = Season.objects.filter(is_active=True)
+    queryset = Season.objects.filter(is_active=True).select_related('anime_universe')
     serializer_class = SeasonSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         """Фильтр по аниме-вселенной"""
-        queryset = Season.objects.filter(is_active=True)
+        queryset = Season.objects.filter(is_active=True).select_related('anime_universe')
         universe_id = self.request.query_params.get('universe', None)
         if universe_id:
             queryset = queryset.filter(anime_universe_id=universe_id)
@@ -41,7 +70,7 @@ class CardTemplateViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для просмотра шаблонов карт
     """
-    queryset = CardTemplate.objects.filter(is_active=True)
+    queryset = CardTemplate.objects.filter(is_active=True).select_related('anime_universe', 'season')
     serializer_class = CardTemplateSerializer
     permission_classes = [IsAuthenticated]
 
@@ -57,11 +86,35 @@ class CardTemplateViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_catalog(request):
+    """
+    Весь каталог одним ответом: вселенные, сезоны и шаблоны карт.
+
+    Версия - хэш содержимого, отдается как ETag; при совпадении
+    If-None-Match ответ 304 без тела. Версия сверяется уже после
+    аутентификации DRF, поэтому анонимный запрос ее не узнает.
+    """
+    snapshot = get_catalog_snapshot()
+    etag = quote_etag(snapshot['version'])
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(snapshot['body'], content_type='application/json')
+    response['ETag'] = etag
+    # Клиент хранит ответ, но каждый раз сверяет версию
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 class CardInstanceViewSet(viewsets.ModelViewSet):
     """
     ViewSet для управления картами игрока
     """
     serializer_class = CardInstanceSerializer
+    pagination_class = AcquiredAtPagination
 
     def get_permissions(self):
         """Разрешить доступ без аутентификации для запросов с telegram_id"""
@@ -75,18 +128,28 @@ class CardInstanceViewSet(viewsets.ModelViewSet):
         if telegram_id:
             # Получаем пользователя по telegram_id
             try:
-                from users.models import TelegramUser
                 user = TelegramUser.objects.get(telegram_id=telegram_id)
-                return CardInstance.objects.filter(owner=user)
+                return self.with_related(CardInstance.objects.filter(owner=user))
             except TelegramUser.DoesNotExist:
                 return CardInstance.objects.none()
 
         # Для аутентифицированных пользователей - их карты
         if self.request.user.is_authenticated:
-            return CardInstance.objects.filter(owner=self.request.user)
+            return self.with_related(CardInstance.objects.filter(owner=self.request.user))
 
         return CardInstance.objects.none()
 
+    def with_related(self, queryset):
+        """Владелец и шаблон со вселенной и сезоном для сериализатора"""
+        return queryset.select_related('owner', 'template__anime_universe', 'template__season')
+
+    def perform_destroy(self, instance):
+        """Удаленная карта убирается из индекса коллекции (только если строку удалил этот запрос)"""
+        with transaction.atomic():
+            deleted, by_model = instance.delete()
+            if by_model.get(CardInstance._meta.label):
+                remove_from_collection(instance.owner_id, [instance.template_id])
+
     @action(detail=False, methods=['post'])
     def acquire_card(self, request):
         """Получить новую карту (из шаблона)"""
@@ -105,28 +168,79 @@ class CardInstanceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Проверяем стоимость
-        user = request.user
-        if user.coins < template.coin_cost or user.gold < template.gold_cost:
+        # Списываем стоимость и создаем карту в одной транзакции
+        try:
+            with transaction.atomic():
+                debit(
+                    request.user,
+                    coins=template.coin_cost,
+                    gold=template.gold_cost,
+                    reason='card_purchase',
+                    reference=f'template:{template.id}'
+                )
+                # Характеристики сгенерируются автоматически
+                card_instance = CardInstance.objects.create(
+                    template=template,
+                    owner=request.user
+                )
+        except InsufficientFunds:
             return Response(
                 {'error': 'Недостаточно валюты'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Списываем стоимость
-        user.coins -= template.coin_cost
-        user.gold -= template.gold_cost
-        user.save()
-
-        # Создаем карту (характеристики сгенерируются автоматически)
-        card_instance = CardInstance.objects.create(
-            template=template,
-            owner=user
-        )
-
         serializer = self.get_serializer(card_instance)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def acquire_cards(self, request):
+        """Купить несколько карт по списку template_ids одним списанием"""
+        template_ids = request.data.get('template_ids') or []
+        try:
+            template_ids = [int(template_id) for template_id in template_ids]
+            cards = acquire_cards(request.user, template_ids)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'template_ids должен быть списком id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except PackError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientFunds:
+            return Response(
+                {'error': 'Недостаточно валюты'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return self.get_cards_response(cards)
+
+    @action(detail=False, methods=['post'])
+    def open_pack(self, request):
+        """Открыть набор случайных карт (можно ограничить вселенной или сезоном)"""
+        try:
+            cards = open_pack(
+                request.user,
+                universe_id=request.data.get('universe_id'),
+                season_id=request.data.get('season_id')
+            )
+        except PackError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientFunds:
+            return Response(
+                {'error': 'Недостаточно валюты'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return self.get_cards_response(cards)
+
+    def get_cards_response(self, cards):
+        """Новые карты и актуальный баланс пользователя"""
+        return Response({
+            'cards': self.get_serializer(cards, many=True).data,
+            'coins': self.request.user.coins,
+            'gold': self.request.user.gold,
+        })
+
     @action(detail=True, methods=['post'])
     def toggle_deck(self, request, pk=None):
         """Добавить/убрать карту из колоды"""
@@ -152,12 +266,25 @@ class CardInstanceViewSet(viewsets.ModelViewSet):
         card = self.get_object()
         sell_price = card.template.sell_price
 
-        # Начисляем монеты игроку
-        card.owner.coins += sell_price
-        card.owner.save()
-
-        # Удаляем карту
-        card.delete()
+        with transaction.atomic():
+            # Удаляем карту; если ее уже продали параллельным запросом, ничего не начисляем
+            deleted, by_model = card.delete()
+            if not by_model.get(CardInstance._meta.label):
+                return Response(
+                    {'error': 'Карта уже продана'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            # post_delete приходит и когда строку уже удалили, поэтому
+            # коллекция уменьшается только после реального удаления
+            remove_from_collection(card.owner_id, [card.template_id])
+
+            # Начисляем монеты игроку
+            credit(
+                card.owner,
+                coins=sell_price,
+                reason='card_sale',
+                reference=f'template:{card.template_id}'
+            )
 
         return Response({
             'message': f'Карта продана за {sell_price} монет',
@@ -167,139 +294,40 @@ class CardInstanceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get', 'options'])
     def get_user_profile(self, request):
         """Получить профиль пользователя с его картами и колодой"""
-        print("=== NEW CODE VERSION v4: get_user_profile START ===")
-        print(f"DEBUG: Request method: {request.method}")
-        print(f"DEBUG: Request path: {request.path}")
-        print(f"DEBUG: Request user: {request.user}")
-        print(f"DEBUG: Request auth: {request.auth}")
-        print(f"DEBUG: Request authenticated: {request.user.is_authenticated}")
-        print(f"DEBUG: Request headers: {dict(request.headers)}")
-        print("=== VIEW METHOD CALLED SUCCESSFULLY ===")
+        telegram_id = request.query_params.get('telegram_id')
 
-        try:
-            print(f"DEBUG: get_user_profile called with params: {request.query_params}")
-
-            telegram_id = request.query_params.get('telegram_id')
-            print(f"DEBUG: telegram_id = {telegram_id} (type: {type(telegram_id)})")
-
-            if telegram_id:
-                # Конвертируем telegram_id в int если нужно
-                try:
-                    telegram_id_int = int(telegram_id)
-                    print(f"DEBUG: Converted telegram_id to int: {telegram_id_int}")
-                except (ValueError, TypeError):
-                    print(f"DEBUG: Failed to convert telegram_id {telegram_id} to int")
-                    return Response(
-                        {'error': 'Invalid telegram_id format'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # Получаем пользователя по telegram_id
-                try:
-                    from users.models import TelegramUser
-                    user = TelegramUser.objects.get(telegram_id=telegram_id_int)
-                    print(f"DEBUG: Found user: {user.username} (ID: {user.id})")
-                except TelegramUser.DoesNotExist:
-                    print(f"DEBUG: User with telegram_id {telegram_id_int} not found, creating...")
-                    # Создать пользователя если не найден
-                    user = TelegramUser.objects.create(
-                        telegram_id=telegram_id_int,
-                        username=f'user_{telegram_id_int}',
-                        coins=1000,
-                        gold=100,
-                    )
-                    print(f"DEBUG: Created new user: {user.username} (ID: {user.id})")
-            elif request.user.is_authenticated:
-                user = request.user
-                print(f"DEBUG: Using authenticated user: {user.username}")
-            else:
-                print("DEBUG: No telegram_id and not authenticated")
+        if telegram_id:
+            try:
+                telegram_id = int(telegram_id)
+            except (ValueError, TypeError):
                 return Response(
-                    {'error': 'Необходим telegram_id или аутентификация'},
-                    status=status.HTTP_401_UNAUTHORIZED
+                    {'error': 'Invalid telegram_id format'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Получаем карты пользователя
-            cards = CardInstance.objects.filter(owner=user)
-            print(f"DEBUG: Found {cards.count()} cards for user")
-
-            # Получить или создать колоду
-            deck, created = Deck.objects.get_or_create(owner=user)
-            print(f"DEBUG: Deck {'created' if created else 'found'}: {deck.name}")
-
-            # Получаем карты колоды с деталями
-            deck_cards_data = []
-            for deck_card in deck.deck_cards.select_related('card__template').all():
-                card = deck_card.card
-                deck_cards_data.append({
-                    'id': card.id,
-                    'position': deck_card.position,
-                    'template': {
-                        'id': card.template.id,
-                        'name': card.template.name,
-                        'element': card.template.element,
-                    },
-                    'health': card.health,
-                    'attack': card.attack,
-                    'defense': card.defense,
-                })
-
-            response_data = {
-                'user': {
-                    'id': user.id,
-                    'telegram_id': user.telegram_id,
-                    'username': user.username,
-                    'first_name': user.first_name or '',
-                    'last_name': user.last_name or '',
-                    'total_games': user.total_games,
-                    'games_won': user.games_won,
-                    'total_points': user.total_points,
-                    'current_streak': user.current_streak,
-                    'best_streak': user.best_streak,
-                    'coins': user.coins,
-                    'gems': getattr(user, 'gems', getattr(user, 'gold', 0)),
-                    'win_rate': user.win_rate,
-                },
-                'cards': [{
-                    'id': card.id,
-                    'template': {
-                        'id': card.template.id,
-                        'name': card.template.name,
-                        'element': card.template.element,
-                    },
-                    'health': card.health,
-                    'attack': card.attack,
-                    'defense': card.defense,
-                    'acquired_at': card.acquired_at.isoformat(),
-                } for card in cards],
-                'deck': {
-                    'id': deck.id,
-                    'name': deck.name,
-                    'cards': deck_cards_data,
-                },
-            }
-
-            print(f"DEBUG: Response data prepared successfully")
-            print(f"DEBUG: Final response structure check...")
-            print(f"DEBUG: User data: {response_data['user']['username']}")
-            print(f"DEBUG: Cards count: {len(response_data['cards'])}")
-            print(f"DEBUG: Deck cards count: {len(response_data['deck']['cards'])}")
-            print(f"DEBUG: About to return Response with status 200")
-
-            response = Response(response_data, status=status.HTTP_200_OK)
-            print(f"DEBUG: Response created: {response.status_code}")
-            return response
+            # Создаем пользователя, если он еще не зарегистрирован
+            user, created = TelegramUser.objects.get_or_create(
+                telegram_id=telegram_id,
+                defaults={
+                    'username': f'user_{telegram_id}',
+                    'coins': 1000,
+                    'gold': 100,
+                }
+            )
+        elif request.user.is_authenticated:
+            user = request.user
+        else:
+            return Response(
+                {'error': 'Необходим telegram_id или аутентификация'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
 
+        try:
+            return Response(get_cached_user_profile(user), status=status.HTTP_200_OK)
         except Exception as e:
-            print(f"=== DEBUG: CRITICAL ERROR in get_user_profile ===")
-            print(f"DEBUG: ERROR MESSAGE: {str(e)}")
-            print(f"DEBUG: ERROR TYPE: {type(e).__name__}")
-            import traceback
-            print(f"DEBUG: FULL TRACEBACK:")
-            print(traceback.format_exc())
-            print(f"=== END DEBUG ===")
+            logger.exception("Ошибка сборки профиля пользователя %s", user.id)
             return Response(
-                {'error': f'Internal server error: {str(e)}', 'traceback': traceback.format_exc()},
+                {'error': f'Internal server error: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
@@ -311,13 +339,22 @@ class DeckViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_deck(self):
-        """Получить или создать колоду для пользователя"""
-        deck, created = Deck.objects.get_or_create(
+        """Получить или создать колоду пользователя вместе с картами"""
+        deck, created = Deck.objects.with_cards().select_related('owner').get_or_create(
             owner=self.request.user,
             defaults={'name': 'Моя колода'}
         )
         return deck
 
+    def get_deck_response(self, deck):
+        """Ответ с актуальным состоянием колоды после изменения"""
+        deck = Deck.objects.with_cards().select_related('owner').get(pk=deck.pk)
+        return Response(DeckSerializer(deck).data)
+
+    def list(self, request):
+        """GET /decks/ - колода пользователя (у игрока одна колода, маршрута с id нет)"""
+        return self.retrieve(request)
+
     def retrieve(self, request):
         """Получить колоду пользователя"""
         deck = self.get_deck()
@@ -362,9 +399,9 @@ class DeckViewSet(viewsets.ViewSet):
             )
 
         # Проверяем уникальность шаблонов в колоде
-        existing_templates = set()
-        for deck_card in deck.deck_cards.all():
-            existing_templates.add(deck_card.card.template_id)
+        existing_templates = {
+            deck_card.card.template_id for deck_card in deck.get_deck_cards()
+        }
 
         if card.template_id in existing_templates:
             return Response(
@@ -372,20 +409,20 @@ class DeckViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Создаем или обновляем связь
-        deck_card, created = DeckCard.objects.get_or_create(
-            deck=deck,
-            position=position,
-            defaults={'card': card}
-        )
+        # Создаем или обновляем связь (агрегаты колоды пересчитываются в той же транзакции)
+        with transaction.atomic():
+            deck_card, created = DeckCard.objects.get_or_create(
+                deck=deck,
+                position=position,
+                defaults={'card': card}
+            )
 
-        if not created:
-            # Если позиция занята, заменяем карту
-            deck_card.card = card
-            deck_card.save()
+            if not created:
+                # Если позиция занята, заменяем карту
+                deck_card.card = card
+                deck_card.save()
 
-        serializer = DeckSerializer(deck)
-        return Response(serializer.data)
+        return self.get_deck_response(deck)
 
     @action(detail=False, methods=['post'])
     def remove_card(self, request):
@@ -401,10 +438,10 @@ class DeckViewSet(viewsets.ViewSet):
 
         try:
             deck_card = DeckCard.objects.get(deck=deck, position=position)
-            deck_card.delete()
+            with transaction.atomic():
+                deck_card.delete()
 
-            serializer = DeckSerializer(deck)
-            return Response(serializer.data)
+            return self.get_deck_response(deck)
 
         except DeckCard.DoesNotExist:
             return Response(
@@ -412,34 +449,68 @@ class DeckViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=False, methods=['post'])
+    def battle(self, request):
+        """Бой колодой игрока против колоды соперника (opponent_id) или близкой по силе"""
+        deck = self.get_deck()
+        if not deck.is_playable:
+            return Response(
+                {'error': deck.is_valid()[1]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        opponents = Deck.objects.with_cards().filter(is_playable=True).exclude(pk=deck.pk)
+        opponent_id = request.data.get('opponent_id')
+        if opponent_id:
+            opponent_deck = opponents.filter(owner_id=opponent_id).first()
+        else:
+            # Ближайшая по атаке колода: два прохода по индексу (is_playable, total_attack)
+            opponent_deck = (
+                opponents.filter(total_attack__gte=deck.total_attack).order_by('total_attack').first()
+                or opponents.filter(total_attack__lt=deck.total_attack).order_by('-total_attack').first()
+            )
+
+        if opponent_deck is None:
+            return Response(
+                {'error': 'Соперник с готовой колодой не найден'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            result = run_battle(deck, opponent_deck)
+        except BattleError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = result.as_dict()
+        data['opponent_id'] = opponent_deck.owner_id
+        return Response(data)
+
     @action(detail=False, methods=['get'])
     def deck(self, request):
         """Получить карты в колоде"""
-        deck_cards = self.get_queryset().filter(is_in_deck=True)
-        serializer = self.get_serializer(deck_cards, many=True)
+        deck_cards = CardInstance.objects.filter(owner=request.user, is_in_deck=True).select_related(
+            'owner', 'template__anime_universe', 'template__season'
+        )
+        serializer = CardInstanceSerializer(deck_cards, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def collection(self, request):
-        """Получить сводку коллекции карт"""
-        instances = self.get_queryset()
-
-        # Группируем по шаблонам
-        templates_count = {}
-        for instance in instances:
-            template_name = instance.template.name
-            templates_count[template_name] = templates_count.get(template_name, 0) + 1
-
-        # Статистика по редкости
-        rarity_stats = {}
-        for instance in instances:
-            rarity = instance.template.get_rarity_display()
-            rarity_stats[rarity] = rarity_stats.get(rarity, 0) + 1
+        """
+        Прогресс коллекции по вселенным, сезонам и стихиям, дубликаты
+        и недостающие шаблоны (можно ограничить universe_id, season_id, element)
+        """
+        try:
+            universe_id = _get_optional_int(request, 'universe_id')
+            season_id = _get_optional_int(request, 'season_id')
+        except ValueError as e:
+            return Response(
+                {'error': f'Некорректный параметр {e}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response({
-            'total_cards': instances.count(),
-            'unique_templates': len(templates_count),
-            'templates_breakdown': templates_count,
-            'rarity_breakdown': rarity_stats,
-            'deck_size': instances.filter(is_in_deck=True).count(),
-        })
+        return Response(get_collection_stats(
+            request.user.pk,
+            universe_id=universe_id,
+            season_id=season_id,
+            element=request.query_params.get('element') or None,
+        ))
@@ -70,6 +70,16 @@ export default {
     })
   },
 
+  // Прогресс коллекции (params: universe_id, season_id, element)
+  getCollection(params = {}) {
+    return api.get('/cards/decks/collection/', { params })
+  },
+
+  // Весь каталог (вселенные, сезоны, шаблоны); браузер сверяет версию по ETag
+  getCatalog() {
+    return api.get('/cards/catalog/')
+  },
+
   // Cards endpoints
   getCardTemplates(params = {}) {
     return api.get('/cards/templates/', { params })
@@ -90,8 +100,10 @@ export default {
   },
 
   // Inventory endpoints
-  getInventory() {
-    return api.get('/inventory/inventory/')
+  // Постранично по курсору: cursor берется из поля next предыдущего ответа
+  getInventory(cursor = null) {
+    const params = cursor ? { cursor } : {}
+    return api.get('/inventory/inventory/', { params })
   },
 
   getItems(params = {}) {
@@ -123,9 +135,41 @@ export default {
     return api.get(`/users/by_telegram/${telegramId}/`)
   },
 
+  // Leaderboard
+  getLeaderboard(page = 1, pageSize = 50) {
+    return api.get('/users/leaderboard/', { params: { page, page_size: pageSize } })
+  },
+
+  getLeaderboardPosition(telegramId, radius = 5) {
+    return api.get(`/users/leaderboard/by_telegram/${telegramId}/`, { params: { radius } })
+  },
+
   getUserCardsByTelegramId(telegramId) {
     return api.get('/cards/instances/', {
       params: { telegram_id: telegramId }
     })
+  },
+
+  // Потоки событий (Server-Sent Events); EventSource не передает заголовки, токен идет в ?token=,
+  // а telegram_id Mini App - в ?telegram_id=, как в getUserProfile
+  openEvents(path) {
+    const url = new URL(`${API_BASE_URL}${path}`, window.location.origin)
+    const token = localStorage.getItem('ggame_token')
+    if (token) {
+      url.searchParams.set('token', token)
+    }
+    const telegramId = localStorage.getItem('telegram_user_id')
+    if (telegramId) {
+      url.searchParams.set('telegram_id', telegramId)
+    }
+    return new EventSource(url.toString())
+  },
+
+  openProfileEvents() {
+    return this.openEvents('/users/events/')
+  },
+
+  openGameEvents(gameId) {
+    return this.openEvents(`/games/${gameId}/events/`)
   }
 }
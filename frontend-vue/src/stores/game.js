@@ -7,15 +7,27 @@ export const useGameStore = defineStore('game', () => {
   const user = ref(null)
   const deck = ref(null)
   const inventory = ref([])
+  const inventoryCursor = ref(null)
+  const inventoryLoadingMore = ref(false)
   const cardTemplates = ref([])
+  const catalog = ref(null)
+  const collection = ref(null)
   const loading = ref(false)
   const error = ref(null)
+  const eventsConnected = ref(false)
+  let profileEvents = null
 
   // Getters
   const userCoins = computed(() => user.value?.coins || 0)
   const userGems = computed(() => user.value?.gems || 0)
   const deckStats = computed(() => deck.value?.total_stats || { health: 0, attack: 0, defense: 0 })
   const isDeckValid = computed(() => deck.value?.is_valid_deck?.valid || false)
+  const inventoryHasMore = computed(() => Boolean(inventoryCursor.value))
+
+  // Курсор следующей страницы из ссылки next (keyset-пагинация API)
+  function cursorFromUrl(url) {
+    return url ? new URL(url).searchParams.get('cursor') : null
+  }
 
   // Actions
   async function fetchUser() {
@@ -49,6 +61,7 @@ export const useGameStore = defineStore('game', () => {
       user.value = profileData.user
       deck.value = profileData.deck
       inventory.value = profileData.cards
+      connectEvents()
 
       console.log('✅ User profile loaded:', { user: user.value, deck: deck.value })
     } catch (err) {
@@ -75,8 +88,8 @@ export const useGameStore = defineStore('game', () => {
   async function addCardToDeck(cardId, position) {
     try {
       loading.value = true
-      await api.addCardToDeck(cardId, position)
-      await fetchDeck()
+      // Ответ уже содержит обновленную колоду
+      deck.value = await api.addCardToDeck(cardId, position)
       return true
     } catch (err) {
       error.value = err.message
@@ -89,8 +102,7 @@ export const useGameStore = defineStore('game', () => {
   async function removeCardFromDeck(cardId) {
     try {
       loading.value = true
-      await api.removeCardFromDeck(cardId)
-      await fetchDeck()
+      deck.value = await api.removeCardFromDeck(cardId)
       return true
     } catch (err) {
       error.value = err.message
@@ -100,11 +112,21 @@ export const useGameStore = defineStore('game', () => {
     }
   }
 
+  async function fetchCollection(params = {}) {
+    try {
+      collection.value = await api.getCollection(params)
+    } catch (err) {
+      console.error('Failed to fetch collection:', err)
+    }
+    return collection.value
+  }
+
   async function fetchInventory() {
     try {
       loading.value = true
       const data = await api.getInventory()
       inventory.value = Array.isArray(data) ? data : data.results || []
+      inventoryCursor.value = cursorFromUrl(data.next)
     } catch (err) {
       error.value = err.message
       console.error('Failed to fetch inventory:', err)
@@ -113,11 +135,42 @@ export const useGameStore = defineStore('game', () => {
     }
   }
 
+  async function fetchMoreInventory() {
+    if (!inventoryCursor.value || inventoryLoadingMore.value) {
+      return false
+    }
+    try {
+      inventoryLoadingMore.value = true
+      const data = await api.getInventory(inventoryCursor.value)
+      inventory.value.push(...(data.results || []))
+      inventoryCursor.value = cursorFromUrl(data.next)
+      return true
+    } catch (err) {
+      error.value = err.message
+      console.error('Failed to fetch more inventory:', err)
+      return false
+    } finally {
+      inventoryLoadingMore.value = false
+    }
+  }
+
+  // Каталог загружается один раз; повторные запросы браузер подтверждает через 304
+  async function fetchCatalog(force = false) {
+    if (catalog.value && !force) {
+      return catalog.value
+    }
+    const data = await api.getCatalog()
+    if (catalog.value?.version !== data.version) {
+      catalog.value = data
+    }
+    return catalog.value
+  }
+
   async function fetchCardTemplates() {
     try {
       loading.value = true
-      const data = await api.getCardTemplates()
-      cardTemplates.value = Array.isArray(data) ? data : data.results || []
+      const data = await fetchCatalog()
+      cardTemplates.value = data.templates
     } catch (err) {
       error.value = err.message
       console.error('Failed to fetch card templates:', err)
@@ -130,8 +183,11 @@ export const useGameStore = defineStore('game', () => {
     try {
       loading.value = true
       await api.acquireCard(templateId)
-      await fetchDeck()
-      await fetchUser()
+      // Баланс приходит событием profile; без потока событий - повторные запросы
+      if (!eventsConnected.value) {
+        await fetchDeck()
+        await fetchUser()
+      }
       return true
     } catch (err) {
       error.value = err.message
@@ -141,6 +197,46 @@ export const useGameStore = defineStore('game', () => {
     }
   }
 
+  // Изменения профиля приходят из потока событий вместо повторных запросов
+  function applyProfileEvent(event) {
+    if (!user.value) {
+      return
+    }
+    const { gold, ...changes } = JSON.parse(event.data)
+    Object.assign(user.value, changes)
+    if (gold !== undefined) {
+      user.value.gold = gold
+      user.value.gems = gold
+    }
+  }
+
+  function connectEvents() {
+    if (profileEvents || typeof EventSource === 'undefined') {
+      return
+    }
+    const events = api.openProfileEvents()
+    profileEvents = events
+    events.addEventListener('profile', applyProfileEvent)
+    events.onopen = () => {
+      eventsConnected.value = true
+    }
+    events.onerror = () => {
+      eventsConnected.value = false
+      // Поток закрыт окончательно (например, 401): следующий connectEvents откроет новый
+      if (events.readyState === EventSource.CLOSED && profileEvents === events) {
+        profileEvents = null
+      }
+    }
+  }
+
+  function disconnectEvents() {
+    if (profileEvents) {
+      profileEvents.close()
+      profileEvents = null
+    }
+    eventsConnected.value = false
+  }
+
   function clearError() {
     error.value = null
   }
@@ -150,14 +246,19 @@ export const useGameStore = defineStore('game', () => {
     user,
     deck,
     inventory,
+    inventoryLoadingMore,
     cardTemplates,
+    catalog,
+    collection,
     loading,
     error,
+    eventsConnected,
     // Getters
     userCoins,
     userGems,
     deckStats,
     isDeckValid,
+    inventoryHasMore,
     // Actions
     fetchUser,
     fetchUserProfile,
@@ -165,8 +266,13 @@ export const useGameStore = defineStore('game', () => {
     addCardToDeck,
     removeCardFromDeck,
     fetchInventory,
+    fetchMoreInventory,
+    fetchCatalog,
+    fetchCollection,
     fetchCardTemplates,
     acquireCard,
+    connectEvents,
+    disconnectEvents,
     clearError
   }
 })
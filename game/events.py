@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from ggame.pubsub import game_channel, publish_on_commit
+from ggame.streams import event_stream_response, get_stream_user
+from .models import GameSession, GameRound, PlayerInGame
+from .serializers import GameSessionSerializer
+
+# После этих событий в сессии больше ничего не происходит
+FINAL_EVENTS = ('game_finished', 'game_cancelled')
+
+
+def round_data(game_round):
+    """Открытый раунд без правильного ответа"""
+    question = game_round.question
+    return {
+        'id': game_round.pk,
+        'round_number': game_round.round_number,
+        'started_at': game_round.started_at,
+        'time_limit_seconds': game_round.time_limit_seconds,
+        'question': {
+            'id': question.pk,
+            'text': question.text,
+            'category': question.category,
+            'difficulty': question.difficulty,
+        },
+    }
+
+
+def publish_game_event(session_id, event_type, data):
+    """Событие сессии уходит подписчикам после фиксации транзакции"""
+    publish_on_commit(game_channel(session_id), event_type, {'session_id': session_id, **data})
+
+
+def get_game_snapshot(session_id):
+    """Состояние сессии для нового подписчика: сессия, игроки и открытый раунд"""
+    session = GameSession.objects.prefetch_related('player_in_game__player').get(pk=session_id)
+    current_round = (
+        GameRound.objects.filter(game_session_id=session_id, started_at__isnull=False, closed_at__isnull=True)
+        .select_related('question')
+        .first()
+    )
+    return {
+        'game': GameSessionSerializer(session).data,
+        'round': round_data(current_round) if current_round else None,
+    }
+
+
+async def game_events(request, session_id):
+    """
+    Поток событий игровой сессии (Server-Sent Events).
+
+    Доступен только участникам игры. Первым приходит snapshot, дальше
+    player_joined, game_started, round_started, answer, round_closed
+    и game_finished/game_cancelled.
+    """
+    user = await get_stream_user(request)
+    if user is None:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+    if not await GameSession.objects.filter(pk=session_id).aexists():
+        return JsonResponse({'error': 'Игра не найдена'}, status=404)
+    if not await PlayerInGame.objects.filter(game_session_id=session_id, player=user).aexists():
+        return JsonResponse({'error': 'Вы не участвуете в этой игре'}, status=403)
+
+    async def get_initial():
+        snapshot = await sync_to_async(get_game_snapshot)(session_id)
+        return [('snapshot', snapshot)]
+
+    return event_stream_response(game_channel(session_id), get_initial, FINAL_EVENTS)
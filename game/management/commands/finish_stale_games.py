@@ -0,0 +1,61 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from ggame.pubsub import get_broker
+from game.scoring import close_expired_rounds
+from game.settlement import BATCH_SIZE, finish_stale_sessions
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Закрытие просроченных раундов и завершение зависших игр'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Проверять каждые N секунд (по умолчанию один раз)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Сколько сессий завершать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        batch_size = options['batch_size']
+        if not get_broker().cross_process:
+            # Раунды и игры все равно завершаются, но их события не дойдут до веб-процесса
+            self.stderr.write(self.style.WARNING(
+                'PUBSUB_BACKEND доставляет события только в своем процессе: подписчики '
+                'веб-сервера не получат их (нужен ggame.pubsub.PostgresBroker)'
+            ))
+        if interval <= 0:
+            self.sweep(batch_size)
+            return
+
+        self.stdout.write(f'⏱ Проверка зависших игр каждые {interval} с (Ctrl+C для остановки)')
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    self.sweep(batch_size)
+                except Exception as e:
+                    logger.exception(f"Ошибка завершения зависших игр: {e}")
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write('Проверка зависших игр остановлена')
+
+    def sweep(self, batch_size):
+        rounds = close_expired_rounds()
+        stats = finish_stale_sessions(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Раундов закрыто: {rounds}, игр отменено: {stats['cancelled']}, "
+            f"завершено: {stats['finished']}"
+        ))
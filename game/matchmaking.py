@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from users.models import TelegramUser
+from .events import publish_game_event
+from .models import GameSession, PlayerInGame
+from .serializers import TelegramUserSerializer
+
+# Сколько открытых сессий пробовать до создания новой
+MATCH_CANDIDATES = 5
+
+
+class MatchmakingError(Exception):
+    """Игрока нельзя посадить в сессию"""
+
+
+class SessionFull(MatchmakingError):
+    """Свободных мест нет (или сессия уже не ждет игроков)"""
+
+
+class AlreadyJoined(MatchmakingError):
+    """Игрок уже в этой сессии"""
+
+
+def join_session(session_id, user):
+    """
+    Занять место в сессии.
+
+    Место занимается условным UPDATE
+    (players_count = players_count + 1 WHERE players_count < max_players),
+    поэтому параллельные входы не переполняют сессию. Повторный вход
+    отсекается уникальностью (player, game_session) и откатывает счетчик.
+    """
+    try:
+        with transaction.atomic():
+            seated = GameSession.objects.filter(
+                pk=session_id,
+                status='waiting',
+                players_count__lt=F('max_players'),
+            ).update(players_count=F('players_count') + 1)
+            if not seated:
+                raise SessionFull('Игра заполнена или уже началась')
+            PlayerInGame.objects.create(player=user, game_session_id=session_id)
+            players_count = GameSession.objects.filter(pk=session_id).values_list('players_count', flat=True).get()
+            publish_game_event(session_id, 'player_joined', {
+                'player': TelegramUserSerializer(user).data,
+                'players_count': players_count,
+            })
+    except IntegrityError:
+        raise AlreadyJoined('Вы уже в игре')
+
+
+def create_session(user, chat_id=None):
+    """Создать сессию сразу с первым игроком"""
+    with transaction.atomic():
+        session = GameSession.objects.create(
+            telegram_chat_id=chat_id,
+            max_players=settings.GAME_SETTINGS.get('MAX_PLAYERS_PER_GAME', 4),
+            players_count=1,
+        )
+        PlayerInGame.objects.create(player=user, game_session=session)
+    return session
+
+
+def find_match(user, chat_id=None):
+    """
+    Подобрать игроку сессию: чат chat_id или общая очередь (chat_id=None).
+
+    Возвращает (сессия, создана ли новая). Сначала заполняются самые
+    полные сессии; если все кандидаты заняты параллельными входами,
+    создается новая сессия.
+    """
+    with transaction.atomic():
+        # Параллельные запросы одного игрока выполняются по очереди,
+        # иначе оба не находят его в очереди и сажают в две сессии.
+        # Запросы разных игроков друг друга не ждут.
+        TelegramUser.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).first()
+
+        open_sessions = GameSession.objects.filter(status='waiting', telegram_chat_id=chat_id)
+
+        # Игрок уже ждет в очереди - повторный запрос возвращает ту же сессию
+        waiting = open_sessions.filter(player_in_game__player=user).first()
+        if waiting:
+            return waiting, False
+
+        candidates = list(
+            open_sessions
+            .filter(players_count__lt=F('max_players'))
+            .order_by('-players_count', 'created_at')
+            .values_list('id', flat=True)[:MATCH_CANDIDATES]
+        )
+        for session_id in candidates:
+            try:
+                join_session(session_id, user)
+            except MatchmakingError:
+                continue
+            return GameSession.objects.get(pk=session_id), False
+
+        return create_session(user, chat_id), True
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_players_count(apps, schema_editor):
+    """Заполняет счетчик игроков для уже существующих сессий"""
+    GameSession = apps.get_model('game', 'GameSession')
+
+    sessions = list(GameSession.objects.annotate(joined=Count('player_in_game')).filter(joined__gt=0))
+    for session in sessions:
+        session.players_count = session.joined
+    GameSession.objects.bulk_update(sessions, ['players_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='players_count',
+            field=models.PositiveIntegerField(default=0, help_text='Поддерживается при входе в игру (game.matchmaking)', verbose_name='Количество игроков'),
+        ),
+        migrations.AlterField(
+            model_name='gamesession',
+            name='telegram_chat_id',
+            field=models.BigIntegerField(blank=True, help_text='Пусто для игр из общей очереди подбора', null=True, verbose_name='Telegram Chat ID'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status', 'telegram_chat_id'], name='game_open_sessions_idx'),
+        ),
+        migrations.RunPython(fill_players_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameround',
+            name='answers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Ответов'),
+        ),
+        migrations.AddField(
+            model_name='gameround',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Завершен'),
+        ),
+        migrations.AddField(
+            model_name='gameround',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Правильных ответов'),
+        ),
+        migrations.AlterField(
+            model_name='gameround',
+            name='started_at',
+            field=models.DateTimeField(blank=True, help_text='Пусто, пока раунд ждет своей очереди', null=True, verbose_name='Начался'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_round_scoring'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='results',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Итоги игры'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_game_results'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gamesession',
+            name='game_open_sessions_idx',
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(condition=models.Q(('status', 'waiting')), fields=['telegram_chat_id', '-players_count', 'created_at'], name='game_waiting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status', '-created_at'], name='game_status_created_idx'),
+        ),
+    ]
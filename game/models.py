@@ -30,6 +30,11 @@ class GameSession(models.Model):
         default=4,
         verbose_name=_("Максимум игроков")
     )
+    players_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Количество игроков"),
+        help_text=_("Поддерживается при входе в игру (game.matchmaking)")
+    )
 
     # Настройки игры
     time_limit = models.PositiveIntegerField(
@@ -43,7 +48,10 @@ class GameSession(models.Model):
 
     # Telegram чат
     telegram_chat_id = models.BigIntegerField(
-        verbose_name=_("Telegram Chat ID")
+        blank=True,
+        null=True,
+        verbose_name=_("Telegram Chat ID"),
+        help_text=_("Пусто для игр из общей очереди подбора")
     )
     telegram_message_id = models.BigIntegerField(
         blank=True,
@@ -51,6 +59,13 @@ class GameSession(models.Model):
         verbose_name=_("Telegram Message ID")
     )
 
+    # Итоги (game.settlement)
+    results = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_("Итоги игры")
+    )
+
     # Время
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -71,29 +86,51 @@ class GameSession(models.Model):
         verbose_name = _("Игровая сессия")
         verbose_name_plural = _("Игровые сессии")
         ordering = ['-created_at']
+        indexes = [
+            # Подбор игры: только ожидающие сессии (частичный индекс, game.matchmaking)
+            models.Index(
+                fields=['telegram_chat_id', '-players_count', 'created_at'],
+                condition=models.Q(status='waiting'),
+                name='game_waiting_idx',
+            ),
+            # Сессии по статусу, сначала новые (поиск зависших, game.settlement)
+            models.Index(fields=['status', '-created_at'], name='game_status_created_idx'),
+            # История игр по курсору (ggame.pagination.CreatedAtPagination)
+            models.Index(fields=['-created_at', '-id'], name='game_created_idx'),
+        ]
 
     def __str__(self):
-        return f"Game {self.id} - {self.get_status_display()} ({self.players.count()}/{self.max_players})"
+        return f"Game {self.id} - {self.get_status_display()} ({self.players_count}/{self.max_players})"
 
     def start_game(self):
-        """Начинает игру"""
-        if self.status == 'waiting' and self.players.count() >= 2:
+        """Начинает игру (условный UPDATE: игра стартует только один раз)"""
+        started_at = timezone.now()
+        started = GameSession.objects.filter(
+            pk=self.pk,
+            status='waiting',
+            players_count__gte=2,
+        ).update(status='active', started_at=started_at)
+        if started:
+            from .events import publish_game_event
+
             self.status = 'active'
-            self.started_at = timezone.now()
-            self.save()
-            return True
-        return False
+            self.started_at = started_at
+            publish_game_event(self.pk, 'game_started', {'started_at': started_at})
+        return bool(started)
 
     def finish_game(self, winner=None):
-        """Завершает игру"""
-        self.status = 'finished'
-        self.finished_at = timezone.now()
-        self.save()
+        """
+        Завершает игру и подводит итоги (game.settlement).
+
+        Без winner победителем считается единственный лидер по очкам.
+        """
+        from .settlement import finish_sessions
 
-        # Обновляем статистику игроков
-        for player_in_game in self.player_in_game.all():
-            won = player_in_game.player == winner if winner else False
-            player_in_game.player.update_stats(won=won, points=player_in_game.points)
+        winners = {self.pk: winner.pk} if winner else None
+        finished = finish_sessions([self.pk], winners=winners)
+        if finished:
+            self.refresh_from_db(fields=['status', 'finished_at', 'results'])
+        return bool(finished)
 
 
 class PlayerInGame(models.Model):
@@ -217,14 +254,31 @@ class GameRound(models.Model):
 
     # Время
     started_at = models.DateTimeField(
-        auto_now_add=True,
-        verbose_name=_("Начался")
+        blank=True,
+        null=True,
+        verbose_name=_("Начался"),
+        help_text=_("Пусто, пока раунд ждет своей очереди")
+    )
+    closed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_("Завершен")
     )
     time_limit_seconds = models.PositiveIntegerField(
         default=60,
         verbose_name=_("Время на ответ (секунды)")
     )
 
+    # Счетчики ответов (переносятся в Question при завершении раунда)
+    answers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Ответов")
+    )
+    correct_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Правильных ответов")
+    )
+
     class Meta:
         verbose_name = _("Раунд игры")
         verbose_name_plural = _("Раунды игры")
@@ -269,6 +323,10 @@ class Answer(models.Model):
         verbose_name = _("Ответ")
         verbose_name_plural = _("Ответы")
         unique_together = ['player', 'game_round']
+        indexes = [
+            # Ответы по курсору (ggame.pagination.AnsweredAtPagination)
+            models.Index(fields=['-answered_at', '-id'], name='answer_answered_idx'),
+        ]
 
     def __str__(self):
         return f"{self.player} -> {self.game_round}: {'✓' if self.is_correct else '✗'}"
@@ -0,0 +1,192 @@
+import heapq
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Question, GameRound
+
+# Как часто подтягивать вопросы, добавленные другими процессами (секунды)
+REFRESH_INTERVAL = 60
+# Сколько раз добирать вопросы, если выбранные успели удалить
+MAX_PICK_ATTEMPTS = 3
+
+
+class QuestionPool:
+    """
+    Пулы id вопросов по (категория, сложность) в памяти процесса.
+
+    Пулы загружаются один раз и дальше обновляются по частям: новые
+    вопросы этого процесса добавляются сигналом, вопросы других процессов
+    подтягиваются запросом id > последний известный id. Выбор вопросов
+    не обращается к таблице (в отличие от order_by('?')).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._pools = {}  # (category, difficulty) -> {question_id: times_asked}
+        self._keys = {}  # question_id -> (category, difficulty)
+        self._max_id = 0
+        self._loaded = False
+        self._refreshed_at = 0.0
+
+    def _rows(self, queryset):
+        return queryset.values_list('id', 'category', 'difficulty', 'times_asked').order_by('id')
+
+    def load(self):
+        """Полная загрузка пулов"""
+        with self._lock:
+            self._pools = {}
+            self._keys = {}
+            self._max_id = 0
+            for row in self._rows(Question.objects.all()).iterator(chunk_size=2000):
+                self._place(*row)
+            self._loaded = True
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """Подтянуть вопросы, добавленные после последней загрузки"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+            for row in self._rows(Question.objects.filter(id__gt=self._max_id)):
+                self._place(*row)
+            self._refreshed_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if not self._loaded or time.monotonic() - self._refreshed_at > REFRESH_INTERVAL:
+            self.refresh()
+
+    def _place(self, question_id, category, difficulty, times_asked):
+        key = (category, difficulty)
+        previous = self._keys.get(question_id)
+        if previous is not None and previous != key:
+            self._pools[previous].pop(question_id, None)
+        self._pools.setdefault(key, {})[question_id] = times_asked
+        self._keys[question_id] = key
+        self._max_id = max(self._max_id, question_id)
+
+    def place(self, question):
+        """Добавить вопрос или перенести его в другой пул после изменения"""
+        with self._lock:
+            if self._loaded:
+                self._place(question.id, question.category, question.difficulty, question.times_asked)
+
+    def discard(self, question_id):
+        with self._lock:
+            key = self._keys.pop(question_id, None)
+            if key is not None:
+                self._pools[key].pop(question_id, None)
+
+    def mark_asked(self, question_ids):
+        """Учесть показы локально, чтобы следующие выборки сразу их видели"""
+        with self._lock:
+            for question_id in question_ids:
+                key = self._keys.get(question_id)
+                if key is not None:
+                    self._pools[key][question_id] += 1
+
+    def size(self, category=None, difficulty=None):
+        with self._lock:
+            return sum(len(pool) for pool in self._matching(category, difficulty))
+
+    def _matching(self, category, difficulty):
+        return [
+            pool for (pool_category, pool_difficulty), pool in self._pools.items()
+            if (category is None or pool_category == category)
+            and (difficulty is None or pool_difficulty == difficulty)
+        ]
+
+    def sample(self, count, category=None, difficulty=None, exclude=(), weighted=True, rng=random):
+        """
+        До count разных id вопросов из подходящих пулов.
+
+        category/difficulty=None означает любую. С weighted=True вопросы,
+        которые показывались реже, выпадают чаще: вес 1 / (1 + times_asked),
+        выборка без возвращения по ключу log(u) / вес (Efraimidis-Spirakis).
+        """
+        self.ensure_fresh()
+        exclude = set(exclude)
+        with self._lock:
+            candidates = [
+                (question_id, times_asked)
+                for pool in self._matching(category, difficulty)
+                for question_id, times_asked in pool.items()
+                if question_id not in exclude
+            ]
+        if count >= len(candidates):
+            chosen = [question_id for question_id, _ in candidates]
+            rng.shuffle(chosen)
+            return chosen
+        if not weighted:
+            return rng.sample([question_id for question_id, _ in candidates], count)
+        # 1 - random() лежит в (0, 1], логарифм определен
+        return [
+            question_id for _, question_id in heapq.nlargest(
+                count,
+                ((math.log(1.0 - rng.random()) * (1 + times_asked), question_id)
+                 for question_id, times_asked in candidates),
+            )
+        ]
+
+
+question_pool = QuestionPool()
+
+
+def get_questions_per_game():
+    return settings.GAME_SETTINGS.get('QUESTIONS_PER_GAME', 10)
+
+
+def pick_questions(count, category=None, difficulty=None, exclude=(), weighted=True, rng=random):
+    """
+    Вопросы для игры в порядке выборки.
+
+    Вопросы читаются одним запросом по первичному ключу; удаленные
+    в другом процессе убираются из пула и добираются заново.
+    """
+    exclude = set(exclude)
+    picked = []
+    for _ in range(MAX_PICK_ATTEMPTS):
+        ids = question_pool.sample(
+            count - len(picked), category, difficulty, exclude, weighted, rng
+        )
+        if not ids:
+            break
+        found = Question.objects.order_by().in_bulk(ids)
+        for question_id in ids:
+            if question_id in found:
+                picked.append(found[question_id])
+            else:
+                question_pool.discard(question_id)
+        exclude.update(ids)
+        if len(picked) >= count:
+            break
+    question_pool.mark_asked([question.id for question in picked])
+    return picked
+
+
+def create_rounds(game_session, count=None, category=None, difficulty=None, rng=random):
+    """
+    Создать раунды сессии одним bulk_create.
+
+    Вопросы не повторяются в пределах сессии; номера раундов
+    продолжают уже созданные.
+    """
+    count = get_questions_per_game() if count is None else count
+    with transaction.atomic():
+        existing = list(
+            GameRound.objects.filter(game_session=game_session)
+            .order_by()
+            .values_list('question_id', 'round_number')
+        )
+        used = {question_id for question_id, _ in existing}
+        last_number = max((number for _, number in existing), default=0)
+        questions = pick_questions(count, category, difficulty, exclude=used, rng=rng)
+        return GameRound.objects.bulk_create([
+            GameRound(game_session=game_session, question=question, round_number=last_number + number)
+            for number, question in enumerate(questions, start=1)
+        ])
@@ -0,0 +1,245 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import publish_game_event, round_data
+from .models import PlayerInGame, Question, GameRound, Answer
+
+# Доля очков, которая остается за ответ в последнюю секунду раунда
+MIN_POINTS_SHARE = 0.5
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+
+class ScoringError(Exception):
+    """Ответ не может быть принят"""
+
+
+class RoundNotOpen(ScoringError):
+    """Раунд еще не начался или уже завершен"""
+
+
+class AlreadyAnswered(ScoringError):
+    """Игрок уже ответил в этом раунде"""
+
+
+class NotInGame(ScoringError):
+    """Игрок не участвует в сессии раунда"""
+
+
+def normalize_answer(text):
+    """Регистр, ё/е, пунктуация и лишние пробелы не влияют на сравнение"""
+    text = unicodedata.normalize('NFKC', text or '').casefold().replace('ё', 'е')
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def is_correct_answer(answer_text, correct_answer):
+    normalized = normalize_answer(answer_text)
+    return bool(normalized) and normalized == normalize_answer(correct_answer)
+
+
+def compute_points(is_correct, elapsed_seconds, time_limit_seconds):
+    """
+    Очки за ответ: POINTS_FOR_CORRECT_ANSWER за мгновенный ответ,
+    линейно до MIN_POINTS_SHARE от них к концу раунда.
+    """
+    if not is_correct:
+        return 0
+    base = settings.GAME_SETTINGS.get('POINTS_FOR_CORRECT_ANSWER', 10)
+    if time_limit_seconds <= 0:
+        return base
+    elapsed = min(max(elapsed_seconds, 0.0), time_limit_seconds)
+    share = 1 - (1 - MIN_POINTS_SHARE) * elapsed / time_limit_seconds
+    return max(1, round(base * share))
+
+
+def open_next_round(game_session_id, now=None):
+    """
+    Открыть следующий по номеру раунд сессии.
+
+    Ничего не делает, если открытый раунд уже есть. Возвращает раунд
+    или None, если раунды закончились.
+    """
+    now = now or timezone.now()
+    rounds = GameRound.objects.filter(game_session_id=game_session_id)
+    if rounds.filter(started_at__isnull=False, closed_at__isnull=True).exists():
+        return None
+    next_round = (
+        rounds.filter(started_at__isnull=True).select_related('question').order_by('round_number').first()
+    )
+    if next_round is None:
+        return None
+    opened = GameRound.objects.filter(pk=next_round.pk, started_at__isnull=True).update(started_at=now)
+    if not opened:
+        return None
+    next_round.started_at = now
+    publish_game_event(game_session_id, 'round_started', {'round': round_data(next_round)})
+    return next_round
+
+
+def close_round(game_round, now=None):
+    """
+    Завершить раунд и открыть следующий; после последнего раунда
+    игра завершается и подводятся итоги.
+
+    Раунд закрывается условным UPDATE, поэтому счетчики вопроса
+    (times_asked, correct_answers) прибавляются ровно один раз на раунд,
+    одним UPDATE с F(). Возвращает True, если раунд закрыл этот вызов.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        closed = GameRound.objects.filter(
+            pk=game_round.pk,
+            started_at__isnull=False,
+            closed_at__isnull=True,
+        ).update(closed_at=now)
+        if not closed:
+            return False
+
+        # После закрытия счетчики раунда больше не меняются
+        answers_count, correct_count, correct_answer = GameRound.objects.filter(pk=game_round.pk).values_list(
+            'answers_count', 'correct_count', 'question__correct_answer'
+        ).get()
+        if answers_count:
+            Question.objects.filter(pk=game_round.question_id).update(
+                times_asked=F('times_asked') + answers_count,
+                correct_answers=F('correct_answers') + correct_count,
+            )
+        # round_closed уходит раньше round_started следующего раунда
+        publish_game_event(game_round.game_session_id, 'round_closed', {
+            'round_id': game_round.pk,
+            'correct_answer': correct_answer,
+            'answers_count': answers_count,
+            'correct_count': correct_count,
+        })
+        next_round = open_next_round(game_round.game_session_id, now)
+        if next_round is None and not GameRound.objects.filter(
+            game_session_id=game_round.game_session_id,
+            closed_at__isnull=True,
+        ).exists():
+            from .settlement import finish_sessions
+
+            finish_sessions([game_round.game_session_id], now=now)
+
+    game_round.closed_at = now
+    game_round.answers_count = answers_count
+    game_round.correct_count = correct_count
+    return True
+
+
+def close_expired_rounds(now=None):
+    """Закрыть раунды, время которых вышло. Возвращает число закрытых"""
+    now = now or timezone.now()
+    closed = 0
+    expired = GameRound.objects.filter(started_at__isnull=False, closed_at__isnull=True)
+    for game_round in expired.only('id', 'game_session_id', 'question_id', 'started_at', 'time_limit_seconds'):
+        if (now - game_round.started_at).total_seconds() > game_round.time_limit_seconds:
+            if close_round(game_round, now):
+                closed += 1
+    return closed
+
+
+def close_open_rounds(game_session_ids, now=None):
+    """
+    Закрыть открытые раунды завершаемых сессий одним UPDATE.
+
+    Счетчики вопросов прибавляются одним UPDATE на вопрос. Возвращает
+    число закрытых раундов.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        closed = GameRound.objects.filter(
+            game_session_id__in=game_session_ids,
+            started_at__isnull=False,
+            closed_at__isnull=True,
+        ).update(closed_at=now)
+        if not closed:
+            return 0
+
+        # Закрытые этим вызовом раунды (счетчики у них уже не меняются)
+        totals = {}
+        rows = GameRound.objects.filter(
+            game_session_id__in=game_session_ids,
+            closed_at=now,
+            answers_count__gt=0,
+        ).values_list('question_id', 'answers_count', 'correct_count')
+        for question_id, answers_count, correct_count in rows:
+            asked, correct = totals.get(question_id, (0, 0))
+            totals[question_id] = (asked + answers_count, correct + correct_count)
+        for question_id, (asked, correct) in totals.items():
+            Question.objects.filter(pk=question_id).update(
+                times_asked=F('times_asked') + asked,
+                correct_answers=F('correct_answers') + correct,
+            )
+    return closed
+
+
+def submit_answer(user, game_round_id, answer_text):
+    """
+    Принять ответ игрока: проверить, начислить очки и учесть в счетчиках раунда.
+
+    Все изменения - условные UPDATE с F(), без чтения-изменения-записи,
+    так что одновременные ответы всех игроков не теряют очки и счетчики.
+    Последний ответ (или ответ после истечения времени) закрывает раунд.
+    """
+    now = timezone.now()
+    game_round = GameRound.objects.select_related('question', 'game_session').get(pk=game_round_id)
+    game_session = game_round.game_session
+
+    if game_session.status != 'active':
+        raise RoundNotOpen('Игра не активна')
+    if game_round.started_at is None:
+        raise RoundNotOpen('Раунд еще не начался')
+    if game_round.closed_at is not None:
+        raise RoundNotOpen('Раунд уже завершен')
+
+    elapsed = (now - game_round.started_at).total_seconds()
+    if elapsed > game_round.time_limit_seconds:
+        close_round(game_round, now)
+        raise RoundNotOpen('Время на ответ истекло')
+
+    is_correct = is_correct_answer(answer_text, game_round.question.correct_answer)
+    points = compute_points(is_correct, elapsed, game_round.time_limit_seconds)
+
+    try:
+        with transaction.atomic():
+            # Условие closed_at IS NULL не дает ответу попасть в уже закрытый раунд
+            accepted = GameRound.objects.filter(pk=game_round.pk, closed_at__isnull=True).update(
+                answers_count=F('answers_count') + 1,
+                correct_count=F('correct_count') + int(is_correct),
+            )
+            if not accepted:
+                raise RoundNotOpen('Раунд уже завершен')
+
+            in_game = PlayerInGame.objects.filter(player=user, game_session=game_session).update(
+                points=F('points') + points
+            )
+            if not in_game:
+                raise NotInGame('Вы не участвуете в этой игре')
+
+            answer = Answer.objects.create(
+                player=user,
+                game_round=game_round,
+                answer_text=answer_text,
+                is_correct=is_correct,
+                points_earned=points,
+            )
+            answered = GameRound.objects.filter(pk=game_round.pk).values_list('answers_count', flat=True).get()
+            # Правильность ответа не раскрывается до закрытия раунда
+            publish_game_event(game_session.pk, 'answer', {
+                'round_id': game_round.pk,
+                'player_id': user.pk,
+                'answers_count': answered,
+            })
+    except IntegrityError:
+        raise AlreadyAnswered('Вы уже ответили на этот вопрос')
+
+    if answered >= game_session.players_count:
+        close_round(game_round)
+    return answer
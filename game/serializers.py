@@ -28,7 +28,6 @@ class PlayerInGameSerializer(serializers.ModelSerializer):
 class GameSessionSerializer(serializers.ModelSerializer):
     """Сериализатор для игровой сессии"""
     players = PlayerInGameSerializer(source='player_in_game', many=True, read_only=True)
-    players_count = serializers.SerializerMethodField()
 
     class Meta:
         model = GameSession
@@ -37,10 +36,7 @@ class GameSessionSerializer(serializers.ModelSerializer):
             'players', 'time_limit', 'points_for_win',
             'telegram_chat_id', 'created_at', 'started_at', 'finished_at'
         ]
-        read_only_fields = ['id', 'created_at', 'started_at', 'finished_at']
-
-    def get_players_count(self, obj):
-        return obj.players.count()
+        read_only_fields = ['id', 'players_count', 'created_at', 'started_at', 'finished_at']
 
 
 class QuestionSerializer(serializers.ModelSerializer):
@@ -63,7 +59,8 @@ class GameRoundSerializer(serializers.ModelSerializer):
         model = GameRound
         fields = [
             'id', 'game_session', 'question', 'round_number',
-            'started_at', 'time_limit_seconds', 'answers'
+            'started_at', 'closed_at', 'time_limit_seconds',
+            'answers_count', 'correct_count', 'answers'
         ]
 
     def get_answers(self, obj):
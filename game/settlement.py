@@ -0,0 +1,183 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from cards.profile import invalidate_user_profiles
+from users.events import publish_profile
+from users.models import TelegramUser, CurrencyTransaction
+from .events import publish_game_event
+from .models import GameSession, PlayerInGame
+from .scoring import close_open_rounds
+
+logger = logging.getLogger(__name__)
+
+# Поля TelegramUser, которые меняет подведение итогов
+SETTLED_USER_FIELDS = [
+    'total_games', 'games_won', 'total_points',
+    'current_streak', 'best_streak', 'coins',
+]
+BATCH_SIZE = 200
+
+
+def get_reward_settings():
+    game_settings = settings.GAME_SETTINGS
+    return {
+        'coins_for_game': game_settings.get('COINS_FOR_GAME', 5),
+        'coins_for_win': game_settings.get('COINS_FOR_WIN', 25),
+    }
+
+
+def pick_winner(players):
+    """Единственный лидер по очкам (при ничьей или нуле очков победителя нет)"""
+    ranked = sorted(players, key=lambda player: player.points, reverse=True)
+    if not ranked or ranked[0].points == 0:
+        return None
+    if len(ranked) > 1 and ranked[1].points == ranked[0].points:
+        return None
+    return ranked[0].player_id
+
+
+def finish_sessions(session_ids, winners=None, now=None):
+    """
+    Завершить активные сессии и подвести итоги всех игроков сразу.
+
+    winners - {id сессии: id победителя}; для сессий не из словаря
+    победитель определяется по очкам. Игроки со всеми пользователями
+    читаются одним запросом (select_related), статистика и монеты
+    считаются в памяти и пишутся одним bulk_update, записи журнала
+    валюты - одним bulk_create. Возвращает завершенные сессии.
+    """
+    now = now or timezone.now()
+    winners = winners or {}
+    rewards = get_reward_settings()
+
+    with transaction.atomic():
+        sessions = list(
+            GameSession.objects.select_for_update()
+            .filter(pk__in=session_ids, status='active')
+            .order_by('started_at', 'id')
+        )
+        if not sessions:
+            return []
+        sessions_by_id = {session.pk: session for session in sessions}
+
+        # Сначала раунды: ответы в закрытые раунды больше не принимаются
+        close_open_rounds(list(sessions_by_id), now)
+
+        # Строки пользователей заблокированы до конца транзакции:
+        # bulk_update перезаписывает посчитанные в памяти значения
+        players = (
+            PlayerInGame.objects
+            .filter(game_session_id__in=sessions_by_id)
+            .select_related('player')
+            .select_for_update(of=('player',))
+            .order_by('game_session_id', '-points', 'joined_at')
+        )
+        players_by_session = {}
+        for player_in_game in players:
+            players_by_session.setdefault(player_in_game.game_session_id, []).append(player_in_game)
+
+        # Игрок может быть сразу в нескольких завершаемых сессиях
+        users = {}
+        entries = []
+        for session in sessions:
+            session_players = players_by_session.get(session.pk, [])
+            winner_id = winners[session.pk] if session.pk in winners else pick_winner(session_players)
+
+            results = []
+            for player_in_game in session_players:
+                user = users.setdefault(player_in_game.player_id, player_in_game.player)
+                won = player_in_game.player_id == winner_id
+                points = player_in_game.points + (session.points_for_win if won else 0)
+                coins = rewards['coins_for_game'] + (rewards['coins_for_win'] if won else 0)
+
+                user.apply_game_result(won=won, points=points)
+                if coins:
+                    user.coins += coins
+                    entries.append(CurrencyTransaction(
+                        user_id=user.pk,
+                        coins=coins,
+                        reason='game_reward',
+                        reference=f'game:{session.pk}',
+                    ))
+                results.append({
+                    'user_id': player_in_game.player_id,
+                    'points': points,
+                    'coins': coins,
+                    'won': won,
+                })
+
+            session.status = 'finished'
+            session.finished_at = now
+            session.results = {'winner_id': winner_id, 'players': results}
+            publish_game_event(session.pk, 'game_finished', {'finished_at': now, 'results': session.results})
+
+        GameSession.objects.bulk_update(sessions, ['status', 'finished_at', 'results'], batch_size=BATCH_SIZE)
+        # ranking_dirty отмечает игроков для пересчета снимка рейтинга
+        TelegramUser.objects.bulk_update(
+            list(users.values()), SETTLED_USER_FIELDS + ['ranking_dirty'], batch_size=BATCH_SIZE
+        )
+        CurrencyTransaction.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+        # bulk_update не отправляет post_save
+        user_ids = list(users)
+        transaction.on_commit(lambda: invalidate_user_profiles(user_ids))
+        for user in users.values():
+            publish_profile(user.pk, {field: getattr(user, field) for field in SETTLED_USER_FIELDS})
+
+    return sessions
+
+
+def find_stale_sessions(now=None):
+    """
+    Зависшие сессии: (id ожидающих дольше GAME_TIMEOUT_MINUTES,
+    id активных дольше своего time_limit).
+    """
+    now = now or timezone.now()
+    timeout = timedelta(minutes=settings.GAME_SETTINGS.get('GAME_TIMEOUT_MINUTES', 30))
+    waiting = list(
+        GameSession.objects.filter(status='waiting', created_at__lt=now - timeout)
+        .values_list('id', flat=True)
+    )
+    # Активных сессий немного; у каждой свой лимит времени
+    active = [
+        session_id
+        for session_id, started_at, time_limit in GameSession.objects.filter(status='active')
+        .values_list('id', 'started_at', 'time_limit')
+        if started_at is None or started_at + timedelta(minutes=time_limit) < now
+    ]
+    return waiting, active
+
+
+def finish_stale_sessions(batch_size=BATCH_SIZE, now=None):
+    """
+    Отменить зависшие ожидающие сессии и завершить просроченные активные.
+
+    Возвращает число отмененных и завершенных сессий.
+    """
+    now = now or timezone.now()
+    waiting, active = find_stale_sessions(now)
+
+    cancelled = 0
+    if waiting:
+        with transaction.atomic():
+            # Сессии, которые еще ждут игроков (за время поиска могли начаться)
+            waiting = list(
+                GameSession.objects.select_for_update()
+                .filter(pk__in=waiting, status='waiting')
+                .values_list('id', flat=True)
+            )
+            cancelled = GameSession.objects.filter(pk__in=waiting).update(status='cancelled', finished_at=now)
+            for session_id in waiting:
+                publish_game_event(session_id, 'game_cancelled', {'finished_at': now})
+
+    finished = 0
+    for start in range(0, len(active), batch_size):
+        finished += len(finish_sessions(active[start:start + batch_size], now=now))
+
+    if cancelled or finished:
+        logger.info(f"Зависшие игры: отменено {cancelled}, завершено {finished}")
+    return {'cancelled': cancelled, 'finished': finished}
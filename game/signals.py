@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Question
+from .questions import question_pool
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    """Добавляет вопрос в пул (или переносит при смене категории/сложности)"""
+    transaction.on_commit(lambda: question_pool.place(instance))
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    question_id = instance.id
+    transaction.on_commit(lambda: question_pool.discard(question_id))
@@ -1,3 +1,229 @@
-from django.test import TestCase
+import os
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from ggame.pubsub import InProcessBroker, reset_broker
+from ggame.testing import QueryPlanAssertions
+from users.models import TelegramUser
+from .matchmaking import AlreadyJoined, SessionFull, create_session, find_match, join_session
+from .models import GameSession, PlayerInGame, Question, GameRound, Answer
+from .questions import create_rounds, question_pool
+from .scoring import AlreadyAnswered, NotInGame, RoundNotOpen, open_next_round, submit_answer
+
+
+class HotQueryPlanTests(QueryPlanAssertions, TestCase):
+    """Горячие запросы к играм идут по индексам"""
+
+    def test_matchmaking_candidates(self):
+        # Как в game.matchmaking.find_match
+        for chat_id in (None, 1):
+            queryset = GameSession.objects.filter(
+                status='waiting',
+                telegram_chat_id=chat_id,
+                players_count__lt=F('max_players'),
+            ).order_by('-players_count', 'created_at')
+            self.assertUsesIndex(queryset, 'game_waiting_idx', ordered=True)
+
+    def test_sessions_by_status(self):
+        queryset = GameSession.objects.filter(status='active')
+        self.assertUsesIndex(queryset, 'game_status_created_idx', ordered=True)
+
+    def test_round_answers(self):
+        self.assertUsesIndex(Answer.objects.filter(game_round_id=1))
+
+
+class MatchmakingTests(TestCase):
+    def setUp(self):
+        self.users = [TelegramUser.objects.create(username=f'player{i}', telegram_id=i) for i in range(1, 6)]
+
+    def test_duplicate_join_by_same_user(self):
+        session = create_session(self.users[0])
+        join_session(session.pk, self.users[1])
+
+        with self.assertRaises(AlreadyJoined):
+            join_session(session.pk, self.users[1])
+
+        session.refresh_from_db()
+        # Счетчик мест откатывается вместе с неудачным входом
+        self.assertEqual(session.players_count, 2)
+        self.assertEqual(PlayerInGame.objects.filter(game_session=session).count(), 2)
+
+    def test_full_session_rejects_join(self):
+        session = create_session(self.users[0])
+        for user in self.users[1:4]:
+            join_session(session.pk, user)
+
+        with self.assertRaises(SessionFull):
+            join_session(session.pk, self.users[4])
+        session.refresh_from_db()
+        self.assertEqual(session.players_count, session.max_players)
+
+    def test_find_match_fills_open_session(self):
+        session, created = find_match(self.users[0])
+        self.assertTrue(created)
+
+        self.assertEqual(find_match(self.users[1]), (session, False))
+        # Повторный запрос игрока из очереди возвращает ту же сессию
+        self.assertEqual(find_match(self.users[1]), (session, False))
+        session.refresh_from_db()
+        self.assertEqual(session.players_count, 2)
+
+    def test_find_match_creates_session_when_all_full(self):
+        full = create_session(self.users[0])
+        for user in self.users[1:4]:
+            join_session(full.pk, user)
+
+        session, created = find_match(self.users[4])
+
+        self.assertTrue(created)
+        self.assertNotEqual(session.pk, full.pk)
+
+
+class ConcurrentMatchmakingTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_same_user_is_seated_once(self):
+        user = TelegramUser.objects.create(username='player', telegram_id=1)
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def match():
+            try:
+                barrier.wait()
+                find_match(user)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=match) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(PlayerInGame.objects.filter(player=user).count(), 1)
+
+
+class RoundFlowTests(TestCase):
+    def setUp(self):
+        self.users = [TelegramUser.objects.create(username=f'player{i}', telegram_id=i) for i in range(1, 4)]
+        self.session = create_session(self.users[0])
+        join_session(self.session.pk, self.users[1])
+
+    def start(self, questions=2):
+        for number in range(questions):
+            Question.objects.create(text=f'Вопрос {number}', correct_answer=f'ответ {number}')
+        question_pool.load()
+        self.session.start_game()
+        create_rounds(self.session, count=questions)
+        return open_next_round(self.session.pk)
+
+    def answer_round(self, game_round):
+        correct = game_round.question.correct_answer
+        for user in self.users[:2]:
+            submit_answer(user, game_round.pk, correct)
+
+    def test_double_answer(self):
+        game_round = self.start()
+        submit_answer(self.users[0], game_round.pk, 'не знаю')
+
+        with self.assertRaises(AlreadyAnswered):
+            submit_answer(self.users[0], game_round.pk, game_round.question.correct_answer)
+
+        game_round.refresh_from_db()
+        # Откат неудачного ответа возвращает счетчик раунда и очки
+        self.assertEqual(game_round.answers_count, 1)
+        self.assertEqual(PlayerInGame.objects.get(game_session=self.session, player=self.users[0]).points, 0)
+
+    def test_answer_from_outside_the_game(self):
+        game_round = self.start()
+
+        with self.assertRaises(NotInGame):
+            submit_answer(self.users[2], game_round.pk, 'ответ')
+
+        game_round.refresh_from_db()
+        self.assertEqual(game_round.answers_count, 0)
+
+    def test_last_answer_closes_round_and_opens_next(self):
+        game_round = self.start()
+
+        self.answer_round(game_round)
+
+        game_round.refresh_from_db()
+        self.assertIsNotNone(game_round.closed_at)
+        self.assertEqual((game_round.answers_count, game_round.correct_count), (2, 2))
+        self.assertEqual(Question.objects.get(pk=game_round.question_id).times_asked, 2)
+        with self.assertRaises(RoundNotOpen):
+            submit_answer(self.users[0], game_round.pk, 'ответ')
+        self.assertTrue(GameRound.objects.filter(
+            game_session=self.session, round_number=2, started_at__isnull=False
+        ).exists())
+
+    def test_last_round_finishes_game(self):
+        self.start()
+
+        for game_round in GameRound.objects.filter(game_session=self.session).select_related('question'):
+            self.answer_round(game_round)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'finished')
+        self.assertEqual(len(self.session.results['players']), 2)
+
+    def test_start_without_questions(self):
+        question_pool.load()
+        self.client.force_login(self.users[0])
+
+        response = self.client.post(reverse('gamesession-start', args=[self.session.pk]))
+
+        self.assertEqual(response.status_code, 400)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'waiting')
+
+
+@override_settings(PUBSUB_BACKEND='ggame.pubsub.InProcessBroker')
+class InProcessBrokerTests(TestCase):
+    def setUp(self):
+        self.users = [TelegramUser.objects.create(username=f'player{i}', telegram_id=i) for i in (1, 2)]
+        self.session = create_session(self.users[0])
+
+    def tearDown(self):
+        reset_broker()
+
+    def test_several_web_processes_disable_streams(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '2'}):
+            reset_broker()
+            self.assertFalse(InProcessBroker().streams_enabled)
+            response = self.client.get(
+                reverse('game_events', args=[self.session.pk]), {'telegram_id': self.users[0].telegram_id}
+            )
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_game_stream_only_for_participants(self):
+        response = self.client.get(
+            reverse('game_events', args=[self.session.pk]), {'telegram_id': self.users[1].telegram_id}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_sweeper_loop_runs_without_shared_broker(self):
+        # Событий в других процессах не будет, но просроченные игры все равно завершаются
+        GameSession.objects.filter(pk=self.session.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        stderr = StringIO()
+        with mock.patch('game.management.commands.finish_stale_games.time.sleep', side_effect=KeyboardInterrupt):
+            call_command('finish_stale_games', interval=30, stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('PUBSUB_BACKEND', stderr.getvalue())
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'cancelled')
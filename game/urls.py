@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import events, views
 
 # Создаем роутер для API
 router = DefaultRouter()
@@ -11,4 +11,5 @@ router.register(r'answers', views.AnswerViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('games/<int:session_id>/events/', events.game_events, name='game_events'),
 ]
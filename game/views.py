@@ -1,54 +1,82 @@
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from .matchmaking import MatchmakingError, join_session, find_match
 from .models import GameSession, PlayerInGame, Question, GameRound, Answer
+from .questions import create_rounds
+from .scoring import ScoringError, open_next_round, submit_answer
 from .serializers import (
     GameSessionSerializer, PlayerInGameSerializer,
     QuestionSerializer, GameRoundSerializer, AnswerSerializer
 )
+from ggame.pagination import CreatedAtPagination, AnsweredAtPagination
 
 
 class GameSessionViewSet(viewsets.ModelViewSet):
     """
     ViewSet для управления игровыми сессиями
     """
-    queryset = GameSession.objects.all()
+    queryset = GameSession.objects.prefetch_related('player_in_game__player')
     serializer_class = GameSessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtPagination
 
     @action(detail=True, methods=['post'])
     def join(self, request, pk=None):
         """Присоединиться к игре"""
         game_session = self.get_object()
-        user = request.user
 
-        if game_session.players.count() >= game_session.max_players:
-            return Response(
-                {'error': 'Игра заполнена'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        if game_session.players.filter(id=user.id).exists():
-            return Response(
-                {'error': 'Вы уже в игре'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Добавляем игрока в игру
-        PlayerInGame.objects.create(player=user, game_session=game_session)
+        try:
+            join_session(game_session.pk, request.user)
+        except MatchmakingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = self.get_serializer(game_session)
+        serializer = self.get_serializer(self.get_queryset().get(pk=game_session.pk))
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def matchmake(self, request):
+        """Встать в очередь: место в открытой игре или новая игра"""
+        chat_id = request.data.get('telegram_chat_id')
+        if chat_id is not None:
+            try:
+                chat_id = int(chat_id)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'Invalid telegram_chat_id format'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        game_session, created = find_match(request.user, chat_id)
+
+        serializer = self.get_serializer(self.get_queryset().get(pk=game_session.pk))
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
-        """Начать игру"""
+        """Начать игру и создать ее раунды"""
         game_session = self.get_object()
 
-        if game_session.start_game():
+        with transaction.atomic():
+            started = game_session.start_game()
+            if started and not create_rounds(game_session):
+                # Игра без раундов не начинается: старт откатывается
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': 'Нет вопросов для игры'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if started:
+                open_next_round(game_session.pk)
+
+        if started:
             serializer = self.get_serializer(game_session)
             return Response(serializer.data)
         else:
@@ -80,9 +108,23 @@ class AnswerViewSet(viewsets.ModelViewSet):
     """
     ViewSet для управления ответами
     """
-    queryset = Answer.objects.all()
+    queryset = Answer.objects.select_related('player')
     serializer_class = AnswerSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AnsweredAtPagination
+
+    def create(self, request, *args, **kwargs):
+        """Ответить в текущем раунде: правильность и очки считает сервер"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            answer = submit_answer(
+                request.user,
+                serializer.validated_data['game_round'].pk,
+                serializer.validated_data['answer_text'],
+            )
+        except ScoringError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    def perform_create(self, serializer):
-        serializer.save(player=self.request.user)
+        return Response(self.get_serializer(answer).data, status=status.HTTP_201_CREATED)
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ggame.settings')
 
 application = get_asgi_application()
+
+# Брокер событий создается при запуске: предупреждение о неподходящем
+# PUBSUB_BACKEND (InProcessBroker с несколькими процессами) видно сразу
+from ggame.pubsub import get_broker  # noqa: E402
+
+get_broker()
@@ -0,0 +1,46 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+REQUEST_LOGGER_NAME = 'ggame.requests'
+
+_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Пишет словарь из record.msg одной JSON-строкой"""
+
+    def format(self, record):
+        if isinstance(record.msg, dict):
+            return json.dumps(record.msg, ensure_ascii=False, default=str)
+        return super().format(record)
+
+
+def start_request_logging(stream=None):
+    """
+    Подключает логгер запросов через QueueHandler.
+
+    Поток запроса только кладет запись в очередь, а запись в stdout
+    выполняет фоновый поток QueueListener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue = queue.SimpleQueue()
+    # QueueHandler форматирует запись сам, в поток уходит готовая строка
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(JsonLineFormatter())
+
+    request_logger = logging.getLogger(REQUEST_LOGGER_NAME)
+    request_logger.addHandler(queue_handler)
+    request_logger.setLevel(logging.INFO)
+    request_logger.propagate = False
+
+    _listener = QueueListener(log_queue, logging.StreamHandler(stream or sys.stdout))
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,108 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Границы корзин гистограмм (последняя корзина - "больше")
+DURATION_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+
+class QueryStats:
+    """Счетчик запросов к БД в рамках одного HTTP-запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.count += 1
+            # SQL приходит с плейсхолдерами, поэтому текст и есть "форма" запроса
+            self.shapes[sql] += 1
+
+    @property
+    def db_time_ms(self):
+        return round(self.db_time * 1000, 2)
+
+    def repeated_shapes(self, threshold):
+        """Запросы, повторившиеся не менее threshold раз (признак N+1)"""
+        return {sql: count for sql, count in self.shapes.items() if count >= threshold}
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        observed = sum(self.counts)
+        return {
+            'buckets': dict(zip(labels, self.counts)),
+            'avg': round(self.total / observed, 2) if observed else 0,
+            'max': round(self.max, 2),
+        }
+
+
+class RouteMetrics:
+    """Накопленные по маршрутам метрики процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.started_at = time.time()
+
+    def record(self, route, duration_ms, stats, n_plus_one):
+        with self._lock:
+            route_metrics = self._routes.get(route)
+            if route_metrics is None:
+                route_metrics = self._routes[route] = {
+                    'requests': 0,
+                    'n_plus_one': 0,
+                    'db_time_ms': 0.0,
+                    'duration_ms': Histogram(DURATION_BUCKETS_MS),
+                    'queries': Histogram(QUERY_COUNT_BUCKETS),
+                }
+            route_metrics['requests'] += 1
+            route_metrics['db_time_ms'] += stats.db_time_ms
+            route_metrics['duration_ms'].observe(duration_ms)
+            route_metrics['queries'].observe(stats.count)
+            if n_plus_one:
+                route_metrics['n_plus_one'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'since': self.started_at,
+                'routes': {
+                    route: {
+                        'requests': data['requests'],
+                        'n_plus_one': data['n_plus_one'],
+                        'db_time_ms': round(data['db_time_ms'], 2),
+                        'duration_ms': data['duration_ms'].as_dict(),
+                        'queries': data['queries'].as_dict(),
+                    }
+                    for route, data in self._routes.items()
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+            self.started_at = time.time()
+
+
+route_metrics = RouteMetrics()
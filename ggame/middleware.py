@@ -1,6 +1,27 @@
 import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponseServerError
+
+from .log import REQUEST_LOGGER_NAME, start_request_logging
+from .metrics import QueryStats, route_metrics
 
 logger = logging.getLogger(__name__)
+request_logger = logging.getLogger(REQUEST_LOGGER_NAME)
+
+DEFAULT_REQUEST_LOGGING = {
+    'SAMPLE_RATE': 0.01,
+    'SLOW_REQUEST_MS': 500,
+    'REDACT_PARAMS': ['key', 'token', 'password', 'secret', 'auth', 'hash', 'init_data'],
+}
+
+DEFAULT_PERFORMANCE_SETTINGS = {
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SERVER_TIMING': True,
+}
 
 class AdminCsrfExemptMiddleware:
     """Отключает CSRF для админки"""
@@ -13,41 +34,111 @@ class AdminCsrfExemptMiddleware:
         return self.get_response(request)
 
 
-class RequestLoggingMiddleware:
-    """Middleware для логирования всех входящих запросов"""
+class StructuredLoggingMiddleware:
+    """
+    Логирует каждый запрос одной JSON-строкой.
+
+    Обычные запросы попадают в лог с вероятностью SAMPLE_RATE, медленные
+    (дольше SLOW_REQUEST_MS) и ответы 5xx - всегда. Значения параметров,
+    похожих на секреты, заменяются на "***".
+    """
     def __init__(self, get_response):
         self.get_response = get_response
+        self.options = {**DEFAULT_REQUEST_LOGGING, **getattr(settings, 'REQUEST_LOGGING', {})}
+        start_request_logging()
 
     def __call__(self, request):
-        # Логируем входящий запрос
-        print(f"=== REQUEST: {request.method} {request.path} ===")
-        print(f"Headers: {dict(request.headers)}")
-        print(f"Query params: {request.GET}")
-        print(f"User agent: {request.META.get('HTTP_USER_AGENT', 'Unknown')}")
-        print(f"User: {request.user}")
-        print(f"Auth: {request.auth}")
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception as e:
+            self.log(request, None, started, error=type(e).__name__)
+            raise
 
-        if request.method == 'OPTIONS':
-            print("CORS preflight request detected")
+        self.log(request, response, started)
+        return response
+
+    def should_log(self, status_code, duration_ms):
+        if status_code is None or status_code >= 500:
+            return True
+        if duration_ms >= self.options['SLOW_REQUEST_MS']:
+            return True
+        return random.random() < self.options['SAMPLE_RATE']
+
+    def redact(self, params):
+        redacted = {}
+        for key, value in params.items():
+            if any(marker in key.lower() for marker in self.options['REDACT_PARAMS']):
+                redacted[key] = '***'
+            else:
+                redacted[key] = value
+        return redacted
+
+    def log(self, request, response, started, error=None):
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        status_code = response.status_code if response is not None else None
+        if not self.should_log(status_code, duration_ms):
+            return
+
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        perf = getattr(request, 'perf', None)
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': status_code,
+            'duration_ms': duration_ms,
+            'db_queries': perf.count if perf else None,
+            'db_time_ms': perf.db_time_ms if perf else None,
+            'bytes': None if response is None or response.streaming else len(response.content),
+            'user_id': user.id if user is not None and user.is_authenticated else None,
+        }
+        if request.GET:
+            entry['query'] = self.redact(request.GET.dict())
+        if duration_ms >= self.options['SLOW_REQUEST_MS']:
+            entry['slow'] = True
+        if error:
+            entry['error'] = error
+        if getattr(request, 'n_plus_one', None):
+            entry['n_plus_one'] = request.n_plus_one
+
+        request_logger.info(entry)
+
+
+class PerformanceMiddleware:
+    """
+    Считает запросы к БД и время в БД для каждого запроса.
+
+    Результат кладется в request.perf, отдается в заголовке Server-Timing
+    и копится в гистограммах по маршрутам (см. ggame.views.performance_metrics).
+    Повторяющиеся одинаковые запросы помечаются как вероятный N+1.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = {**DEFAULT_PERFORMANCE_SETTINGS, **getattr(settings, 'PERFORMANCE_INSTRUMENTATION', {})}
 
-        try:
-            print("=== CALLING get_response ===")
+    def __call__(self, request):
+        stats = request.perf = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(stats):
             response = self.get_response(request)
-            print("=== get_response completed ===")
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
 
-            # Логируем ответ
-            print(f"=== RESPONSE: {response.status_code} ===")
-            print(f"Response headers: {dict(response.headers)}")
+        repeated = stats.repeated_shapes(self.options['N_PLUS_ONE_THRESHOLD'])
+        if repeated:
+            request.n_plus_one = max(repeated.values())
 
-            return response
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unresolved'
+        route_metrics.record(route, duration_ms, stats, bool(repeated))
 
-        except Exception as e:
-            print(f"=== EXCEPTION in middleware: {str(e)} ===")
-            import traceback
-            print("=== FULL TRACEBACK ===")
-            traceback.print_exc()
-            print("=== END TRACEBACK ===")
-            raise
+        if self.options['SERVER_TIMING']:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time_ms};desc="{stats.count} queries", '
+                f'app;dur={duration_ms}'
+            )
+        return response
 
 
 class CORSMiddleware:
@@ -58,17 +149,15 @@ class CORSMiddleware:
     def __call__(self, request):
         try:
             response = self.get_response(request)
-        except Exception as e:
+        except Exception:
             # Если произошла ошибка, создаем базовый error response
-            from django.http import HttpResponseServerError
+            logger.exception("Unhandled exception, returning 500 with CORS headers")
             response = HttpResponseServerError("Internal Server Error")
-            print(f"=== CORS MIDDLEWARE: Exception caught: {e} ===")
 
         # Добавляем CORS headers для всех запросов, даже при ошибках
         response['Access-Control-Allow-Origin'] = '*'
         response['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
         response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
         response['Access-Control-Max-Age'] = '86400'
-        print(f"=== CORS MIDDLEWARE: Added headers to response {response.status_code} ===")
 
         return response
\ No newline at end of file
@@ -0,0 +1,30 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Постраничная выдача по курсору (keyset) вместо номера страницы.
+
+    Следующая страница выбирается условием по полю сортировки
+    (WHERE acquired_at < ... ORDER BY acquired_at DESC, id DESC LIMIT n)
+    по составному индексу, без COUNT(*) и OFFSET. Курсор непрозрачный
+    (base64), общее количество не возвращается.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class AcquiredAtPagination(KeysetPagination):
+    """Карты и предметы игрока: сначала новые"""
+    ordering = ('-acquired_at', '-id')
+
+
+class CreatedAtPagination(KeysetPagination):
+    """Игровые сессии: сначала новые"""
+    ordering = ('-created_at', '-id')
+
+
+class AnsweredAtPagination(KeysetPagination):
+    """Ответы: сначала последние"""
+    ordering = ('-answered_at', '-id')
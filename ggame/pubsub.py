@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import shlex
+import sys
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'ggame.pubsub.InProcessBroker'
+# Сколько непрочитанных событий держать на одного подписчика
+MAX_PENDING_EVENTS = 100
+# Канал LISTEN/NOTIFY PostgreSQL, общий для всех каналов событий
+NOTIFY_CHANNEL = 'ggame_events'
+# Как часто слушатель проверяет остановку и пауза перед переподключением (секунды)
+LISTEN_POLL_SECONDS = 5
+RECONNECT_SECONDS = 1
+
+
+def get_web_concurrency():
+    """
+    Число процессов веб-сервера: --workers/-w gunicorn (в том числе
+    из GUNICORN_CMD_ARGS), иначе WEB_CONCURRENCY, как у gunicorn и uvicorn.
+    """
+    args = shlex.split(os.getenv('GUNICORN_CMD_ARGS', ''))
+    if os.path.basename(sys.argv[0]).startswith('gunicorn'):
+        args += sys.argv[1:]
+    workers = os.getenv('WEB_CONCURRENCY', '1')
+    for position, arg in enumerate(args):
+        if arg in ('-w', '--workers') and position + 1 < len(args):
+            workers = args[position + 1]
+        elif arg.startswith('--workers='):
+            workers = arg.split('=', 1)[1]
+    try:
+        return int(workers)
+    except ValueError:
+        return 1
+
+
+class BaseBroker:
+    """
+    Интерфейс брокера событий.
+
+    publish() вызывается из обычного (синхронного) кода, subscribe()
+    возвращает асинхронный контекстный менеджер с методом get().
+    """
+
+    # False - потоки событий отключены (ответ 503), REST продолжает работать
+    streams_enabled = True
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+
+class Subscription:
+    """Подписка на канал in-process брокера"""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = None
+        self.loop = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self)
+
+    def offer(self, message):
+        """Положить событие в очередь (в потоке цикла событий подписчика)"""
+        if self.queue.full():
+            # Медленный клиент: самое старое событие теряется
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker(BaseBroker):
+    """
+    Брокер в памяти процесса.
+
+    События доходят только до подписчиков этого же процесса, поэтому
+    с несколькими процессами веб-сервера потоки событий отключаются
+    (клиенты обновляют данные запросами); для них нужен общий бэкенд
+    (PostgresBroker).
+    """
+
+    # События из других процессов (например, finish_stale_games) не доходят
+    cross_process = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        workers = get_web_concurrency()
+        if not self.cross_process and workers > 1:
+            self.streams_enabled = False
+            logger.warning(
+                f'{type(self).__name__} доставляет события только в своем процессе, '
+                f'а веб-сервер запущен с {workers} процессами: потоки событий отключены. '
+                f'Укажите общий брокер в PUBSUB_BACKEND (ggame.pubsub.PostgresBroker)'
+            )
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.channel].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def subscribers_count(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """Разослать событие подписчикам этого процесса"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self._remove(subscription)
+
+    def subscribe(self, channel):
+        return Subscription(self, channel)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Брокер на LISTEN/NOTIFY PostgreSQL для нескольких процессов.
+
+    publish() отправляет NOTIFY через соединение Django (внутри
+    транзакции событие уходит при фиксации). В процессе с подписчиками
+    поток-слушатель держит отдельное соединение с LISTEN и раздает
+    события подписчикам этого процесса. Размер события ограничен
+    8000 байт (ограничение NOTIFY).
+    """
+
+    cross_process = True
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def publish(self, channel, message):
+        payload = json.dumps(
+            {'channel': channel, 'message': message},
+            cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+
+    def subscribe(self, channel):
+        self.start_listener()
+        return super().subscribe(channel)
+
+    def start_listener(self):
+        """Поток-слушатель запускается при первой подписке"""
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._stopped.clear()
+                self._listener = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+                self._listener.start()
+
+    def stop_listener(self):
+        self._stopped.set()
+        with self._listener_lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.join()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            wrapper = connections.create_connection(DEFAULT_DB_ALIAS)
+            try:
+                wrapper.ensure_connection()
+                # Соединение Django в autocommit: LISTEN действует сразу
+                raw = wrapper.connection
+                with raw.cursor() as cursor:
+                    cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                while not self._stopped.is_set():
+                    if not select.select([raw], [], [], LISTEN_POLL_SECONDS)[0]:
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self._dispatch(raw.notifies.pop(0).payload)
+            except Exception as e:
+                # События за время переподключения теряются
+                logger.exception(f"Ошибка слушателя событий PostgreSQL: {e}")
+                self._stopped.wait(RECONNECT_SECONDS)
+            finally:
+                wrapper.close()
+
+    def _dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Некорректное событие в канале {NOTIFY_CHANNEL}: {payload[:200]}")
+            return
+        self.deliver(event['channel'], event['message'])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Брокер из настройки PUBSUB_BACKEND (один на процесс)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'PUBSUB_BACKEND', DEFAULT_BACKEND))()
+    return _broker
+
+
+def reset_broker():
+    global _broker
+    with _broker_lock:
+        broker, _broker = _broker, None
+    if isinstance(broker, PostgresBroker):
+        broker.stop_listener()
+
+
+@receiver(setting_changed)
+def pubsub_setting_changed(setting, **kwargs):
+    """override_settings(PUBSUB_BACKEND=...) в тестах подменяет брокер"""
+    if setting == 'PUBSUB_BACKEND':
+        reset_broker()
+
+
+def game_channel(session_id):
+    return f'game:{session_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish(channel, event_type, data):
+    try:
+        get_broker().publish(channel, {'type': event_type, 'data': data})
+    except Exception as e:
+        # Доставка событий не должна ломать основной запрос
+        logger.exception(f"Ошибка публикации события {event_type} в {channel}: {e}")
+
+
+def publish_on_commit(channel, event_type, data):
+    """Опубликовать событие после фиксации текущей транзакции"""
+    transaction.on_commit(lambda: publish(channel, event_type, data))
@@ -65,11 +65,13 @@ MIDDLEWARE = [
     # 'corsheaders.middleware.CorsMiddleware',  # CORS - временно отключен для диагностики
     'ggame.middleware.CORSMiddleware',  # Добавляет CORS headers ПЕРВЫМ
     'ggame.middleware.AdminCsrfExemptMiddleware',  # Отключает CSRF для админки
-    'ggame.middleware.RequestLoggingMiddleware',  # Логирование всех запросов
+    'ggame.middleware.StructuredLoggingMiddleware',  # JSON-лог запросов
+    'ggame.middleware.PerformanceMiddleware',  # Запросы к БД, Server-Timing
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.ActivityTrackingMiddleware',  # Отложенная запись last_activity
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -118,6 +120,18 @@ else:
     }
 
 
+# Кэш (для нескольких процессов укажите общий бэкенд, например
+# django.core.cache.backends.db.DatabaseCache после createcachetable, или Redis)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'ggame'),
+    }
+}
+# Сброс кэша в памяти процесса не доходит до других процессов
+LOCAL_CACHE = CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -178,6 +192,53 @@ GAME_SETTINGS = {
     'GAME_TIMEOUT_MINUTES': 30,
     'POINTS_FOR_WIN': 100,
     'POINTS_FOR_CORRECT_ANSWER': 10,
+    'QUESTIONS_PER_GAME': 10,
+    'COINS_FOR_GAME': 5,
+    'COINS_FOR_WIN': 25,
+    'CARD_PACK_SIZE': 5,
+    'CARD_PACK_COIN_COST': 40,
+    'MAX_CARDS_PER_ACQUIRE': 50,
+    'BATTLE_XP_WIN': 20,
+    'BATTLE_XP_LOSS': 5,
+    'BATTLE_XP_KNOCKOUT': 5,
+}
+
+# Логирование запросов (ggame.middleware.StructuredLoggingMiddleware)
+REQUEST_LOGGING = {
+    # Доля обычных запросов в логе; ответы 5xx и медленные пишутся всегда
+    'SAMPLE_RATE': float(os.getenv('REQUEST_LOG_SAMPLE_RATE', '0.01')),
+    'SLOW_REQUEST_MS': int(os.getenv('REQUEST_LOG_SLOW_MS', '500')),
+}
+
+# Инструментирование запросов (ggame.middleware.PerformanceMiddleware)
+PERFORMANCE_INSTRUMENTATION = {
+    'N_PLUS_ONE_THRESHOLD': 5,  # одинаковых запросов за один HTTP-запрос
+    'SERVER_TIMING': True,
+}
+
+# Время жизни закэшированного профиля пользователя (секунды); с кэшем в памяти
+# процесса - несколько секунд, иначе другие процессы видят старый баланс
+USER_PROFILE_CACHE_TIMEOUT = int(os.getenv('USER_PROFILE_CACHE_TIMEOUT', '5' if LOCAL_CACHE else '300'))
+
+# Время жизни закэшированной сводки инвентаря (секунды), по тем же причинам
+INVENTORY_SUMMARY_CACHE_TIMEOUT = int(os.getenv('INVENTORY_SUMMARY_CACHE_TIMEOUT', '5' if LOCAL_CACHE else '300'))
+
+# Время жизни закэшированного каталога карт (секунды): изменения, сделанные
+# в другом процессе, видны не позже чем через это время даже с LocMemCache
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Брокер событий для потоков /events/: с PostgreSQL - LISTEN/NOTIFY (события доходят
+# из всех процессов), иначе InProcessBroker (только один процесс веб-сервера)
+PUBSUB_BACKEND = os.getenv(
+    'PUBSUB_BACKEND',
+    'ggame.pubsub.PostgresBroker'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+    else 'ggame.pubsub.InProcessBroker'
+)
+
+# Потоки событий (Server-Sent Events)
+EVENT_STREAM = {
+    'HEARTBEAT_SECONDS': 15,
 }
 
 # Telegram Bot настройки (загрузить из переменных окружения)
@@ -185,6 +246,22 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8567389465:AAGf6VKykyl6REa
 TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', 'http://localhost:8000')
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 
+# Как часто сбрасывать накопленные отметки активности в базу (секунды)
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv('ACTIVITY_FLUSH_INTERVAL', '30'))
+
+# Как часто обновлять last_activity при /start (секунды)
+TELEGRAM_ACTIVITY_UPDATE_INTERVAL = int(os.getenv('TELEGRAM_ACTIVITY_UPDATE_INTERVAL', '60'))
+
+# Очередь исходящих сообщений (python manage.py send_outbox)
+TELEGRAM_OUTBOX_SETTINGS = {
+    'GLOBAL_RATE': 30,
+    'PER_CHAT_RATE': 1,
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    # Отправленные и неудачные сообщения удаляются воркером через N дней
+    'RETENTION_DAYS': int(os.getenv('TELEGRAM_OUTBOX_RETENTION_DAYS', '7')),
+}
+
 # CORS настройки
 CORS_ALLOWED_ORIGINS = [
     'https://ggame-psi.vercel.app',
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .pubsub import get_broker
+
+
+def get_heartbeat_seconds():
+    return settings.EVENT_STREAM.get('HEARTBEAT_SECONDS', 15)
+
+
+def format_event(event_type, data):
+    """Событие в формате text/event-stream"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'event: {event_type}\ndata: {payload}\n\n'
+
+
+async def get_stream_user(request):
+    """
+    Пользователь потока событий.
+
+    EventSource не умеет передавать заголовки, поэтому токен DRF
+    принимается и в параметре ?token=. Mini App хранит не токен DRF,
+    а telegram_id, и передает его в ?telegram_id=, как и в REST-запросах
+    (get_user_profile). Без них - пользователь сессии.
+
+    telegram_id не секрет: его можно подобрать, и тогда чужой поток
+    профиля (баланс, статистика) открыт так же, как профиль через REST.
+    Это осознанное совпадение с REST до появления проверки initData
+    Telegram; потоки игр дополнительно требуют участия в игре.
+    """
+    from rest_framework.authtoken.models import Token
+    from users.models import TelegramUser
+
+    key = request.GET.get('token')
+    if key:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            token = None
+        if token is not None:
+            return token.user if token.user.is_active else None
+
+    telegram_id = request.GET.get('telegram_id', '')
+    if telegram_id.isdigit():
+        return await TelegramUser.objects.filter(telegram_id=int(telegram_id), is_active=True).afirst()
+    if key:
+        return None
+
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+async def _stream(channel, get_initial, final_events):
+    async with get_broker().subscribe(channel) as subscription:
+        # Снимок читается уже после подписки: события между ними не теряются
+        if get_initial is not None:
+            for event_type, data in await get_initial():
+                yield format_event(event_type, data)
+
+        heartbeat = get_heartbeat_seconds()
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Комментарий не дает прокси закрыть простаивающее соединение
+                yield ': ping\n\n'
+                continue
+            yield format_event(message['type'], message['data'])
+            if message['type'] in final_events:
+                return
+
+
+def event_stream_response(channel, get_initial=None, final_events=()):
+    """
+    Ответ Server-Sent Events с событиями канала.
+
+    get_initial - корутина, возвращающая список (тип, данные) для начала
+    потока; после события из final_events поток закрывается. Если брокер
+    отключил потоки, ответ 503 - клиент обновляет данные запросами.
+    """
+    if not get_broker().streams_enabled:
+        return JsonResponse({'error': 'Поток событий недоступен'}, status=503)
+    response = StreamingHttpResponse(
+        _stream(channel, get_initial, frozenset(final_events)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
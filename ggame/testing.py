@@ -0,0 +1,44 @@
+import re
+
+from django.db import connection
+
+
+class QueryPlanAssertions:
+    """
+    Проверки плана запроса (EXPLAIN) для тестов.
+
+    Примесь к TestCase: тест падает, если горячий запрос перестал
+    использовать индекс и читает таблицу целиком. Поддерживаются SQLite
+    и PostgreSQL; в PostgreSQL последовательное чтение запрещается на время
+    запроса, чтобы на маленькой тестовой базе план не зависел от статистики.
+    """
+
+    def get_query_plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Действует до конца транзакции теста
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name=None, ordered=False):
+        """
+        Запрос к таблице модели queryset читает ее по индексу
+        (index_name - по этому индексу). ordered=True дополнительно
+        требует, чтобы сортировка шла по индексу, без отдельного шага сортировки.
+        """
+        plan = self.get_query_plan(queryset)
+        table = queryset.model._meta.db_table
+
+        if connection.vendor == 'postgresql':
+            self.assertNotRegex(plan, rf'Seq Scan on {table}\b', f'Полное чтение таблицы:\n{plan}')
+            if ordered:
+                self.assertNotRegex(plan, r'\bSort\b', f'Сортировка без индекса:\n{plan}')
+        else:
+            # SCAN без USING ... INDEX - чтение всей таблицы
+            self.assertNotRegex(plan, rf'\bSCAN {table}\b(?! USING)', f'Полное чтение таблицы:\n{plan}')
+            if ordered:
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f'Сортировка без индекса:\n{plan}')
+
+        if index_name:
+            self.assertRegex(plan, rf'\b{re.escape(index_name)}\b', f'Не используется {index_name}:\n{plan}')
+        return plan
@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 from django.shortcuts import redirect
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponseRedirect
+from .views import performance_metrics
 
 def profile_redirect(request):
     """Редирект на профиль пользователя"""
@@ -53,6 +54,7 @@ urlpatterns = [
     path('api/inventory/', include('inventory.urls')),
     path('api/cards/', include('cards.urls')),
     path('api/telegram/', include('telegram_bot.urls')),
+    path('api/metrics/', performance_metrics, name='performance_metrics'),
     path('profile/', profile_redirect, name='profile_redirect'),
 ]
 
@@ -0,0 +1,15 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .metrics import route_metrics
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def performance_metrics(request):
+    """
+    Метрики производительности по маршрутам (только для staff).
+    Данные относятся к текущему процессу.
+    """
+    return Response(route_metrics.snapshot())
@@ -87,6 +87,14 @@ class Item(models.Model):
         verbose_name = _("Предмет")
         verbose_name_plural = _("Предметы")
         ordering = ['name']
+        indexes = [
+            # Магазин: только активные предметы (частичный индекс)
+            models.Index(
+                fields=['name'],
+                condition=models.Q(is_active=True),
+                name='item_active_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_rarity_display()})"
@@ -126,25 +134,33 @@ class InventoryItem(models.Model):
         verbose_name_plural = _("Предметы в инвентаре")
         unique_together = ['player', 'item']  # Один тип предмета - одна запись
         ordering = ['-acquired_at']
+        indexes = [
+            # Инвентарь игрока по курсору (ggame.pagination.AcquiredAtPagination)
+            models.Index(fields=['player', '-acquired_at', '-id'], name='inventory_player_acquired_idx'),
+        ]
 
     def __str__(self):
         return f"{self.player.username_telegram or self.player.telegram_id}: {self.item.name} x{self.quantity}"
 
     def add_quantity(self, amount):
-        """Добавить количество предметов"""
-        if self.item.is_stackable and self.quantity + amount <= self.item.max_stack:
-            self.quantity += amount
-            self.save()
-            return True
-        return False
+        """Добавить количество предметов (inventory.operations)"""
+        from .operations import InventoryError, grant_items
+
+        try:
+            grant_items([(self.player_id, self.item_id, amount)])
+        except InventoryError:
+            return False
+        self.refresh_from_db(fields=['quantity'])
+        return True
 
     def remove_quantity(self, amount):
-        """Убрать количество предметов"""
-        if self.quantity >= amount:
-            self.quantity -= amount
-            if self.quantity <= 0:
-                self.delete()
-            else:
-                self.save()
-            return True
-        return False
+        """Убрать количество предметов (пустая стопка удаляется)"""
+        from .operations import InventoryError, consume_items
+
+        try:
+            consume_items([(self.player_id, self.item_id, amount)])
+        except InventoryError:
+            return False
+        remaining = InventoryItem.objects.filter(pk=self.pk).values_list('quantity', flat=True).first()
+        self.quantity = remaining or 0
+        return True
@@ -0,0 +1,146 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Item, InventoryItem
+from .summary import invalidate_inventory_summaries
+
+
+class InventoryError(Exception):
+    """Операцию с инвентарем нельзя выполнить"""
+
+
+class ItemNotFound(InventoryError):
+    """Предмета нет (в справочнике или в инвентаре игрока)"""
+
+
+class StackLimitExceeded(InventoryError):
+    """Количество превысит лимит стопки"""
+
+
+class NotEnoughItems(InventoryError):
+    """В стопке меньше предметов, чем нужно списать"""
+
+
+def get_stack_limit(max_stack, is_stackable):
+    """Предмет, который нельзя складывать, занимает стопку из одного"""
+    return max_stack if is_stackable else 1
+
+
+def _totals(entries):
+    """Суммы по (игрок, предмет) для списка (player_id, item_id, quantity)"""
+    totals = defaultdict(int)
+    for player_id, item_id, quantity in entries:
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            raise InventoryError('Количество должно быть положительным целым числом')
+        totals[(player_id, item_id)] += quantity
+    return totals
+
+
+def _groups(totals):
+    """Пары с одинаковыми (предмет, количество) меняются одним UPDATE"""
+    groups = defaultdict(list)
+    for (player_id, item_id), quantity in totals.items():
+        groups[(item_id, quantity)].append(player_id)
+    return groups
+
+
+def _invalidate_summaries(totals):
+    player_ids = {player_id for player_id, _ in totals}
+    transaction.on_commit(lambda: invalidate_inventory_summaries(player_ids))
+
+
+def grant_items(grants):
+    """
+    Выдать предметы: список (player_id, item_id, quantity), один или много игроков.
+
+    Все в одной транзакции: недостающие стопки создаются одним INSERT
+    (ON CONFLICT DO NOTHING), количество прибавляется условным UPDATE
+    (quantity = quantity + n WHERE quantity <= лимит - n), по одному на
+    группу с одинаковыми предметом и количеством. Если хоть одна стопка
+    переполнится, не выдается ничего. Возвращает суммы по (игрок, предмет).
+    """
+    totals = _totals(grants)
+    if not totals:
+        return {}
+
+    limits = {
+        item_id: get_stack_limit(max_stack, is_stackable)
+        for item_id, max_stack, is_stackable in Item.objects.filter(
+            pk__in={item_id for _, item_id in totals}
+        ).order_by().values_list('id', 'max_stack', 'is_stackable')
+    }
+    if any(item_id not in limits for _, item_id in totals):
+        raise ItemNotFound('Предмет не найден')
+
+    with transaction.atomic():
+        InventoryItem.objects.bulk_create(
+            [
+                InventoryItem(player_id=player_id, item_id=item_id, quantity=0)
+                for player_id, item_id in totals
+            ],
+            ignore_conflicts=True,
+        )
+        for (item_id, quantity), player_ids in _groups(totals).items():
+            updated = InventoryItem.objects.filter(
+                item_id=item_id,
+                player_id__in=player_ids,
+                quantity__lte=limits[item_id] - quantity,
+            ).update(quantity=F('quantity') + quantity)
+            if updated != len(player_ids):
+                raise StackLimitExceeded('Невозможно добавить предмет (превышен лимит стопки)')
+
+        # UPDATE и bulk_create не отправляют post_save
+        _invalidate_summaries(totals)
+
+    return dict(totals)
+
+
+def consume_items(consumptions):
+    """
+    Списать предметы: список (player_id, item_id, quantity).
+
+    Количество уменьшается условным UPDATE (WHERE quantity >= n), пустые
+    стопки удаляются одним DELETE. Если чего-то не хватает, не списывается
+    ничего. Возвращает суммы по (игрок, предмет).
+    """
+    totals = _totals(consumptions)
+    if not totals:
+        return {}
+
+    with transaction.atomic():
+        for (item_id, quantity), player_ids in _groups(totals).items():
+            updated = InventoryItem.objects.filter(
+                item_id=item_id,
+                player_id__in=player_ids,
+                quantity__gte=quantity,
+            ).update(quantity=F('quantity') - quantity)
+            if updated != len(player_ids):
+                owned = InventoryItem.objects.filter(item_id=item_id, player_id__in=player_ids).count()
+                if owned != len(player_ids):
+                    raise ItemNotFound('Предмет не найден в инвентаре')
+                raise NotEnoughItems('Недостаточно предметов')
+
+        InventoryItem.objects.filter(
+            player_id__in={player_id for player_id, _ in totals},
+            item_id__in={item_id for _, item_id in totals},
+            quantity=0,
+        ).delete()
+
+        _invalidate_summaries(totals)
+
+    return dict(totals)
+
+
+def grant_item(player, item_id, quantity=1):
+    """Выдать один предмет; возвращает стопку игрока"""
+    grant_items([(player.pk, item_id, quantity)])
+    return InventoryItem.objects.select_related('player', 'item').get(player=player, item_id=item_id)
+
+
+def consume_item(player, item_id, quantity=1):
+    """Списать один предмет; возвращает оставшееся количество"""
+    consume_items([(player.pk, item_id, quantity)])
+    remaining = InventoryItem.objects.filter(player=player, item_id=item_id).values_list('quantity', flat=True)
+    return remaining.first() or 0
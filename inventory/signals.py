@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import InventoryItem
+from .summary import invalidate_inventory_summary_on_commit
+
+
+@receiver([post_save, post_delete], sender=InventoryItem)
+def inventory_item_changed(sender, instance, **kwargs):
+    """Сбрасывает сводку инвентаря владельца после коммита"""
+    invalidate_inventory_summary_on_commit(instance.player_id)
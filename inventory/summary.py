@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Item, InventoryItem
+
+SUMMARY_CACHE_KEY = 'inventory:summary:{player_id}'
+
+
+def get_summary_cache_key(player_id):
+    return SUMMARY_CACHE_KEY.format(player_id=player_id)
+
+
+def build_summary_groups(player_id):
+    """
+    Количество предметов и стопок игрока по (тип, редкость)
+    одним запросом GROUP BY.
+    """
+    rows = (
+        InventoryItem.objects
+        .filter(player_id=player_id)
+        .order_by()
+        .values_list('item__item_type', 'item__rarity')
+        .annotate(quantity=Sum('quantity'), stacks=Count('id'))
+    )
+    return [tuple(row) for row in rows]
+
+
+def get_summary_groups(player_id):
+    """Группы из кэша; собираются заново только после изменений инвентаря"""
+    key = get_summary_cache_key(player_id)
+    groups = cache.get(key)
+    if groups is None:
+        groups = build_summary_groups(player_id)
+        cache.set(key, groups, settings.INVENTORY_SUMMARY_CACHE_TIMEOUT)
+    return groups
+
+
+def get_inventory_summary(player_id):
+    """
+    Сводка инвентаря: всего предметов и стопок, количество по типам и редкости.
+
+    В кэше хранятся коды типов и редкостей, названия подставляются
+    при каждом ответе (на языке запроса).
+    """
+    type_labels = dict(Item.ITEM_TYPE_CHOICES)
+    rarity_labels = dict(Item.RARITY_CHOICES)
+
+    items_by_type = {}
+    items_by_rarity = {}
+    total_items = 0
+    total_stacks = 0
+    for item_type, rarity, quantity, stacks in get_summary_groups(player_id):
+        type_label = str(type_labels.get(item_type, item_type))
+        rarity_label = str(rarity_labels.get(rarity, rarity))
+        items_by_type[type_label] = items_by_type.get(type_label, 0) + quantity
+        items_by_rarity[rarity_label] = items_by_rarity.get(rarity_label, 0) + quantity
+        total_items += quantity
+        total_stacks += stacks
+
+    return {
+        'total_items': total_items,
+        'total_unique_items': total_stacks,
+        'items_by_type': items_by_type,
+        'items_by_rarity': items_by_rarity,
+    }
+
+
+def invalidate_inventory_summary(player_id):
+    cache.delete(get_summary_cache_key(player_id))
+
+
+def invalidate_inventory_summary_on_commit(player_id):
+    """
+    Сбрасывает сводку после коммита текущей транзакции: сброс внутри
+    транзакции дал бы параллельному запросу закэшировать старые данные
+    """
+    transaction.on_commit(lambda: invalidate_inventory_summary(player_id))
+
+
+def invalidate_inventory_summaries(player_ids):
+    cache.delete_many([get_summary_cache_key(player_id) for player_id in player_ids])
@@ -1,3 +1,121 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from ggame.testing import QueryPlanAssertions
+from users.models import TelegramUser
+from .models import Item, InventoryItem
+from .summary import get_inventory_summary, get_summary_cache_key
+from .operations import (
+    InventoryError, ItemNotFound, NotEnoughItems, StackLimitExceeded,
+    consume_item, consume_items, grant_item, grant_items,
+)
+
+
+class HotQueryPlanTests(QueryPlanAssertions, TestCase):
+    """Горячие запросы к инвентарю идут по индексам"""
+
+    def test_inventory_by_player(self):
+        queryset = InventoryItem.objects.filter(player_id=1).order_by('-acquired_at', '-id')
+        self.assertUsesIndex(queryset, 'inventory_player_acquired_idx', ordered=True)
+
+    def test_active_items(self):
+        queryset = Item.objects.filter(is_active=True)
+        self.assertUsesIndex(queryset, 'item_active_idx', ordered=True)
+
+
+class InventoryOperationTests(TestCase):
+    def setUp(self):
+        self.players = [TelegramUser.objects.create(username=f'player{i}', telegram_id=i) for i in (1, 2)]
+        self.potion = Item.objects.create(name='Зелье', max_stack=10)
+        self.sword = Item.objects.create(name='Меч', max_stack=10, is_stackable=False)
+
+    def quantities(self):
+        return dict(InventoryItem.objects.filter(item=self.potion).values_list('player__username', 'quantity'))
+
+    def test_batch_grant_for_many_players(self):
+        totals = grant_items([
+            (self.players[0].pk, self.potion.pk, 2),
+            (self.players[1].pk, self.potion.pk, 3),
+            (self.players[0].pk, self.potion.pk, 1),
+        ])
+
+        self.assertEqual(totals[(self.players[0].pk, self.potion.pk)], 3)
+        self.assertEqual(self.quantities(), {'player1': 3, 'player2': 3})
+
+    def test_stack_limit_exceeded_grants_nothing(self):
+        grant_item(self.players[0], self.potion.pk, 9)
+
+        with self.assertRaises(StackLimitExceeded):
+            grant_items([
+                (self.players[1].pk, self.potion.pk, 1),
+                (self.players[0].pk, self.potion.pk, 2),
+            ])
+
+        # Стопка второго игрока, созданная в той же транзакции, тоже откатилась
+        self.assertEqual(self.quantities(), {'player1': 9})
+
+    def test_non_stackable_item_is_a_stack_of_one(self):
+        grant_item(self.players[0], self.sword.pk)
+
+        with self.assertRaises(StackLimitExceeded):
+            grant_item(self.players[0], self.sword.pk)
+
+    def test_double_consume(self):
+        grant_item(self.players[0], self.potion.pk, 1)
+
+        self.assertEqual(consume_item(self.players[0], self.potion.pk), 0)
+        # Пустая стопка удалена, второе списание не проходит
+        with self.assertRaises(ItemNotFound):
+            consume_item(self.players[0], self.potion.pk)
+        self.assertFalse(InventoryItem.objects.exists())
+
+    def test_not_enough_items_consumes_nothing(self):
+        grant_items([(self.players[0].pk, self.potion.pk, 3), (self.players[1].pk, self.potion.pk, 1)])
+
+        with self.assertRaises(NotEnoughItems):
+            consume_items([(self.players[0].pk, self.potion.pk, 1), (self.players[1].pk, self.potion.pk, 2)])
+
+        self.assertEqual(self.quantities(), {'player1': 3, 'player2': 1})
+
+    def test_invalid_quantity(self):
+        with self.assertRaises(InventoryError):
+            grant_item(self.players[0], self.potion.pk, 0)
+        with self.assertRaises(ItemNotFound):
+            grant_item(self.players[0], self.potion.pk + 100)
+
+
+class InventorySummaryCacheTests(TestCase):
+    """Сводка инвентаря сбрасывается только после коммита"""
+
+    def setUp(self):
+        cache.clear()
+        self.player = TelegramUser.objects.create(username='owner', telegram_id=10)
+        self.potion = Item.objects.create(name='Зелье', max_stack=10)
+        self.key = get_summary_cache_key(self.player.pk)
+
+    def assertInvalidatedOnCommit(self, change):
+        get_inventory_summary(self.player.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            # До коммита параллельный запрос не должен закэшировать старую сводку
+            self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNone(cache.get(self.key))
+
+    def test_grant(self):
+        self.assertInvalidatedOnCommit(lambda: grant_item(self.player, self.potion.pk, 3))
+        self.assertEqual(get_inventory_summary(self.player.pk)['total_items'], 3)
+
+    def test_consume(self):
+        grant_item(self.player, self.potion.pk, 3)
+        self.assertInvalidatedOnCommit(lambda: consume_item(self.player, self.potion.pk, 2))
+        self.assertEqual(get_inventory_summary(self.player.pk)['total_items'], 1)
+
+    def test_direct_save(self):
+        item = grant_item(self.player, self.potion.pk, 1)
+
+        def change():
+            item.quantity = 5
+            item.save()
+
+        self.assertInvalidatedOnCommit(change)
+        self.assertEqual(get_inventory_summary(self.player.pk)['total_items'], 5)
@@ -4,7 +4,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Item, InventoryItem
+from .operations import InventoryError, ItemNotFound, grant_item, consume_item
+from .summary import get_inventory_summary
 from .serializers import ItemSerializer, InventoryItemSerializer
+from ggame.pagination import AcquiredAtPagination
+
+
+def _get_positive_int(request, name, default=None):
+    """Положительное целое из тела запроса; None, если оно некорректно"""
+    try:
+        value = int(request.data.get(name, default))
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
 
 
 class ItemViewSet(viewsets.ReadOnlyModelViewSet):
@@ -22,85 +34,58 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
     """
     serializer_class = InventoryItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AcquiredAtPagination
 
     def get_queryset(self):
         """Возвращает только предметы текущего пользователя"""
-        return InventoryItem.objects.filter(player=self.request.user)
+        return InventoryItem.objects.filter(player=self.request.user).select_related('player', 'item')
 
     @action(detail=False, methods=['post'])
     def add_item(self, request):
         """Добавить предмет в инвентарь"""
-        item_id = request.data.get('item_id')
-        quantity = request.data.get('quantity', 1)
+        item_id = _get_positive_int(request, 'item_id')
+        quantity = _get_positive_int(request, 'quantity', 1)
+        if quantity is None:
+            return Response(
+                {'error': 'Количество должно быть положительным целым числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        try:
-            item = Item.objects.get(id=item_id, is_active=True)
-        except Item.DoesNotExist:
+        if not Item.objects.filter(id=item_id, is_active=True).exists():
             return Response(
                 {'error': 'Предмет не найден'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Проверяем, есть ли уже такой предмет у игрока
-        inventory_item, created = InventoryItem.objects.get_or_create(
-            player=request.user,
-            item=item,
-            defaults={'quantity': 0}
-        )
+        try:
+            inventory_item = grant_item(request.user, item_id, quantity)
+        except InventoryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if inventory_item.add_quantity(quantity):
-            serializer = self.get_serializer(inventory_item)
-            return Response(serializer.data)
-        else:
-            return Response(
-                {'error': 'Невозможно добавить предмет (превышен лимит стопки)'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        serializer = self.get_serializer(inventory_item)
+        return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def remove_item(self, request):
         """Убрать предмет из инвентаря"""
-        item_id = request.data.get('item_id')
-        quantity = request.data.get('quantity', 1)
-
-        try:
-            inventory_item = InventoryItem.objects.get(
-                player=request.user,
-                item_id=item_id
-            )
-        except InventoryItem.DoesNotExist:
-            return Response(
-                {'error': 'Предмет не найден в инвентаре'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        if inventory_item.remove_quantity(quantity):
-            return Response({'success': True})
-        else:
+        item_id = _get_positive_int(request, 'item_id')
+        quantity = _get_positive_int(request, 'quantity', 1)
+        if quantity is None:
             return Response(
-                {'error': 'Недостаточно предметов'},
+                {'error': 'Количество должно быть положительным целым числом'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    @action(detail=False, methods=['get'])
-    def summary(self, request):
-        """Получить сводку инвентаря"""
-        inventory_items = self.get_queryset()
-        total_items = sum(item.quantity for item in inventory_items)
-
-        items_by_type = {}
-        items_by_rarity = {}
-
-        for item in inventory_items:
-            item_type = item.item.get_item_type_display()
-            rarity = item.item.get_rarity_display()
+        try:
+            remaining = consume_item(request.user, item_id, quantity)
+        except ItemNotFound as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except InventoryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            items_by_type[item_type] = items_by_type.get(item_type, 0) + item.quantity
-            items_by_rarity[rarity] = items_by_rarity.get(rarity, 0) + item.quantity
+        return Response({'success': True, 'quantity': remaining})
 
-        return Response({
-            'total_items': total_items,
-            'total_unique_items': inventory_items.count(),
-            'items_by_type': items_by_type,
-            'items_by_rarity': items_by_rarity,
-        })
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Получить сводку инвентаря (один GROUP BY, результат кэшируется)"""
+        return Response(get_inventory_summary(request.user.pk))
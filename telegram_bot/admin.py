@@ -1,3 +1,13 @@
 from django.contrib import admin
+from .models import OutboundMessage
 
-# Register your models here.
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    """
+    Админка для очереди исходящих сообщений
+    """
+    list_display = ['id', 'chat_id', 'method', 'status', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['status', 'method']
+    search_fields = ['chat_id']
+    readonly_fields = ['created_at', 'sent_at']
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ProcessedUpdate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEDUP_SETTINGS = {
+    'CACHE_SIZE': 10000,     # update_id в памяти воркера
+    'TTL_HOURS': 24,         # сколько хранить update_id в базе
+    'PRUNE_INTERVAL': 600,   # как часто чистить таблицу (секунды)
+}
+
+
+class UpdateDeduplicator:
+    """
+    Отсекает повторные доставки одного update_id.
+
+    Недавние update_id хранятся в ограниченном LRU в памяти воркера,
+    а общая для всех воркеров таблица ProcessedUpdate служит атомарной
+    "заявкой" на обработку: выигрывает тот, чей INSERT прошел.
+    """
+
+    def __init__(self, options=None):
+        self.options = {
+            **DEFAULT_DEDUP_SETTINGS,
+            **getattr(settings, 'TELEGRAM_UPDATE_DEDUP_SETTINGS', {}),
+            **(options or {}),
+        }
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def _remember(self, update_id):
+        with self._lock:
+            self._recent[update_id] = True
+            self._recent.move_to_end(update_id)
+            while len(self._recent) > self.options['CACHE_SIZE']:
+                self._recent.popitem(last=False)
+
+    def _seen_recently(self, update_id):
+        with self._lock:
+            if update_id in self._recent:
+                self._recent.move_to_end(update_id)
+                return True
+        return False
+
+    def claim(self, update_id):
+        """True, если обновление обрабатывается впервые"""
+        if self._seen_recently(update_id):
+            return False
+
+        try:
+            with transaction.atomic():
+                ProcessedUpdate.objects.create(update_id=update_id)
+        except IntegrityError:
+            self._remember(update_id)
+            return False
+
+        self._remember(update_id)
+        self.maybe_prune()
+        return True
+
+    def release(self, update_id):
+        """Снять отметку, чтобы повторная доставка обработалась заново"""
+        with self._lock:
+            self._recent.pop(update_id, None)
+        ProcessedUpdate.objects.filter(update_id=update_id).delete()
+
+    def prune(self):
+        """Удалить update_id старше TTL"""
+        threshold = timezone.now() - timedelta(hours=self.options['TTL_HOURS'])
+        deleted, _ = ProcessedUpdate.objects.filter(processed_at__lt=threshold).delete()
+        if deleted:
+            logger.info(f"Удалено старых update_id: {deleted}")
+        return deleted
+
+    def maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune >= self.options['PRUNE_INTERVAL']:
+            self._last_prune = now
+            self.prune()
+
+
+deduplicator = UpdateDeduplicator()
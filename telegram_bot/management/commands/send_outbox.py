@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from telegram_bot.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = 'Отправка сообщений из очереди исходящих сообщений Telegram'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать одну пачку и выйти',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Удалить старые отправленные сообщения и update_id и выйти',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN:
+            self.stderr.write(
+                self.style.ERROR('TELEGRAM_BOT_TOKEN не настроен')
+            )
+            return
+
+        worker = OutboxWorker()
+
+        if options['prune']:
+            deleted = worker.prune()
+            self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted}'))
+            return
+
+        if options['once']:
+            sent = worker.run_once()
+            self.stdout.write(self.style.SUCCESS(f'Отправлено сообщений: {sent}'))
+            return
+
+        self.stdout.write('📤 Outbox worker запущен (Ctrl+C для остановки)')
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Outbox worker остановлен')
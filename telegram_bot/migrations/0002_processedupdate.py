@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedUpdate',
+            fields=[
+                ('update_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Update ID')),
+                ('processed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Обработан')),
+            ],
+            options={
+                'verbose_name': 'Обработанное обновление',
+                'verbose_name_plural': 'Обработанные обновления',
+            },
+        ),
+    ]
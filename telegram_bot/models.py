@@ -1,3 +1,89 @@
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class OutboundMessage(models.Model):
+    """
+    Исходящий вызов Telegram Bot API в очереди на отправку
+    """
+    STATUS_CHOICES = [
+        ('pending', _('Ожидает отправки')),
+        ('sending', _('Отправляется')),
+        ('sent', _('Отправлено')),
+        ('failed', _('Ошибка')),
+    ]
+
+    chat_id = models.BigIntegerField(
+        verbose_name=_("Telegram Chat ID")
+    )
+    method = models.CharField(
+        max_length=50,
+        default='sendMessage',
+        verbose_name=_("Метод Bot API")
+    )
+    payload = models.JSONField(
+        verbose_name=_("Параметры запроса")
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_("Статус")
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Попыток отправки")
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_("Последняя ошибка")
+    )
+
+    # Время
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("Доступно для отправки с")
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Создано")
+    )
+    sent_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_("Отправлено")
+    )
+
+    class Meta:
+        verbose_name = _("Исходящее сообщение")
+        verbose_name_plural = _("Исходящие сообщения")
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='tg_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} -> {self.chat_id} ({self.get_status_display()})"
+
+
+class ProcessedUpdate(models.Model):
+    """
+    Уже обработанный update_id от Telegram (защита от повторной доставки)
+    """
+    update_id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name=_("Update ID")
+    )
+    processed_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name=_("Обработан")
+    )
+
+    class Meta:
+        verbose_name = _("Обработанное обновление")
+        verbose_name_plural = _("Обработанные обновления")
+
+    def __str__(self):
+        return str(self.update_id)
@@ -0,0 +1,303 @@
+import logging
+import time
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .dedup import deduplicator
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_SETTINGS = {
+    'GLOBAL_RATE': 30,       # сообщений в секунду на бота
+    'PER_CHAT_RATE': 1,      # сообщений в секунду в один чат
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'LEASE_SECONDS': 60,     # через сколько зависшее сообщение снова берется в работу
+    'POLL_INTERVAL': 1.0,
+    'POOL_SIZE': 10,
+    'TIMEOUT': 10,
+    'RETENTION_DAYS': 7,     # сколько хранить отправленные и неудачные сообщения
+    'PRUNE_INTERVAL': 3600,  # как часто чистить таблицу (секунды)
+}
+
+
+def get_outbox_settings():
+    return {**DEFAULT_OUTBOX_SETTINGS, **getattr(settings, 'TELEGRAM_OUTBOX_SETTINGS', {})}
+
+
+def enqueue_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
+    """Поставить сообщение в очередь на отправку (один INSERT)"""
+    payload = {
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': parse_mode,
+    }
+    if reply_markup:
+        payload['reply_markup'] = reply_markup
+
+    return OutboundMessage.objects.create(
+        chat_id=chat_id,
+        method='sendMessage',
+        payload=payload,
+    )
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now=None):
+        """Сколько секунд ждать до появления токена"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now=None):
+        """Забрать токен, если он есть"""
+        now = time.monotonic() if now is None else now
+        if self.wait_time(now) > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds, now=None):
+        """Не выдавать токены ближайшие seconds секунд (ответ 429)"""
+        now = time.monotonic() if now is None else now
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated_at = now
+
+
+class OutboxWorker:
+    """
+    Отправляет сообщения из очереди OutboundMessage.
+
+    Запускается отдельным процессом (`python manage.py send_outbox`).
+    Сообщения забираются пачками, статусы обновляются общими UPDATE,
+    HTTP-соединения переиспользуются через requests.Session.
+    """
+
+    def __init__(self, bot_token=None, options=None):
+        self.options = {**get_outbox_settings(), **(options or {})}
+        self.bot_token = bot_token or settings.TELEGRAM_BOT_TOKEN
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.options['POOL_SIZE'],
+        )
+        self.session.mount('https://', adapter)
+        self.global_bucket = TokenBucket(self.options['GLOBAL_RATE'])
+        self.chat_buckets = {}
+        self.lease_until = None
+        self._last_prune = None
+
+    def get_chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.options['PER_CHAT_RATE'], 1)
+        return bucket
+
+    def prune_chat_buckets(self):
+        """Убирает заполненные бакеты, чтобы словарь не рос бесконечно"""
+        now = time.monotonic()
+        self.chat_buckets = {
+            chat_id: bucket for chat_id, bucket in self.chat_buckets.items()
+            if bucket.wait_time(now) > 0 or bucket.tokens < bucket.capacity
+        }
+
+    def claim_batch(self):
+        """Забрать пачку готовых к отправке сообщений"""
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=self.options['LEASE_SECONDS'])
+
+        self.lease_until = lease_until
+        with transaction.atomic():
+            batch = list(
+                OutboundMessage.objects
+                .select_for_update(skip_locked=True)
+                .filter(status__in=['pending', 'sending'], available_at__lte=now)
+                .order_by('available_at', 'id')[:self.options['BATCH_SIZE']]
+            )
+            if batch:
+                OutboundMessage.objects.filter(pk__in=[m.pk for m in batch]).update(
+                    status='sending',
+                    available_at=lease_until,
+                    attempts=F('attempts') + 1,
+                )
+        for message in batch:
+            message.attempts += 1
+        return batch
+
+    def extend_lease(self, messages, seconds):
+        """
+        Продлевает аренду еще не обработанных сообщений пачки, если ее
+        не хватит на seconds секунд: иначе другой воркер заберет их
+        повторно и отправит дубли
+        """
+        now = timezone.now()
+        if not messages or self.lease_until - now >= timedelta(seconds=seconds):
+            return
+        self.lease_until = now + timedelta(seconds=seconds + self.options['LEASE_SECONDS'])
+        OutboundMessage.objects.filter(pk__in=[m.pk for m in messages], status='sending').update(
+            available_at=self.lease_until,
+        )
+
+    def release(self, messages, seconds):
+        """Вернуть сообщения в очередь через seconds секунд, не считая попытку"""
+        if messages:
+            OutboundMessage.objects.filter(pk__in=[m.pk for m in messages], status='sending').update(
+                status='pending',
+                available_at=timezone.now() + timedelta(seconds=seconds),
+                attempts=F('attempts') - 1,
+            )
+
+    def mark_sent(self, message):
+        OutboundMessage.objects.filter(pk=message.pk).update(
+            status='sent',
+            sent_at=timezone.now(),
+            last_error='',
+        )
+
+    def call_api(self, message):
+        url = f"https://api.telegram.org/bot{self.bot_token}/{message.method}"
+        return self.session.post(url, json=message.payload, timeout=self.options['TIMEOUT'])
+
+    def defer(self, message, seconds, error='', **extra):
+        OutboundMessage.objects.filter(pk=message.pk).update(
+            status='pending',
+            available_at=timezone.now() + timedelta(seconds=seconds),
+            last_error=error,
+            **extra
+        )
+
+    def fail(self, message, error):
+        logger.error(f"Сообщение {message.pk} не отправлено: {error}")
+        OutboundMessage.objects.filter(pk=message.pk).update(
+            status='failed',
+            last_error=error,
+        )
+
+    def retry_or_fail(self, message, error):
+        if message.attempts >= self.options['MAX_ATTEMPTS']:
+            self.fail(message, error)
+        else:
+            self.defer(message, 2 ** message.attempts, error)
+
+    def send(self, message):
+        """Отправить одно сообщение. Возвращает True при успехе"""
+        try:
+            response = self.call_api(message)
+        except requests.RequestException as e:
+            self.retry_or_fail(message, str(e))
+            return False
+
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+            except ValueError:
+                retry_after = 1
+            logger.warning(f"Telegram 429 для чата {message.chat_id}, пауза {retry_after} с")
+            self.global_bucket.pause(retry_after)
+            self.get_chat_bucket(message.chat_id).pause(retry_after)
+            # 429 не считается неудачной попыткой
+            self.defer(message, retry_after, 'Too Many Requests', attempts=F('attempts') - 1)
+            return False
+
+        if response.status_code >= 500:
+            self.retry_or_fail(message, f"HTTP {response.status_code}")
+            return False
+
+        if response.status_code >= 400:
+            # Чат не найден, бот заблокирован и т.п. - повтор не поможет
+            self.fail(message, f"HTTP {response.status_code}: {response.text[:500]}")
+            return False
+
+        return True
+
+    def run_once(self):
+        """
+        Обработать одну пачку. Возвращает число отправленных сообщений.
+
+        Каждое сообщение помечается отправленным сразу после успеха, чтобы
+        падение воркера посреди пачки не приводило к повторной отправке.
+        """
+        batch = self.claim_batch()
+        sent = 0
+
+        for index, message in enumerate(batch):
+            remaining = batch[index:]
+
+            if self.global_bucket.paused_until > time.monotonic():
+                # Telegram ответил 429 - остаток пачки возвращается в очередь,
+                # а не ждет паузы под арендой
+                self.release(remaining, self.global_bucket.wait_time())
+                break
+
+            chat_wait = self.get_chat_bucket(message.chat_id).wait_time()
+            if chat_wait > 0:
+                # Чат упирается в лимит - откладываем, не блокируя остальных
+                self.defer(message, chat_wait, attempts=F('attempts') - 1)
+                continue
+
+            global_wait = self.global_bucket.wait_time()
+            self.extend_lease(remaining, global_wait + self.options['TIMEOUT'])
+            if global_wait > 0:
+                time.sleep(global_wait)
+            self.global_bucket.consume()
+            self.get_chat_bucket(message.chat_id).consume()
+
+            if self.send(message):
+                self.mark_sent(message)
+                sent += 1
+
+        self.prune_chat_buckets()
+        return sent
+
+    def prune(self):
+        """
+        Удалить отправленные и неудачные сообщения старше RETENTION_DAYS,
+        а заодно старые update_id: при тихом боте вебхук их не чистит
+        """
+        threshold = timezone.now() - timedelta(days=self.options['RETENTION_DAYS'])
+        deleted, _ = OutboundMessage.objects.filter(
+            status__in=['sent', 'failed'], created_at__lt=threshold,
+        ).delete()
+        if deleted:
+            logger.info(f"Удалено старых исходящих сообщений: {deleted}")
+        return deleted + deduplicator.prune()
+
+    def maybe_prune(self):
+        now = time.monotonic()
+        if self._last_prune is None or now - self._last_prune >= self.options['PRUNE_INTERVAL']:
+            self._last_prune = now
+            self.prune()
+
+    def run_forever(self):
+        logger.info("Outbox worker started")
+        while True:
+            self.maybe_prune()
+            if not self.run_once():
+                time.sleep(self.options['POLL_INTERVAL'])
@@ -1,3 +1,215 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from users.models import TelegramUser
+from .dedup import UpdateDeduplicator
+from .models import OutboundMessage, ProcessedUpdate
+from .outbox import OutboxWorker, enqueue_message
+from .views import register_or_get_user
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self.data = data or {'ok': True}
+        self.text = ''
+
+    def json(self):
+        return self.data
+
+
+class Crash(Exception):
+    """Падение воркера посреди пачки"""
+
+
+class OutboxWorkerTests(TestCase):
+    def setUp(self):
+        self.worker = OutboxWorker(bot_token='test', options={'GLOBAL_RATE': 1000, 'PER_CHAT_RATE': 1000})
+
+    def test_reclaims_expired_lease_only(self):
+        expired = enqueue_message(1, 'expired')
+        leased = enqueue_message(2, 'leased')
+        now = timezone.now()
+        OutboundMessage.objects.filter(pk=expired.pk).update(
+            status='sending', attempts=1, available_at=now - timedelta(seconds=1)
+        )
+        OutboundMessage.objects.filter(pk=leased.pk).update(
+            status='sending', attempts=1, available_at=now + timedelta(seconds=60)
+        )
+
+        batch = self.worker.claim_batch()
+
+        self.assertEqual([message.pk for message in batch], [expired.pk])
+        expired.refresh_from_db()
+        self.assertEqual(expired.attempts, 2)
+        self.assertGreater(expired.available_at, now)
+
+    def test_marks_each_message_sent_immediately(self):
+        first = enqueue_message(1, 'first')
+        second = enqueue_message(2, 'second')
+
+        with mock.patch.object(self.worker, 'call_api', side_effect=[FakeResponse(), Crash()]):
+            with self.assertRaises(Crash):
+                self.worker.run_once()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'sent')
+        self.assertIsNotNone(first.sent_at)
+        self.assertEqual(second.status, 'sending')
+
+    def test_rate_limit_releases_rest_of_batch(self):
+        messages = [enqueue_message(chat_id, 'text') for chat_id in (1, 2, 3)]
+        limited = FakeResponse(429, {'ok': False, 'parameters': {'retry_after': 30}})
+
+        with mock.patch.object(self.worker, 'call_api', return_value=limited) as call_api, \
+                mock.patch('telegram_bot.outbox.time.sleep') as sleep:
+            self.assertEqual(self.worker.run_once(), 0)
+
+        # Ждать паузу 429 под арендой нельзя
+        sleep.assert_not_called()
+        self.assertEqual(call_api.call_count, 1)
+        for message in messages:
+            message.refresh_from_db()
+            self.assertEqual(message.status, 'pending')
+            self.assertEqual(message.attempts, 0)
+            self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=20))
+
+    def test_extends_lease_before_waiting(self):
+        message = enqueue_message(1, 'text')
+        self.worker.claim_batch()
+        self.worker.lease_until = timezone.now() + timedelta(seconds=1)
+
+        self.worker.extend_lease([message], 30)
+
+        message.refresh_from_db()
+        self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=30))
+
+
+class OutboxRetentionTests(TestCase):
+    def setUp(self):
+        self.worker = OutboxWorker(bot_token='test', options={'RETENTION_DAYS': 7})
+        old = timezone.now() - timedelta(days=8)
+        self.messages = {}
+        for status in ['pending', 'sending', 'sent', 'failed']:
+            for age in ['old', 'new']:
+                message = enqueue_message(1, f'{status} {age}')
+                OutboundMessage.objects.filter(pk=message.pk).update(status=status)
+                if age == 'old':
+                    OutboundMessage.objects.filter(pk=message.pk).update(created_at=old)
+                self.messages[status, age] = message.pk
+        ProcessedUpdate.objects.create(update_id=1, processed_at=old)
+        ProcessedUpdate.objects.create(update_id=2)
+
+    def assertPruned(self):
+        kept = set(OutboundMessage.objects.values_list('pk', flat=True))
+        pruned = {self.messages['sent', 'old'], self.messages['failed', 'old']}
+        self.assertEqual(kept, set(self.messages.values()) - pruned)
+        self.assertEqual(list(ProcessedUpdate.objects.values_list('update_id', flat=True)), [2])
+
+    def test_prune_removes_only_old_finished_rows(self):
+        self.assertEqual(self.worker.prune(), 3)
+        self.assertPruned()
+
+    def test_prune_runs_from_worker_loop(self):
+        with mock.patch.object(self.worker, 'run_once', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.worker.run_forever()
+        self.assertPruned()
+
+    @override_settings(TELEGRAM_BOT_TOKEN='test')
+    def test_command_prune(self):
+        call_command('send_outbox', '--prune', stdout=StringIO())
+        self.assertPruned()
+
+
+class UpdateDeduplicatorTests(TestCase):
+    def test_claims_update_once_across_workers(self):
+        first_worker, second_worker = UpdateDeduplicator(), UpdateDeduplicator()
+
+        self.assertTrue(first_worker.claim(1))
+        self.assertFalse(first_worker.claim(1))
+        # Второй воркер без локального кэша упирается в уникальность update_id
+        self.assertFalse(second_worker.claim(1))
+        self.assertEqual(ProcessedUpdate.objects.filter(update_id=1).count(), 1)
+
+    def test_release_allows_redelivery(self):
+        deduplicator = UpdateDeduplicator()
+        deduplicator.claim(1)
+        deduplicator.release(1)
+        self.assertTrue(deduplicator.claim(1))
+
+
+class WebhookDeduplicationTests(TestCase):
+    def post_update(self, update_id):
+        return self.client.post(
+            '/api/telegram/webhook/',
+            {'update_id': update_id, 'message': {'chat': {'id': 1}, 'text': '/start'}},
+            content_type='application/json',
+        )
+
+    def test_redelivered_update_is_handled_once(self):
+        with mock.patch('telegram_bot.views.deduplicator', UpdateDeduplicator()), \
+                mock.patch('telegram_bot.views.handle_update', return_value=JsonResponse({'status': 'ok'})) as handle:
+            self.assertEqual(self.post_update(10).status_code, 200)
+            self.assertEqual(self.post_update(10).status_code, 200)
+        self.assertEqual(handle.call_count, 1)
+
+    def test_failed_update_is_handled_again(self):
+        with mock.patch('telegram_bot.views.deduplicator', UpdateDeduplicator()), \
+                mock.patch('telegram_bot.views.handle_update', side_effect=[RuntimeError, JsonResponse({'status': 'ok'})]) as handle:
+            self.assertEqual(self.post_update(11).status_code, 500)
+            self.assertEqual(self.post_update(11).status_code, 200)
+        self.assertEqual(handle.call_count, 2)
+
+
+@override_settings(TELEGRAM_ACTIVITY_UPDATE_INTERVAL=60)
+class RegisterUserTests(TestCase):
+    telegram_data = {'id': 500, 'username': 'reader', 'first_name': 'Reader', 'language_code': 'ru'}
+
+    def updates(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+
+    def test_repeat_update_with_same_data_writes_nothing(self):
+        register_or_get_user(self.telegram_data)
+
+        with CaptureQueriesContext(connection) as queries:
+            user, created = register_or_get_user(self.telegram_data)
+
+        self.assertFalse(created)
+        self.assertEqual(self.updates(queries), [])
+
+    def test_changed_profile_saves_only_changed_fields(self):
+        register_or_get_user(self.telegram_data)
+
+        with CaptureQueriesContext(connection) as queries:
+            register_or_get_user({**self.telegram_data, 'username': 'renamed'})
+
+        [update] = self.updates(queries)
+        self.assertIn('username_telegram', update)
+        self.assertNotIn('first_name_telegram', update)
+        self.assertNotIn('last_activity', update)
+
+    def test_last_activity_written_after_throttle_window(self):
+        user, _ = register_or_get_user(self.telegram_data)
+        recently = timezone.now() - timedelta(seconds=30)
+        TelegramUser.objects.filter(pk=user.pk).update(last_activity=recently)
+
+        register_or_get_user(self.telegram_data)
+        user.refresh_from_db()
+        self.assertEqual(user.last_activity, recently)
+
+        long_ago = timezone.now() - timedelta(seconds=61)
+        TelegramUser.objects.filter(pk=user.pk).update(last_activity=long_ago)
+
+        register_or_get_user(self.telegram_data)
+        user.refresh_from_db()
+        self.assertGreater(user.last_activity, long_ago)
@@ -1,71 +1,73 @@
 import json
 import logging
-import os
-import requests
+from datetime import timedelta
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.conf import settings
 from django.utils import timezone
 from users.models import TelegramUser
+from .dedup import deduplicator
+from .outbox import enqueue_message
 
 logger = logging.getLogger(__name__)
 
 
 def send_message(chat_id, text, reply_markup=None):
     """
-    Отправка сообщения в Telegram
+    Постановка сообщения в очередь отправки Telegram
     """
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': chat_id,
-        'text': text,
-        'parse_mode': 'HTML'
-    }
-
-    if reply_markup:
-        payload['reply_markup'] = reply_markup
-
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        logger.error(f"Ошибка отправки сообщения: {e}")
+        return enqueue_message(chat_id, text, reply_markup)
+    except Exception as e:
+        logger.error(f"Ошибка постановки сообщения в очередь: {e}")
         return None
 
 
 def register_or_get_user(telegram_data):
     """
-    Регистрация или получение существующего пользователя
+    Регистрация или получение существующего пользователя.
+
+    Для существующего пользователя записываются только изменившиеся
+    поля профиля Telegram, а last_activity - не чаще, чем раз
+    в TELEGRAM_ACTIVITY_UPDATE_INTERVAL секунд.
     """
     try:
         telegram_id = telegram_data['id']
-        username = telegram_data.get('username')
-        first_name = telegram_data.get('first_name')
-        last_name = telegram_data.get('last_name')
-        language_code = telegram_data.get('language_code', 'ru')
+        profile = {
+            'username_telegram': telegram_data.get('username'),
+            'first_name_telegram': telegram_data.get('first_name'),
+            'last_name_telegram': telegram_data.get('last_name'),
+            'language': telegram_data.get('language_code', 'ru'),
+        }
+        now = timezone.now()
 
         user, created = TelegramUser.objects.get_or_create(
             telegram_id=telegram_id,
             defaults={
-                'username_telegram': username,
-                'first_name_telegram': first_name,
-                'last_name_telegram': last_name,
-                'language': language_code,
-                'last_activity': timezone.now(),
+                **profile,
+                'username': f'user_{telegram_id}',
+                'last_activity': now,
                 'is_active': True
             }
         )
 
         if not created:
-            # Обновляем данные пользователя
-            user.username_telegram = username
-            user.first_name_telegram = first_name
-            user.last_name_telegram = last_name
-            user.language = language_code
-            user.last_activity = timezone.now()
-            user.save()
+            # Обновляем только то, что действительно изменилось
+            changed_fields = [
+                field for field, value in profile.items()
+                if getattr(user, field) != value
+            ]
+            for field in changed_fields:
+                setattr(user, field, profile[field])
+
+            activity_interval = timedelta(seconds=settings.TELEGRAM_ACTIVITY_UPDATE_INTERVAL)
+            if user.last_activity is None or now - user.last_activity >= activity_interval:
+                user.last_activity = now
+                changed_fields.append('last_activity')
+
+            if changed_fields:
+                user.save(update_fields=changed_fields)
 
         logger.info(f"Пользователь {'создан' if created else 'обновлен'}: {user}")
         return user, created
@@ -86,49 +88,75 @@ def telegram_webhook(request):
         data = json.loads(request.body.decode('utf-8'))
         logger.info(f"=== WEBHOOK RECEIVED ===")
         logger.info(f"Data: {data}")
-        logger.info(f"Headers: {dict(request.headers)}")
 
-        # Проверяем наличие сообщения
-        if 'message' not in data:
-            logger.info("No message in webhook data")
+        # Повторная доставка того же обновления - отвечаем сразу
+        update_id = data.get('update_id')
+        if update_id is not None and not deduplicator.claim(update_id):
+            logger.info(f"Duplicate update {update_id}, skipping")
             return JsonResponse({'status': 'ok'})
 
-        message = data['message']
-        chat_id = message['chat']['id']
-        text = message.get('text', '')
-        from_user = message.get('from', {})
-
-        logger.info(f"Message from {from_user.get('username', 'unknown')}: {text}")
+        try:
+            return handle_update(data)
+        except Exception:
+            # Даем Telegram повторить доставку
+            if update_id is not None:
+                deduplicator.release(update_id)
+            raise
 
-        # Обрабатываем команду /start
-        if text == '/start':
-            logger.info("Processing /start command")
-            # Регистрируем пользователя
-            user, created = register_or_get_user(from_user)
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка декодирования JSON: {e}")
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
-            if user:
-                logger.info(f"User registered/updated: {user.username_telegram}")
+    except Exception as e:
+        logger.error(f"Ошибка обработки webhook: {e}")
+        return JsonResponse({'error': 'Internal server error'}, status=500)
 
-                # Создаем кнопку для открытия веб-приложения
-                # URL фронтенда берем из настроек
-                from django.conf import settings
-                frontend_url = getattr(settings, 'FRONTEND_URL', 'https://ggame.vercel.app')
-                web_app_url = f"{frontend_url}/#/profile?user_id={user.telegram_id}"
 
-                logger.info(f"Frontend URL: {frontend_url}")
-                logger.info(f"Web app URL: {web_app_url}")
-                logger.info(f"User Telegram ID: {user.telegram_id}")
+def handle_update(data):
+    """
+    Обработка одного обновления Telegram
+    """
+    # Проверяем наличие сообщения
+    if 'message' not in data:
+        logger.info("No message in webhook data")
+        return JsonResponse({'status': 'ok'})
 
-                reply_markup = {
-                    'inline_keyboard': [[{
-                        'text': '🎮 Начать игру',
-                        'web_app': {
-                            'url': web_app_url
-                        }
-                    }]]
-                }
+    message = data['message']
+    chat_id = message['chat']['id']
+    text = message.get('text', '')
+    from_user = message.get('from', {})
+
+    logger.info(f"Message from {from_user.get('username', 'unknown')}: {text}")
+
+    # Обрабатываем команду /start
+    if text == '/start':
+        logger.info("Processing /start command")
+        # Регистрируем пользователя
+        user, created = register_or_get_user(from_user)
+
+        if user:
+            logger.info(f"User registered/updated: {user.username_telegram}")
+
+            # Создаем кнопку для открытия веб-приложения
+            # URL фронтенда берем из настроек
+            from django.conf import settings
+            frontend_url = getattr(settings, 'FRONTEND_URL', 'https://ggame.vercel.app')
+            web_app_url = f"{frontend_url}/#/profile?user_id={user.telegram_id}"
+
+            logger.info(f"Frontend URL: {frontend_url}")
+            logger.info(f"Web app URL: {web_app_url}")
+            logger.info(f"User Telegram ID: {user.telegram_id}")
+
+            reply_markup = {
+                'inline_keyboard': [[{
+                    'text': '🎮 Начать игру',
+                    'web_app': {
+                        'url': web_app_url
+                    }
+                }]]
+            }
 
-                welcome_text = f"""🎉 Добро пожаловать в GGame, {user.first_name_telegram or user.username_telegram or 'Игрок'}!
+            welcome_text = f"""🎉 Добро пожаловать в GGame, {user.first_name_telegram or user.username_telegram or 'Игрок'}!
 
 🃏 Это карточная боевая игра с коллекционными картами
 💰 У вас есть {user.coins} монет и {user.gold} золота
@@ -136,23 +164,14 @@ def telegram_webhook(request):
 
 Нажмите кнопку ниже, чтобы начать игру!"""
 
-                logger.info(f"Sending welcome message to chat {chat_id}")
-                result = send_message(chat_id, welcome_text, reply_markup)
-                logger.info(f"Send result: {result}")
-
-            else:
-                logger.error("Failed to register user")
-                send_message(chat_id, "❌ Ошибка регистрации. Попробуйте позже.")
+            logger.info(f"Queueing welcome message to chat {chat_id}")
+            send_message(chat_id, welcome_text, reply_markup)
 
         else:
-            logger.info(f"Ignoring message: {text}")
-
-        return JsonResponse({'status': 'ok'})
+            logger.error("Failed to register user")
+            send_message(chat_id, "❌ Ошибка регистрации. Попробуйте позже.")
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка декодирования JSON: {e}")
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    else:
+        logger.info(f"Ignoring message: {text}")
 
-    except Exception as e:
-        logger.error(f"Ошибка обработки webhook: {e}")
-        return JsonResponse({'error': 'Internal server error'}, status=500)
+    return JsonResponse({'status': 'ok'})
@@ -0,0 +1,103 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import TelegramUser
+
+logger = logging.getLogger(__name__)
+
+FLUSH_CHUNK_SIZE = 500
+
+
+class ActivityTracker:
+    """
+    Накопитель "пользователь был онлайн" внутри процесса.
+
+    Отметки собираются в памяти, а фоновый поток раз в
+    ACTIVITY_FLUSH_INTERVAL секунд записывает их одним
+    UPDATE ... WHERE id IN (...) вместо записи на каждый запрос.
+    Поток запускается при первой отметке.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval
+        self._user_ids = set()
+        self._telegram_ids = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def get_flush_interval(self):
+        if self.flush_interval is not None:
+            return self.flush_interval
+        return settings.ACTIVITY_FLUSH_INTERVAL
+
+    def mark_seen(self, user_id=None, telegram_id=None):
+        """Отметить активность по id пользователя или его Telegram ID"""
+        with self._lock:
+            if user_id is not None:
+                self._user_ids.add(user_id)
+            if telegram_id is not None:
+                self._telegram_ids.add(telegram_id)
+        self.start()
+
+    def start(self):
+        """Запустить периодическую запись, если она еще не запущена"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Остановить фоновый поток и записать оставшиеся отметки"""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.get_flush_interval()):
+            try:
+                self.flush()
+            except Exception as e:
+                # Отметки этого цикла теряются, поток продолжает работу
+                logger.warning(f"Не удалось сохранить активность: {e}")
+            finally:
+                # У потока свое соединение с базой - не держим его между циклами
+                connection.close()
+
+    def flush(self):
+        """Записать накопленные отметки. Возвращает число обновленных строк"""
+        with self._lock:
+            user_ids, self._user_ids = self._user_ids, set()
+            telegram_ids, self._telegram_ids = self._telegram_ids, set()
+
+        if not user_ids and not telegram_ids:
+            return 0
+
+        now = timezone.now()
+        updated = 0
+        for lookup, ids in (('id__in', user_ids), ('telegram_id__in', telegram_ids)):
+            ids = list(ids)
+            for start in range(0, len(ids), FLUSH_CHUNK_SIZE):
+                chunk = ids[start:start + FLUSH_CHUNK_SIZE]
+                updated += TelegramUser.objects.filter(**{lookup: chunk}).update(last_activity=now)
+        return updated
+
+
+tracker = ActivityTracker()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        tracker.stop()
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить активность при завершении: {e}")
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import TelegramUser
+from .models import TelegramUser, CurrencyTransaction, LeaderboardEntry
 
 
 @admin.register(TelegramUser)
@@ -58,3 +58,37 @@ class TelegramUserAdmin(UserAdmin):
 
     # Количество элементов на странице
     list_per_page = 50
+
+
+@admin.register(CurrencyTransaction)
+class CurrencyTransactionAdmin(admin.ModelAdmin):
+    """
+    Админка для журнала операций с валютой (только просмотр)
+    """
+    list_display = ['user', 'coins', 'gold', 'reason', 'reference', 'created_at']
+    list_filter = ['reason', 'created_at']
+    search_fields = ['user__username_telegram', 'user__telegram_id', 'reference']
+    raw_id_fields = ['user']
+    list_select_related = ['user']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    """
+    Админка для снимка рейтинга (только просмотр, пересчитывается командой refresh_leaderboard)
+    """
+    list_display = ['rank', 'display_name', 'total_points', 'games_won', 'updated_at']
+    search_fields = ['display_name', 'user__telegram_id']
+    raw_id_fields = ['user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models import F
+
+from .events import publish_profile
+from .models import TelegramUser, CurrencyTransaction
+
+
+class InsufficientFunds(Exception):
+    """У пользователя не хватает валюты для списания"""
+
+
+def debit(user, coins=0, gold=0, reason='other', reference=''):
+    """
+    Списать валюту.
+
+    Проверка баланса и списание выполняются одним условным UPDATE
+    (coins = coins - x WHERE coins >= x), поэтому параллельные покупки
+    не уводят баланс в минус и не теряют обновления.
+    """
+    with transaction.atomic():
+        updated = TelegramUser.objects.filter(
+            pk=user.pk,
+            coins__gte=coins,
+            gold__gte=gold,
+        ).update(
+            coins=F('coins') - coins,
+            gold=F('gold') - gold,
+        )
+        if not updated:
+            raise InsufficientFunds()
+
+        entry = CurrencyTransaction.objects.create(
+            user_id=user.pk,
+            coins=-coins,
+            gold=-gold,
+            reason=reason,
+            reference=reference,
+        )
+
+    user.refresh_from_db(fields=['coins', 'gold'])
+    publish_profile(user.pk, {'coins': user.coins, 'gold': user.gold})
+    return entry
+
+
+def credit(user, coins=0, gold=0, reason='other', reference=''):
+    """Начислить валюту"""
+    with transaction.atomic():
+        TelegramUser.objects.filter(pk=user.pk).update(
+            coins=F('coins') + coins,
+            gold=F('gold') + gold,
+        )
+        entry = CurrencyTransaction.objects.create(
+            user_id=user.pk,
+            coins=coins,
+            gold=gold,
+            reason=reason,
+            reference=reference,
+        )
+
+    user.refresh_from_db(fields=['coins', 'gold'])
+    publish_profile(user.pk, {'coins': user.coins, 'gold': user.gold})
+    return entry
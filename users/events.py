@@ -0,0 +1,22 @@
+from django.http import JsonResponse
+
+from ggame.pubsub import publish_on_commit, user_channel
+from ggame.streams import event_stream_response, get_stream_user
+
+
+def publish_profile(user_id, data):
+    """Изменившиеся поля профиля уходят пользователю после фиксации транзакции"""
+    publish_on_commit(user_channel(user_id), 'profile', data)
+
+
+async def profile_events(request):
+    """
+    Поток событий текущего пользователя (Server-Sent Events).
+
+    profile - изменившиеся поля профиля (монеты, золото, статистика игр),
+    вместо повторного запроса профиля после каждого действия.
+    """
+    user = await get_stream_user(request)
+    if user is None:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+    return event_stream_response(user_channel(user.pk))
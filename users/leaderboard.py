@@ -0,0 +1,213 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import TelegramUser, LeaderboardEntry
+
+# Порядок рейтинга, совпадает с индексом users_ranking_idx
+RANKING_ORDER = ['-total_points', '-date_joined_telegram', '-id']
+ENTRY_FIELDS = ['rank', 'total_points', 'games_won', 'display_name']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+DEFAULT_RADIUS = 5
+MAX_RADIUS = 50
+BATCH_SIZE = 1000
+
+REFRESHED_AT_CACHE_KEY = 'users:leaderboard:refreshed_at'
+
+
+def get_display_name(username, first_name, telegram_id):
+    return username or first_name or f'user_{telegram_id}'
+
+
+def ranked_players():
+    """Игроки в порядке рейтинга (чтение идет по индексу users_ranking_idx)"""
+    return TelegramUser.objects.filter(telegram_id__isnull=False).order_by(*RANKING_ORDER)
+
+
+def _ahead_of(points, joined, user_id):
+    """Игроки выше ключа рейтинга (points, joined, id)"""
+    return (
+        Q(total_points__gt=points)
+        | Q(total_points=points, date_joined_telegram__gt=joined)
+        | Q(total_points=points, date_joined_telegram=joined, id__gt=user_id)
+    )
+
+
+def _behind(points, joined, user_id):
+    """Игроки ниже ключа рейтинга (points, joined, id)"""
+    return (
+        Q(total_points__lt=points)
+        | Q(total_points=points, date_joined_telegram__lt=joined)
+        | Q(total_points=points, date_joined_telegram=joined, id__lt=user_id)
+    )
+
+
+def take_changed_players(batch_size=BATCH_SIZE):
+    """
+    id игроков, отмеченных для пересчета (ranking_dirty); отметка снимается.
+
+    Строки, заблокированные незавершенными транзакциями (например,
+    подведением итогов игры), пропускаются и останутся отмеченными до
+    следующего пересчета - так пересчет никого не ждет, а значения
+    остальных игроков читаются уже после снятия отметки.
+    """
+    with transaction.atomic():
+        user_ids = list(
+            TelegramUser.objects.select_for_update(skip_locked=True)
+            .filter(ranking_dirty=True)
+            .order_by()
+            .values_list('id', flat=True)
+        )
+        for chunk in _chunks(user_ids, batch_size):
+            TelegramUser.objects.filter(pk__in=chunk).update(ranking_dirty=False)
+    return user_ids
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _in_chunks(queryset, lookup, ids, batch_size):
+    for chunk in _chunks(list(ids), batch_size):
+        yield from queryset.filter(**{lookup: chunk})
+
+
+def refresh_leaderboard(batch_size=BATCH_SIZE):
+    """
+    Обновить снимок рейтинга по изменившимся игрокам.
+
+    Места выше самого высокого затронутого места (старого или нового
+    места изменившегося игрока) не меняются, поэтому игроки читаются по
+    индексу начиная с него и только до строки, которая после всех
+    изменений снова совпала со снимком. Если в местах есть пропуск
+    (игрока удалили), снимок проверяется с первого места.
+    Возвращает число игроков в рейтинге и созданных, обновленных и удаленных строк.
+    """
+    now = timezone.now()
+    changed = take_changed_players(batch_size)
+    stats = LeaderboardEntry.objects.aggregate(count=Count('pk'), last_rank=Max('rank'))
+    has_gap = stats['count'] != (stats['last_rank'] or 0)
+    if not changed and not has_gap:
+        return {'total': stats['count'], 'created': 0, 'updated': 0, 'deleted': 0}
+
+    old_ranks = dict(_in_chunks(
+        LeaderboardEntry.objects.values_list('user_id', 'rank'), 'user_id__in', changed, batch_size
+    ))
+    pending = set(_in_chunks(ranked_players().values_list('id', flat=True), 'pk__in', changed, batch_size))
+    # Изменившиеся игроки, выбывшие из рейтинга
+    removed = set(old_ranks) - pending
+
+    if has_gap:
+        start, last_changed_rank = 1, stats['last_rank']
+    else:
+        start = min(old_ranks.values(), default=stats['count'] + 1)
+        # Самый высокий ключ рейтинга среди изменившихся игроков
+        keys = ranked_players().values_list('total_points', 'date_joined_telegram', 'id')
+        best = max(
+            (keys.filter(pk__in=chunk).first() for chunk in _chunks(list(pending), batch_size)),
+            default=None,
+        )
+        if best is not None:
+            start = min(start, ranked_players().filter(_ahead_of(*best)).count() + 1)
+        last_changed_rank = max(old_ranks.values(), default=0)
+
+    to_create = []
+    to_update = []
+    players = ranked_players().values_list(
+        'id', 'total_points', 'games_won',
+        'username_telegram', 'first_name_telegram', 'telegram_id', 'date_joined_telegram',
+    )
+    # Первая пачка - по смещению (проход по индексу), дальше - по ключу последней строки
+    batch = list(players[start - 1:start - 1 + batch_size])
+    rank = start - 1
+    reached_end = True
+    while batch:
+        snapshot = {
+            row[0]: row[1:]
+            for row in LeaderboardEntry.objects.filter(
+                user_id__in=[row[0] for row in batch]
+            ).values_list('user_id', *ENTRY_FIELDS)
+        }
+        for user_id, points, won, username, first_name, telegram_id, joined in batch:
+            rank += 1
+            pending.discard(user_id)
+            values = (rank, points, won, get_display_name(username, first_name, telegram_id))
+            previous = snapshot.get(user_id)
+            if previous == values:
+                # Все изменения позади и место совпало - дальше снимок верен
+                if rank > last_changed_rank and not pending:
+                    reached_end = False
+                    break
+                continue
+            entry = LeaderboardEntry(user_id=user_id, updated_at=now, **dict(zip(ENTRY_FIELDS, values)))
+            if previous is None:
+                to_create.append(entry)
+            else:
+                to_update.append(entry)
+        if not reached_end or len(batch) < batch_size:
+            break
+        last = batch[-1]
+        batch = list(players.filter(_behind(last[1], last[6], last[0]))[:batch_size])
+
+    with transaction.atomic():
+        deleted = 0
+        for chunk in _chunks(list(removed), batch_size):
+            deleted += LeaderboardEntry.objects.filter(user_id__in=chunk).delete()[0]
+        LeaderboardEntry.objects.bulk_create(to_create, batch_size=batch_size)
+        LeaderboardEntry.objects.bulk_update(to_update, ENTRY_FIELDS + ['updated_at'], batch_size=batch_size)
+        if reached_end:
+            # Рейтинг сократился: строки ниже последнего места больше не нужны
+            deleted += LeaderboardEntry.objects.filter(rank__gt=rank).delete()[0]
+
+    cache.set(REFRESHED_AT_CACHE_KEY, now.isoformat(), None)
+    return {
+        'total': get_total_ranked(),
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': deleted,
+    }
+
+
+def serialize_entry(entry):
+    return {
+        'rank': entry.rank,
+        'user_id': entry.user_id,
+        'display_name': entry.display_name,
+        'total_points': entry.total_points,
+        'games_won': entry.games_won,
+    }
+
+
+def get_refreshed_at():
+    return cache.get(REFRESHED_AT_CACHE_KEY)
+
+
+def get_total_ranked():
+    """Число игроков в снимке (места идут подряд, поэтому это максимальное место)"""
+    return LeaderboardEntry.objects.aggregate(total=Max('rank'))['total'] or 0
+
+
+def get_leaderboard_page(page=1, page_size=DEFAULT_PAGE_SIZE):
+    """Страница рейтинга: диапазон мест по индексу, без OFFSET"""
+    start = (page - 1) * page_size
+    return list(LeaderboardEntry.objects.filter(rank__gt=start, rank__lte=start + page_size))
+
+
+def get_user_rank(user_id):
+    """Место игрока в снимке (None, если его там еще нет)"""
+    return LeaderboardEntry.objects.filter(user_id=user_id).values_list('rank', flat=True).first()
+
+
+def get_neighbours(user_id, radius=DEFAULT_RADIUS):
+    """
+    Строка игрока и соседи по рейтингу: поиск по первичному ключу
+    и диапазон мест по индексу. None, если игрока нет в снимке.
+    """
+    rank = get_user_rank(user_id)
+    if rank is None:
+        return None
+    return list(LeaderboardEntry.objects.filter(rank__gte=max(1, rank - radius), rank__lte=rank + radius))
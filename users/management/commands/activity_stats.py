@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import TelegramUser
+
+
+class Command(BaseCommand):
+    help = 'Статистика активности игроков (онлайн, DAU, WAU)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--online-minutes',
+            type=int,
+            default=5,
+            help='Окно "онлайн" в минутах (по умолчанию 5)',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        windows = [
+            (f"Онлайн (последние {options['online_minutes']} мин)", timedelta(minutes=options['online_minutes'])),
+            ('DAU (24 часа)', timedelta(days=1)),
+            ('WAU (7 дней)', timedelta(days=7)),
+        ]
+
+        self.stdout.write(self.style.SUCCESS('📊 Активность игроков:'))
+        for title, window in windows:
+            count = TelegramUser.objects.filter(last_activity__gte=now - window).count()
+            self.stdout.write(f'{title}: {count}')
+        self.stdout.write(f'Всего игроков: {TelegramUser.objects.count()}')
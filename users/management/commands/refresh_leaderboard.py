@@ -0,0 +1,44 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.leaderboard import refresh_leaderboard
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Пересчет снимка рейтинга игроков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Пересчитывать каждые N секунд (по умолчанию один раз)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval <= 0:
+            self.report(refresh_leaderboard())
+            return
+
+        self.stdout.write(f'🏆 Пересчет рейтинга каждые {interval} с (Ctrl+C для остановки)')
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    self.report(refresh_leaderboard())
+                except Exception as e:
+                    logger.exception(f"Ошибка пересчета рейтинга: {e}")
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write('Пересчет рейтинга остановлен')
+
+    def report(self, stats):
+        self.stdout.write(self.style.SUCCESS(
+            f"Рейтинг: {stats['total']} игроков, новых {stats['created']}, "
+            f"изменено {stats['updated']}, удалено {stats['deleted']}"
+        ))
@@ -0,0 +1,21 @@
+from .activity import tracker
+
+
+class ActivityTrackingMiddleware:
+    """Отмечает активность пользователя для отложенной записи last_activity"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        # DRF выставляет request.user после аутентификации во view
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            tracker.mark_seen(user_id=user.id)
+        else:
+            telegram_id = request.GET.get('telegram_id', '')
+            if telegram_id.isdigit():
+                tracker.mark_seen(telegram_id=int(telegram_id))
+
+        return response
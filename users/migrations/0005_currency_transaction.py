@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_last_activity_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coins', models.IntegerField(default=0, verbose_name='Изменение монет')),
+                ('gold', models.IntegerField(default=0, verbose_name='Изменение золота')),
+                ('reason', models.CharField(choices=[('card_purchase', 'Покупка карты'), ('card_sale', 'Продажа карты'), ('pack_purchase', 'Покупка набора карт'), ('game_reward', 'Награда за игру'), ('admin', 'Начисление администратором'), ('other', 'Другое')], default='other', max_length=30, verbose_name='Причина')),
+                ('reference', models.CharField(blank=True, help_text='Например, template:12 или game:34', max_length=100, verbose_name='Связанный объект')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='currency_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Операция с валютой',
+                'verbose_name_plural': 'Операции с валютой',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='currency_tx_user_idx')],
+            },
+        ),
+    ]
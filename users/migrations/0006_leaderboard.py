@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0005_currency_transaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_entry', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('rank', models.PositiveIntegerField(db_index=True, verbose_name='Место')),
+                ('total_points', models.PositiveIntegerField(default=0, verbose_name='Общий счет')),
+                ('games_won', models.PositiveIntegerField(default=0, verbose_name='Побед')),
+                ('display_name', models.CharField(blank=True, max_length=150, verbose_name='Имя в рейтинге')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Рейтинг',
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='telegramuser',
+            options={'verbose_name': 'Пользователь Telegram', 'verbose_name_plural': 'Пользователи Telegram'},
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(fields=['-total_points', '-date_joined_telegram', '-id'], name='users_ranking_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0006_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='telegramuser',
+            options={'ordering': ['-total_points', '-date_joined_telegram'], 'verbose_name': 'Пользователь Telegram', 'verbose_name_plural': 'Пользователи Telegram'},
+        ),
+        migrations.AddField(
+            model_name='telegramuser',
+            name='ranking_dirty',
+            field=models.BooleanField(default=True, verbose_name='Рейтинг требует пересчета'),
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(condition=models.Q(('ranking_dirty', True)), fields=['id'], name='users_ranking_dirty_idx'),
+        ),
+    ]
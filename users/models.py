@@ -1,8 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+# Поля, от которых зависят место и строка игрока в рейтинге
+RANKING_FIELDS = frozenset([
+    'telegram_id', 'total_points', 'games_won', 'date_joined_telegram',
+    'username_telegram', 'first_name_telegram',
+])
+
+
 class TelegramUser(AbstractUser):
     """
     Пользователь Telegram с расширенными полями для игры
@@ -103,15 +111,42 @@ class TelegramUser(AbstractUser):
         auto_now_add=True,
         verbose_name=_("Дата регистрации в Telegram")
     )
+    # Обновляется через users.activity, а не при каждом save()
     last_activity = models.DateTimeField(
-        auto_now=True,
+        default=timezone.now,
         verbose_name=_("Последняя активность")
     )
 
+    # Снимок рейтинга пересчитывается только для отмеченных игроков (users.leaderboard)
+    ranking_dirty = models.BooleanField(
+        default=True,
+        verbose_name=_("Рейтинг требует пересчета")
+    )
+
     class Meta:
         verbose_name = _("Пользователь Telegram")
         verbose_name_plural = _("Пользователи Telegram")
         ordering = ['-total_points', '-date_joined_telegram']
+        indexes = [
+            models.Index(
+                fields=['-total_points', '-date_joined_telegram', '-id'],
+                name='users_ranking_idx'
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(ranking_dirty=True),
+                name='users_ranking_dirty_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Изменение полей рейтинга отмечает игрока для пересчета снимка"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or RANKING_FIELDS.intersection(update_fields):
+            self.ranking_dirty = True
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'ranking_dirty'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.username_telegram or self.telegram_id} ({self.total_points} pts)"
@@ -129,6 +164,15 @@ class TelegramUser(AbstractUser):
 
     def update_stats(self, won=False, points=0):
         """Обновляет статистику после игры"""
+        self.apply_game_result(won=won, points=points)
+        self.save(update_fields=[
+            'total_games', 'games_won', 'total_points',
+            'current_streak', 'best_streak'
+        ])
+
+    def apply_game_result(self, won=False, points=0):
+        """Учитывает результат игры без сохранения (см. game.settlement)"""
+        self.ranking_dirty = True
         self.total_games += 1
         self.total_points += points
 
@@ -140,7 +184,100 @@ class TelegramUser(AbstractUser):
         else:
             self.current_streak = 0
 
-        self.save(update_fields=[
-            'total_games', 'games_won', 'total_points',
-            'current_streak', 'best_streak'
-        ])
+
+class CurrencyTransaction(models.Model):
+    """
+    Запись журнала движения валюты (только добавление)
+    """
+    REASON_CHOICES = [
+        ('card_purchase', _('Покупка карты')),
+        ('card_sale', _('Продажа карты')),
+        ('pack_purchase', _('Покупка набора карт')),
+        ('game_reward', _('Награда за игру')),
+        ('admin', _('Начисление администратором')),
+        ('other', _('Другое')),
+    ]
+
+    user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name='currency_transactions',
+        verbose_name=_("Пользователь")
+    )
+    coins = models.IntegerField(
+        default=0,
+        verbose_name=_("Изменение монет")
+    )
+    gold = models.IntegerField(
+        default=0,
+        verbose_name=_("Изменение золота")
+    )
+    reason = models.CharField(
+        max_length=30,
+        choices=REASON_CHOICES,
+        default='other',
+        verbose_name=_("Причина")
+    )
+    reference = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_("Связанный объект"),
+        help_text=_("Например, template:12 или game:34")
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Создана")
+    )
+
+    class Meta:
+        verbose_name = _("Операция с валютой")
+        verbose_name_plural = _("Операции с валютой")
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='currency_tx_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.coins:+d} монет, {self.gold:+d} золота ({self.get_reason_display()})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Строка снимка рейтинга (обновляется командой refresh_leaderboard)
+    """
+    user = models.OneToOneField(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='leaderboard_entry',
+        verbose_name=_("Пользователь")
+    )
+    rank = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name=_("Место")
+    )
+    total_points = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Общий счет")
+    )
+    games_won = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Побед")
+    )
+    display_name = models.CharField(
+        max_length=150,
+        blank=True,
+        verbose_name=_("Имя в рейтинге")
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_("Обновлена")
+    )
+
+    class Meta:
+        verbose_name = _("Место в рейтинге")
+        verbose_name_plural = _("Рейтинг")
+        ordering = ['rank']
+
+    def __str__(self):
+        return f"#{self.rank} {self.display_name} ({self.total_points} pts)"
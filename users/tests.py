@@ -1,3 +1,211 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ggame.log import REQUEST_LOGGER_NAME
+from ggame.middleware import StructuredLoggingMiddleware
+from ggame.streams import get_stream_user
+from .activity import ActivityTracker
+from .currency import InsufficientFunds, credit, debit
+from .leaderboard import refresh_leaderboard
+from .models import TelegramUser, CurrencyTransaction, LeaderboardEntry
+
+
+class ActivityTrackerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='player', telegram_id=100)
+        self.long_ago = timezone.now() - timedelta(days=1)
+        TelegramUser.objects.filter(pk=self.user.pk).update(last_activity=self.long_ago)
+        self.tracker = ActivityTracker(flush_interval=0.05)
+
+    def tearDown(self):
+        self.tracker.stop()
+
+    def wait_for_activity(self, timeout=2):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.user.refresh_from_db(fields=['last_activity'])
+            if self.user.last_activity > self.long_ago:
+                return
+            time.sleep(0.02)
+
+    def test_flushes_periodically_without_new_requests(self):
+        self.tracker.mark_seen(user_id=self.user.pk)
+        self.wait_for_activity()
+
+        self.assertGreater(self.user.last_activity, self.long_ago)
+
+    def test_flushes_by_telegram_id(self):
+        self.tracker.mark_seen(telegram_id=self.user.telegram_id)
+        self.wait_for_activity()
+
+        self.assertGreater(self.user.last_activity, self.long_ago)
+
+    def test_stop_flushes_pending_marks(self):
+        tracker = ActivityTracker(flush_interval=60)
+        tracker.mark_seen(user_id=self.user.pk)
+        self.assertEqual(tracker.stop(), 1)
+
+
+class CurrencyTests(TestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='buyer', telegram_id=200, coins=50, gold=1)
+
+    def test_debit_insufficient_balance(self):
+        with self.assertRaises(InsufficientFunds):
+            debit(self.user, coins=51, reason='card_purchase')
+        with self.assertRaises(InsufficientFunds):
+            # Хватает монет, но не золота - не списывается ничего
+            debit(self.user, coins=10, gold=2, reason='card_purchase')
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.coins, self.user.gold), (50, 1))
+        self.assertFalse(CurrencyTransaction.objects.filter(user=self.user).exists())
+
+    def test_debit_whole_balance(self):
+        entry = debit(self.user, coins=50, gold=1, reason='card_purchase')
+
+        self.assertEqual((self.user.coins, self.user.gold), (0, 0))
+        self.assertEqual((entry.coins, entry.gold), (-50, -1))
+        with self.assertRaises(InsufficientFunds):
+            debit(self.user, coins=1)
+
+    def test_debit_uses_database_balance(self):
+        # Устаревший объект пользователя не дает потратить уже списанное
+        stale = TelegramUser.objects.get(pk=self.user.pk)
+        debit(self.user, coins=40)
+        with self.assertRaises(InsufficientFunds):
+            debit(stale, coins=40)
+        self.assertEqual(TelegramUser.objects.get(pk=self.user.pk).coins, 10)
+
+    def test_credit_is_logged(self):
+        credit(self.user, coins=5, gold=2, reason='card_sale')
+
+        self.assertEqual((self.user.coins, self.user.gold), (55, 3))
+        self.assertEqual(
+            list(CurrencyTransaction.objects.filter(user=self.user).values_list('coins', 'gold', 'reason')),
+            [(5, 2, 'card_sale')],
+        )
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.players = [
+            TelegramUser.objects.create(username=f'p{n}', telegram_id=300 + n, total_points=points)
+            for n, points in enumerate([50, 40, 30, 20, 10])
+        ]
+
+    def ranks(self):
+        return dict(LeaderboardEntry.objects.values_list('user__username', 'rank'))
+
+    def test_default_ordering_kept(self):
+        self.assertEqual(
+            [user.username for user in TelegramUser.objects.all()],
+            ['p0', 'p1', 'p2', 'p3', 'p4'],
+        )
+
+    def test_first_refresh_ranks_everyone(self):
+        result = refresh_leaderboard()
+
+        self.assertEqual(result['total'], 5)
+        self.assertEqual(result['created'], 5)
+        self.assertEqual(self.ranks(), {'p0': 1, 'p1': 2, 'p2': 3, 'p3': 4, 'p4': 5})
+
+    def test_refresh_without_changes_touches_nothing(self):
+        refresh_leaderboard()
+
+        result = refresh_leaderboard()
+
+        self.assertEqual((result['created'], result['updated'], result['deleted']), (0, 0, 0))
+        self.assertEqual(result['total'], 5)
+
+    def test_refresh_updates_only_affected_ranks(self):
+        refresh_leaderboard()
+        # p3 обгоняет p2, остальные места не меняются
+        self.players[3].update_stats(won=True, points=15)
+
+        result = refresh_leaderboard()
+
+        self.assertEqual(result['updated'], 2)
+        self.assertEqual(self.ranks(), {'p0': 1, 'p1': 2, 'p3': 3, 'p2': 4, 'p4': 5})
+        self.assertFalse(TelegramUser.objects.filter(ranking_dirty=True).exists())
+
+    def test_unrelated_save_does_not_mark_player(self):
+        refresh_leaderboard()
+
+        self.players[0].language = 'en'
+        self.players[0].save(update_fields=['language'])
+
+        self.assertFalse(TelegramUser.objects.filter(ranking_dirty=True).exists())
+
+    def test_deleted_player_closes_the_gap(self):
+        refresh_leaderboard()
+        self.players[1].delete()
+
+        result = refresh_leaderboard()
+
+        self.assertEqual(result['total'], 4)
+        self.assertEqual(self.ranks(), {'p0': 1, 'p2': 2, 'p3': 3, 'p4': 4})
+
+
+class StreamUserTests(TestCase):
+    def setUp(self):
+        self.user = TelegramUser.objects.create(username='viewer', telegram_id=400)
+
+    def get_user(self, **params):
+        return async_to_sync(get_stream_user)(RequestFactory().get('/api/users/events/', params))
+
+    def test_mini_app_token_with_telegram_id(self):
+        # Mini App хранит tg_token_<id>, которого нет среди токенов DRF
+        user = self.get_user(token='tg_token_400', telegram_id='400')
+        self.assertEqual(user, self.user)
+
+    def test_unknown_token_without_telegram_id(self):
+        self.assertIsNone(self.get_user(token='tg_token_400'))
+
+    def test_unknown_telegram_id(self):
+        self.assertIsNone(self.get_user(telegram_id='401'))
+
+
+@override_settings(REQUEST_LOGGING={'SAMPLE_RATE': 0.01, 'SLOW_REQUEST_MS': 500})
+class RequestLoggingTests(TestCase):
+    """Выборочное логирование не теряет ошибки и медленные запросы"""
+
+    def setUp(self):
+        self.request = RequestFactory().get('/api/cards/')
+
+    def call(self, status=200, duration=0.0, error=None):
+        def get_response(request):
+            if error:
+                raise error
+            return HttpResponse(status=status)
+
+        middleware = StructuredLoggingMiddleware(get_response)
+        # Запрос "длится" duration секунд, случайное число выше доли выборки
+        with mock.patch('ggame.middleware.time.perf_counter', side_effect=[0.0, duration]), \
+                mock.patch('ggame.middleware.random.random', return_value=0.5):
+            middleware(self.request)
+
+    def test_ordinary_request_is_sampled_out(self):
+        with self.assertNoLogs(REQUEST_LOGGER_NAME):
+            self.call()
+
+    def test_server_error_is_always_logged(self):
+        with self.assertLogs(REQUEST_LOGGER_NAME) as logs:
+            self.call(status=500)
+        self.assertEqual(logs.records[0].msg['status'], 500)
+
+    def test_exception_is_always_logged(self):
+        with self.assertLogs(REQUEST_LOGGER_NAME) as logs, self.assertRaises(ValueError):
+            self.call(error=ValueError('boom'))
+        self.assertEqual(logs.records[0].msg['error'], 'ValueError')
+
+    def test_slow_request_is_always_logged(self):
+        with self.assertLogs(REQUEST_LOGGER_NAME) as logs:
+            self.call(duration=0.6)
+        self.assertTrue(logs.records[0].msg['slow'])
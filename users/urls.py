@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import events, views
 
 # Создаем роутер для API пользователей
 router = DefaultRouter()
@@ -9,4 +9,7 @@ router = DefaultRouter()
 urlpatterns = [
     path('', include(router.urls)),
     path('by_telegram/<int:telegram_id>/', views.get_user_by_telegram_id, name='user_by_telegram'),
+    path('events/', events.profile_events, name='profile_events'),
+    path('leaderboard/', views.get_leaderboard, name='leaderboard'),
+    path('leaderboard/by_telegram/<int:telegram_id>/', views.get_leaderboard_position, name='leaderboard_position'),
 ]
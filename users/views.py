@@ -1,6 +1,7 @@
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from users.models import TelegramUser
+from users import leaderboard
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import api_view, permission_classes
 
@@ -34,6 +35,8 @@ def get_user_by_telegram_id(request, telegram_id):
             'games_won': getattr(user, 'games_won', 0),
             'current_streak': getattr(user, 'current_streak', 0),
             'best_streak': getattr(user, 'best_streak', 0),
+            # Место из снимка рейтинга (поиск по первичному ключу)
+            'rank': leaderboard.get_user_rank(user.id),
         }
 
         return JsonResponse(user_data)
@@ -42,3 +45,64 @@ def get_user_by_telegram_id(request, telegram_id):
         return JsonResponse({'error': 'User not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+def _get_positive_int(request, name, default, maximum):
+    """Положительное целое из query-параметра, не больше maximum"""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    value = int(value)
+    if value < 1:
+        raise ValueError(name)
+    return min(value, maximum)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_leaderboard(request):
+    """
+    Топ игроков по снимку рейтинга (постранично)
+    """
+    try:
+        page = _get_positive_int(request, 'page', 1, 10 ** 9)
+        page_size = _get_positive_int(request, 'page_size', leaderboard.DEFAULT_PAGE_SIZE, leaderboard.MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'page и page_size должны быть положительными числами'}, status=400)
+
+    return JsonResponse({
+        'count': leaderboard.get_total_ranked(),
+        'page': page,
+        'page_size': page_size,
+        'refreshed_at': leaderboard.get_refreshed_at(),
+        'results': [
+            leaderboard.serialize_entry(entry)
+            for entry in leaderboard.get_leaderboard_page(page, page_size)
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_leaderboard_position(request, telegram_id):
+    """
+    Место пользователя и его соседи по рейтингу
+    """
+    try:
+        radius = _get_positive_int(request, 'radius', leaderboard.DEFAULT_RADIUS, leaderboard.MAX_RADIUS)
+    except ValueError:
+        return JsonResponse({'error': 'radius должен быть положительным числом'}, status=400)
+
+    user_id = TelegramUser.objects.filter(telegram_id=telegram_id).values_list('id', flat=True).first()
+    if user_id is None:
+        return JsonResponse({'error': 'User not found'}, status=404)
+
+    entries = leaderboard.get_neighbours(user_id, radius)
+    if entries is None:
+        return JsonResponse({'error': 'Пользователь еще не попал в рейтинг'}, status=404)
+
+    return JsonResponse({
+        'rank': next(entry.rank for entry in entries if entry.user_id == user_id),
+        'refreshed_at': leaderboard.get_refreshed_at(),
+        'results': [leaderboard.serialize_entry(entry) for entry in entries],
+    })